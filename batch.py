@@ -0,0 +1,68 @@
+"""
+Batch mode for toolbox.py: runs every line of a script as a command line in a single interpreter.
+
+Blank lines and lines starting with '#' are skipped. Lines may be pipelines.
+"""
+from collections import deque
+from typing import Callable, Iterable, Iterator, List, Tuple
+
+
+def read_script(f) -> Iterator[Tuple[int, str]]:
+    """Yields (line number, command line) for every command in the open file f."""
+    for lineno, line in enumerate(f, 1):
+        line = line.strip()
+
+        if line and not line.startswith("#"):
+            yield lineno, line
+
+
+def run_batch(commands: Iterable[Tuple[int, str]],
+              run: Callable[[str], int],
+              keep_going: bool = False,
+              jobs: int = 1,
+              on_result: Callable[[int, str, int], None] = None) -> List[Tuple[int, str, int]]:
+    """
+    Runs each command line with `run` and returns a list of (line number, command line, exit status) in script
+    order. Unless keep_going is True, no further lines are started after one exits with a non-zero status.
+
+    If jobs is greater than 1, up to `jobs` lines run at the same time on a thread pool, so the lines must not
+    depend on each other. Lines that were already running when a failure is seen are still waited for.
+    on_result is called for every finished line, in script order.
+    """
+    results = []
+
+    def finish(lineno, line, status):
+        results.append((lineno, line, status))
+        if on_result:
+            on_result(lineno, line, status)
+        return status == 0 or keep_going
+
+    if jobs <= 1:
+        for lineno, line in commands:
+            if not finish(lineno, line, run(line)):
+                break
+        return results
+
+    # Imported here since it costs more at startup than the rest of toolbox.py, and most scripts run serially
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(jobs) as pool:
+        pending = deque()
+        commands = iter(commands)
+        proceed = True
+
+        while True:
+            # Keep the pool busy but stop submitting as soon as a failure is seen
+            while proceed and len(pending) < jobs * 2:
+                command = next(commands, None)
+                if command is None:
+                    break
+                pending.append((*command, pool.submit(run, command[1])))
+
+            if not pending:
+                break
+
+            lineno, line, future = pending.popleft()
+            proceed = finish(lineno, line, future.result()) and proceed
+
+    return results
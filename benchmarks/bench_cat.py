@@ -0,0 +1,38 @@
+"""
+Throughput of cat's raw copy against the -n, -b and -s transforms.
+
+usage: python benchmarks/bench_cat.py [megabytes]
+"""
+from pathlib import Path
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def make_input(path: str, megabytes: int):
+    line = b"2024-01-01 12:00:00 INFO some log message with a bit of payload\n\n"
+    with open(path, "wb") as f:
+        f.write(line * (megabytes * 1024 * 1024 // len(line)))
+
+
+def main(megabytes=200):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "input.log")
+        make_input(path, megabytes)
+        relative = os.path.relpath(path, ROOT)
+
+        for flags in ["", "-n", "-b", "-s"]:
+            start = time.perf_counter()
+            with open(os.devnull, "wb") as null:
+                subprocess.run([sys.executable, "toolbox.py", f"cat {flags} {relative}"], cwd=ROOT, stdout=null,
+                               check=True)
+            elapsed = time.perf_counter() - start
+            print(f"cat {flags:3} {elapsed:6.2f} s  {megabytes / elapsed:8.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,61 @@
+"""
+Scaling of Table.create_column_first, as used by `ls` and `column`, against the previous incremental layout.
+
+usage: python benchmarks/bench_column_layout.py [max_exponent]
+"""
+from pathlib import Path
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from command.column import Table  # noqa: E402
+
+# The previous layout is quadratic or worse, so it is only timed up to this many items
+LEGACY_LIMIT = 5_000
+
+
+def legacy_create_column_first(input, max_row_width, column_padding=0, length_function=len):
+    """The layout used before Table.column_first_rows: one add_row() and compression per overflowing item."""
+    table = Table()
+
+    def n_row_size(n):
+        return sum(length_function(x) + column_padding for x in table.rows[n] if x is not None)
+
+    for item in input:
+        table.append_to_column(item)
+        row = len(table.columns[-1]) - 1
+
+        for n in range(row, -1, -1):
+            while n_row_size(n) > max_row_width and table.col_num > 1:
+                table.add_row()
+
+    return table
+
+
+def file_names(n, seed=0):
+    rng = random.Random(seed)
+    return [f"{'x' * rng.randint(1, 24)}.{rng.choice(['py', 'txt', 'json', 'c'])}" for _ in range(n)]
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(max_exponent=6):
+    for exponent in range(2, max_exponent + 1):
+        for n in (10 ** exponent, 5 * 10 ** exponent):
+            if n > 10 ** max_exponent:
+                break
+
+            names = file_names(n)
+            new = timed(Table.create_column_first, names, 200, 2)
+            legacy = f"{timed(legacy_create_column_first, names, 200, 2):9.3f} s" if n <= LEGACY_LIMIT else "        -"
+            print(f"{n:>9} items   new {new:8.3f} s   previous {legacy}")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
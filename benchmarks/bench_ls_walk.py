@@ -0,0 +1,62 @@
+"""
+ls -R over a generated tree with different numbers of --workers. A delay can be added to every directory read to
+stand in for a network filesystem.
+
+usage: python benchmarks/bench_ls_walk.py [directories] [latency_ms]
+"""
+from pathlib import Path
+import contextlib
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from command import ls  # noqa: E402
+
+
+def make_tree(root, directories, files_per_dir=20, fanout=8):
+    made = 1
+    queue = [root]
+
+    while queue and made < directories:
+        parent = queue.pop(0)
+        for i in range(fanout):
+            if made >= directories:
+                break
+            path = os.path.join(parent, f"dir{i}")
+            os.mkdir(path)
+            queue.append(path)
+            made += 1
+
+    for dirpath, _, _ in os.walk(root):
+        for i in range(files_per_dir):
+            open(os.path.join(dirpath, f"file{i}"), "w").close()
+
+
+def main(directories=2000, latency_ms=0):
+    real_scandir = os.scandir
+
+    def slow_scandir(path="."):
+        time.sleep(latency_ms / 1000)
+        return real_scandir(path)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        make_tree(tmp, directories)
+        os.chdir(tmp)
+        os.scandir = slow_scandir
+
+        for workers in (1, 4, 16):
+            start = time.perf_counter()
+            with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+                ls.ls([Path(".")], ls.short_list_out, recurse=True, workers=workers)
+            print(f"{directories} directories, {latency_ms} ms per read, {workers:2} workers: "
+                  f"{time.perf_counter() - start:6.2f} s")
+
+        os.scandir = real_scandir
+        os.chdir("/")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,83 @@
+"""
+Splitting lines on a set of delimiters, as `column -t` does, with Splitter against the previous multisplit.
+
+usage: python benchmarks/bench_split.py [lines] [legacy_lines]
+"""
+from itertools import chain
+from pathlib import Path
+import random
+import string
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from command.utils.string import get_splitter, multisplit  # noqa: E402
+
+
+def legacy_multifind(s, items, start=0):
+    """multifind before Splitter: every position is tried with every delimiter length."""
+    items_lengths = set(len(i) for i in items)
+    slices = ((slice(b, b + e) for e in items_lengths) for b in range(start, len(s)))
+
+    for sl in chain.from_iterable(slices):
+        if s[sl] in items:
+            return (sl.start, sl.stop)
+
+    return (len(s), len(s))
+
+
+def legacy_multisplit(s, delims, max_split=-1, filter_empty=True):
+    rv = []
+
+    last_end = 0
+    while max_split != 0:
+        b, e = legacy_multifind(s, delims, last_end)
+
+        if not filter_empty or last_end != b:
+            rv.append(s[last_end:b])
+            max_split -= 1
+
+        if b == len(s) and e == len(s):
+            break
+
+        last_end = e
+
+    return rv
+
+
+def make_lines(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join(f"{rng.random():.6f}" for _ in range(4)) + f"\t{rng.choice(['ok', 'fail'])}" for _ in range(n)]
+
+
+def rate(func, lines):
+    start = time.perf_counter()
+    for line in lines:
+        func(line)
+    return len(lines) / (time.perf_counter() - start)
+
+
+def main(n=1_000_000, legacy_n=20_000):
+    lines = make_lines(n)
+    whitespace = set(string.whitespace)
+    cases = [
+        ("whitespace", whitespace),
+        ("two-character", {", ", "\t"}),
+        ("bytes", {b" ", b"\t"}),
+    ]
+
+    for name, delims in cases:
+        subject = [line.encode() for line in lines] if name == "bytes" else lines
+        splitter = get_splitter(delims)
+
+        new = rate(lambda line: multisplit(line, delims, filter_empty=False), subject)
+        compiled = rate(splitter.split, subject)
+        legacy = rate(lambda line: legacy_multisplit(line, delims, filter_empty=False), subject[:legacy_n])
+
+        print(f"{name:14} multisplit {n / new:6.2f} s   Splitter.split {n / compiled:6.2f} s   "
+              f"previous {n / legacy:8.2f} s (from {legacy_n} lines)   per {n} lines")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,56 @@
+"""
+Measures the cold start time of `toolbox.py "cat x"`.
+
+"eager" imports every command through `cmds.load_commands()` before dispatching, which is how toolbox.py used to
+start. "lazy" runs toolbox.py itself, which only imports the requested command.
+
+usage: python benchmarks/bench_startup.py [runs]
+"""
+from pathlib import Path
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = Path(__file__).resolve().parent.parent
+
+EAGER = """
+import sys, cmds
+commands = cmds.load_commands()
+sys.exit(commands["cat"](sys.argv[1:]) or 0)
+"""
+
+
+def time_runs(argv, runs):
+    samples = []
+
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(argv, cwd=ROOT, stdout=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+
+    return samples
+
+
+def main(runs=30):
+    with tempfile.NamedTemporaryFile("w", suffix=".txt") as f:
+        f.write("x\n")
+        f.flush()
+        x = f.name
+
+        variants = {
+            "eager": [sys.executable, "-c", EAGER, x],
+            "lazy": [sys.executable, "toolbox.py", f"cat {x}"],
+        }
+
+        for name, argv in variants.items():
+            # Warm up the page cache and the command manifest
+            time_runs(argv, 2)
+            samples = time_runs(argv, runs)
+            print(f"{name:6} median {statistics.median(samples) * 1000:7.2f} ms   "
+                  f"min {min(samples) * 1000:7.2f} ms   ({runs} runs)")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,71 @@
+"""
+Cost of aligning by display width instead of len, on mostly-ASCII names as `ls` and `column` see them.
+
+usage: python benchmarks/bench_width.py [items] [percent_non_ascii]
+"""
+from pathlib import Path
+import contextlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from command.column import Table, _update_widths  # noqa: E402
+from command.utils.width import display_width, ljust  # noqa: E402
+
+
+def names(n, percent_non_ascii, seed=0):
+    rng = random.Random(seed)
+    wide = ["日本語", "資料", "👍", "café", "naïve", "한국어"]
+    rv = []
+
+    for _ in range(n):
+        name = "x" * rng.randint(1, 20)
+        if rng.random() * 100 < percent_non_ascii:
+            name += rng.choice(wide)
+        rv.append(name + rng.choice([".py", ".txt", ".json"]))
+
+    return rv
+
+
+def layout(items, length_function):
+    with open(os.devnull, "w") as null, contextlib.redirect_stdout(null):
+        table = Table.create_column_first(items, 200, 2, length_function)
+        table.print_table(length_f=length_function)
+
+
+def table_mode(rows, length_function, pad):
+    widths = []
+    for cells in rows:
+        _update_widths(widths, cells, length_function)
+
+    for cells in rows:
+        "  ".join(map(pad, cells, widths))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def main(n=200_000, percent_non_ascii=2):
+    items = names(n, percent_non_ascii)
+    rows = [items[i:i + 5] for i in range(0, len(items), 5)]
+
+    cases = [
+        ("measure", lambda f, p: sum(map(f, items))),
+        ("ls/column layout", lambda f, p: layout(items, f)),
+        ("column -t format", lambda f, p: table_mode(rows, f, p)),
+    ]
+
+    for name, case in cases:
+        base = timed(case, len, str.ljust)
+        width = timed(case, display_width, ljust)
+        print(f"{name:18} len {base:7.3f} s   display_width {width:7.3f} s   {width / base:5.2f}x")
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -1,14 +1,30 @@
+from collections.abc import Mapping
 import pathlib
 import importlib
+import json
+import os
+
+MANIFEST_NAME = "commands.json"
+_COMMAND_PATH = pathlib.Path(__file__).parent / "command"
+
+
+def _module_prefix(path: pathlib.Path, package: str = None) -> str:
+    if package:
+        return package
+
+    if path.is_absolute():
+        return path.name
+
+    if path.parts[0] == '.':
+        return ".".join(path.parts[1:])
+    return ".".join(path.parts)
+
 
 def load_commands(path: pathlib.Path = pathlib.Path(".", "command"), main_name="_cmd_main"):
     if path.is_file():
         raise ValueError("path must point to a directory")
 
-    if path.parts[0] == '.':
-        module_str = ".".join(path.parts[1:])
-    else:
-        module_str = ".".join(path.parts)
+    module_str = _module_prefix(path)
 
     commands = {}
 
@@ -21,5 +37,121 @@ def load_commands(path: pathlib.Path = pathlib.Path(".", "command"), main_name="
             except AttributeError:
                 # TODO: Log if verbose
                 continue
-    
-    return commands
\ No newline at end of file
+
+    return commands
+
+
+def scan_commands(path: pathlib.Path, main_name="_cmd_main"):
+    """
+    Returns the sorted names of the modules in `path` that define `main_name`, without importing them.
+    A module counts as a command if its source contains a top level `def main_name(`.
+    """
+    marker = f"\ndef {main_name}(".encode()
+    names = []
+
+    with os.scandir(path) as it:
+        for entry in it:
+            if not entry.name.endswith(".py") or not entry.is_file():
+                continue
+
+            with open(entry.path, "rb") as f:
+                if marker in b"\n" + f.read():
+                    names.append(entry.name[:-3])
+
+    return sorted(names)
+
+
+class CommandRegistry(Mapping):
+    """
+    Read-only mapping of command names to their main functions.
+
+    Command names are read from a manifest cached in the `__pycache__` directory of `path`, which is rebuilt
+    whenever the mtime of `path` changes. A command's module is only imported the first time it is looked up.
+    """
+
+    def __init__(self, path: pathlib.Path = _COMMAND_PATH, package: str = None, main_name="_cmd_main",
+                 manifest_path: pathlib.Path = None):
+        if path.is_file():
+            raise ValueError("path must point to a directory")
+
+        self.path = path
+        self.package = _module_prefix(path, package)
+        self.main_name = main_name
+        self.manifest_path = manifest_path or path / "__pycache__" / MANIFEST_NAME
+        self._names = None
+        self._loaded = {}
+
+    def _read_manifest(self, mtime_ns: int):
+        try:
+            with open(self.manifest_path) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if manifest.get("mtime_ns") != mtime_ns or manifest.get("main_name") != self.main_name:
+            return None
+        return manifest.get("commands")
+
+    def _write_manifest(self, mtime_ns: int, names):
+        manifest = {"mtime_ns": mtime_ns, "main_name": self.main_name, "commands": names}
+        tmp_path = self.manifest_path.with_name(f"{self.manifest_path.name}.{os.getpid()}.tmp")
+
+        try:
+            with open(tmp_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(tmp_path, self.manifest_path)
+        except OSError:
+            # The manifest is only a cache, so an unwritable directory just means rescanning next time.
+            pass
+
+    def refresh(self):
+        """Rescans the command directory and rewrites the manifest."""
+        # Creating the cache directory bumps the mtime of `path`, so it has to exist before the mtime is taken.
+        try:
+            self.manifest_path.parent.mkdir(exist_ok=True)
+        except OSError:
+            pass
+
+        mtime_ns = os.stat(self.path).st_mtime_ns
+        self._names = scan_commands(self.path, self.main_name)
+        self._write_manifest(mtime_ns, self._names)
+        return self._names
+
+    @property
+    def names(self):
+        if self._names is None:
+            self._names = self._read_manifest(os.stat(self.path).st_mtime_ns)
+
+            if self._names is None:
+                self.refresh()
+
+        return self._names
+
+    def __getitem__(self, name: str):
+        try:
+            return self._loaded[name]
+        except KeyError:
+            pass
+
+        # Editing a file in place doesn't touch the directory mtime, so rescan once before giving up on a name.
+        if name not in self.names and name not in self.refresh():
+            raise KeyError(name)
+
+        command_module = importlib.import_module(f"{self.package}.{name}")
+
+        try:
+            main = getattr(command_module, self.main_name)
+        except AttributeError:
+            raise KeyError(name)
+
+        self._loaded[name] = main
+        return main
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.names
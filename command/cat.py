@@ -1,6 +1,9 @@
+from itertools import count
 from typing import List
-from .utils.arg import resolve_paths, iterate_input_files
+from .utils.arg import PREFETCH_FILES, resolve_paths, iterate_input_files
+from .utils.file import BUFFER_SIZE, copy_stream
 import argparse
+import re
 import sys
 
 arg_parser = argparse.ArgumentParser(
@@ -8,27 +11,170 @@ arg_parser = argparse.ArgumentParser(
     description="Reads files in sequence and outputs them to stdout in the same sequence."
 )
 arg_parser.add_argument("-u", action="store_true", dest="no_delay", help="Writes bytes to stdout without delay.")
+arg_parser.add_argument("-n", action="store_true", dest="number_lines", help="Number all output lines.")
+arg_parser.add_argument("-b", action="store_true", dest="number_nonblank", help="Number non-blank output lines. Overrides -n.")
+arg_parser.add_argument("-s", action="store_true", dest="squeeze_blank", help="Suppress repeated blank output lines.")
 arg_parser.add_argument("file", nargs="*")
 
-def cat(files, output_func = print):
+def _write_stdout(chunk):
+    if isinstance(chunk, bytes):
+        sys.stdout.buffer.write(chunk)
+    else:
+        sys.stdout.write(chunk)
+
+class SqueezeBlank():
+    """
+    Streaming transform for -s. Runs of blank lines are replaced by a single blank line, including runs that span
+    chunks or files. Works on str or bytes chunks.
+    """
+    _BLANK_RUNS = {str: re.compile("\n{3,}"), bytes: re.compile(b"\n{3,}")}
+
+    def __init__(self):
+        # Number of newlines at the end of the output so far, capped at 2. The start counts as a line break.
+        self.newlines = 1
+
+    def __call__(self, chunk):
+        newline = "\n" if isinstance(chunk, str) else b"\n"
+        out = chunk
+
+        # The find is much cheaper than a regex scan, and most chunks have nothing to squeeze
+        if newline * 3 in out:
+            out = self._BLANK_RUNS[type(chunk)].sub(newline * 2, out)
+
+        # At most two newlines are left at the start of out
+        leading = 2 if out.startswith(newline * 2) else int(out.startswith(newline))
+        allowed = max(0, 2 - self.newlines)
+        if leading > allowed:
+            out = out[leading - allowed:]
+
+        if len(out) <= 2 and not out.strip(newline):
+            self.newlines += len(out)
+        else:
+            self.newlines = 2 if out.endswith(newline * 2) else int(out.endswith(newline))
+
+        return out
+
+class NumberLines():
+    """
+    Streaming transform for -n and -b. Prefixes each line with its line number, or only non-blank lines if
+    nonblank is True. Lines are found with split, and numbered lines are formatted with a single % per line, so no
+    Python code runs per line for -n. Works on str or bytes chunks.
+    """
+
+    def __init__(self, nonblank: bool = False, start: int = 1):
+        self.nonblank = nonblank
+        self.line = start
+        self.at_line_start = True
+
+    def __call__(self, chunk):
+        if isinstance(chunk, str):
+            newline, numbered, prefix = "\n", "%6d\t%s\n", "%6d\t"
+        else:
+            newline, numbered, prefix = b"\n", b"%6d\t%s\n", b"%6d\t"
+
+        parts = chunk.split(newline)
+        # The text after the last newline is the start of a line that continues in the next chunk
+        tail = parts.pop()
+
+        if not self.at_line_start:
+            if not parts:
+                return chunk
+
+            out = [parts[0], newline]
+            complete = parts[1:]
+        else:
+            out = []
+            complete = parts
+
+        if not self.nonblank or chunk[:0] not in complete:
+            out.extend(map(numbered.__mod__, zip(count(self.line), complete)))
+            self.line += len(complete)
+        else:
+            numbers = count(self.line)
+            out.extend(numbered % (next(numbers), line) if line else newline for line in complete)
+            self.line = next(numbers)
+
+        if tail:
+            out.append(prefix % self.line)
+            out.append(tail)
+            self.line += 1
+
+        self.at_line_start = not tail
+        return chunk[:0].join(out)
+
+def cat(files, output_func=_write_stdout, buffer_size: int = BUFFER_SIZE,
+        number_lines: bool = False, number_nonblank: bool = False, squeeze_blank: bool = False, flush=None):
+    """
+    Reads each file in sequence and passes its contents to output_func in chunks of up to buffer_size.
+    Files opened in binary mode produce bytes chunks, files opened in text mode produce str chunks.
+
+    Chunks are read with read1 where the file has it, so a pipe or terminal produces a chunk as soon as some data
+    arrives. flush, if given, is called after every short read, when the file had nothing more to give yet, so
+    buffered output isn't held back while waiting for more input.
+
+    number_lines, number_nonblank and squeeze_blank apply the transforms of -n, -b and -s to the chunks. Their
+    state carries over from one file to the next.
+    """
+    transforms = []
+    if squeeze_blank:
+        transforms.append(SqueezeBlank())
+    if number_lines or number_nonblank:
+        transforms.append(NumberLines(nonblank=number_nonblank))
+
     for f in files:
-        last_str = True
+        read = getattr(f, "read1", f.read)
+        chunk = read(buffer_size)
+
+        while chunk:
+            short = len(chunk) < buffer_size
+
+            for transform in transforms:
+                chunk = transform(chunk)
+
+            if chunk:
+                output_func(chunk)
 
-        while last_str:
-            last_str = f.readline()
-            output_func(last_str)
+            if short and flush is not None:
+                flush()
+
+            chunk = read(buffer_size)
 
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
 
-    file_paths = resolve_paths(parsed_args.file)
-    file_iterator = iterate_input_files(file_paths, mode="r")
-    
-    if not parsed_args.no_delay:
-        buffer = []
-        cat(file_iterator, buffer.append)
-        print("".join(buffer))
+    missing = []
+    file_paths = resolve_paths(parsed_args.file, on_unmatched=missing.append)
+
+    for pattern in missing:
+        print(f"cat: {pattern}: No such file or directory", file=sys.stderr)
+
+    # Standard input is only read when no files were given at all
+    if missing and not file_paths:
+        return 1
+
+    file_iterator = iterate_input_files(file_paths, default=sys.stdin.buffer, prefetch=PREFETCH_FILES,
+                                        mode="rb", buffering=0)
+
+    # Text written through print before now has to come out first
+    sys.stdout.flush()
+    out = sys.stdout.buffer
+
+    if parsed_args.number_lines or parsed_args.number_nonblank or parsed_args.squeeze_blank:
+        def output_func(chunk):
+            out.write(chunk)
+            if parsed_args.no_delay:
+                out.flush()
+
+        cat(file_iterator, output_func,
+            number_lines=parsed_args.number_lines,
+            number_nonblank=parsed_args.number_nonblank,
+            squeeze_blank=parsed_args.squeeze_blank,
+            flush=out.flush)
     else:
-        cat(file_iterator)
+        buffer = bytearray(BUFFER_SIZE)
+
+        for f in file_iterator:
+            copy_stream(f, out, buffer=buffer, flush=parsed_args.no_delay)
 
-    return 0
\ No newline at end of file
+    out.flush()
+    return 1 if missing else 0
@@ -39,19 +39,29 @@ The `column` utility formats its input into multiple columns. It supports three
 `-N`, `--table-columns` *names*
     Specify the column names by a comma separated list of names. The names are used for the table header.
 
+`--sample` *n*
+    In table mode, take the column widths from the first *n* lines only. Every later line is printed as soon as it is read, so memory use stays constant. Later cells that are wider than their column are not truncated. Requires `-t`.
+
 `--fillcolumns`
     Fill columns before rows. This is the default mode.
 
 `-x`, `--fillrows`
     Fill rows before columns.
 """
-from command.utils.arg import EnumArg, resolve_paths, iterate_input_files
+from command.utils.arg import PREFETCH_FILES, EnumArg, resolve_paths, iterate_input_files
 from command.utils.string import multisplit
+from command.utils.width import display_width, ljust
 from enum import auto
-from typing import Any, List
+from itertools import chain, islice, repeat
+from typing import Any, Iterable, List
 import argparse
 import string
 import os
+import sys
+import tempfile
+
+# Characters of table input kept in memory before the second pass of `column -t` reads them back from disk
+SPILL_SIZE = 8 * 1024 * 1024
 
 
 class OutputMode(EnumArg):
@@ -70,6 +80,7 @@ arg_parser.add_argument("-o", "--output-separator", dest="output_separator",
 arg_parser.add_argument("-s", "--separator",        dest="separator",           type=set,                       help="Specifies a set of possible input deliminators. In column-first and row-first mode the default is newline. In table mode, the default is all whitespace.")
 arg_parser.add_argument("-d", "--table-noheadings", dest="print_headings",      action="store_false",           help="In table mode, do not print out the headings.")
 arg_parser.add_argument("-N", "--table-columns",    dest="column_names",        type=lambda s: s.split(","),    help="Specify the column names by a comma separated list of names.")
+arg_parser.add_argument("--sample",                 dest="sample",              default=None, type=int,         help="In table mode, take the column widths from the first n lines and print the rest as it is read. Requires -t.", metavar="n")
 OutputMode.add_to_parser(arg_parser.add_mutually_exclusive_group(), dest="output_mode")
 
 
@@ -91,7 +102,16 @@ def _resolve_defaults(parsed_args):
 
 
 class Table():
+    """
+    A table stored as one flat, row-major list of cells. The cell in row r and column c is at r * stride + c. The
+    stride grows by doubling when a column is added past it, so adding cells rarely moves the others. The length of
+    every column and the width of its widest cell, as given by length_function, are updated as cells are added.
+    Cells that were never set are None.
+    """
     class RowIter():
+        """A view of one row of a table."""
+        __slots__ = ("table", "row_index")
+
         def __init__(self, table, row_index):
             self.table = table
             self.row_index = row_index
@@ -100,46 +120,142 @@ class Table():
             return f"<Row({self.row_index}): {list(self)}>"
 
         def __getitem__(self, key):
-            if key > self.table.col_num:
+            if key >= self.table.col_num:
                 raise IndexError(f"{key} is larger than the number of columns")
 
-            try:
-                return self.table.columns[key][self.row_index]
-            except IndexError:
-                return None
+            return self.table._get(self.row_index, key)
+
+        def __iter__(self):
+            return iter(self.table._row_cells(self.row_index))
 
         def __len__(self):
             return self.table.col_num
 
-    def __init__(self, columns=None):
-        self.columns = columns or [[]]
-        self._rows = max([len(x) for x in self.columns], default=1) or 1
+    class RowsView():
+        """A sequence of the rows of a table. Row views are created when they are accessed."""
+        __slots__ = ("table",)
+
+        def __init__(self, table):
+            self.table = table
+
+        def __getitem__(self, key):
+            return Table.RowIter(self.table, range(self.table.row_num)[key])
+
+        def __iter__(self):
+            return (Table.RowIter(self.table, r) for r in range(self.table.row_num))
+
+        def __len__(self):
+            return self.table.row_num
+
+    def __init__(self, columns=None, length_function=display_width):
+        self.length_function = length_function
+        columns = columns or [[]]
+        self._rows = max([len(x) for x in columns], default=1) or 1
+        self._load(columns)
+
+    def _load(self, columns):
+        """Replaces the cells of the table with columns. The number of rows is left as it is."""
+        self._stride = max(len(columns), 1)
+        self._cells = [None] * (max(map(len, columns), default=0) * self._stride)
+        self._col_lengths = [len(c) for c in columns]
+        self._col_widths = [self._max_width(c) for c in columns]
+
+        for i, column in enumerate(columns):
+            self._cells[i:i + len(column) * self._stride:self._stride] = column
+
+    def _max_width(self, cells):
+        if None in cells:
+            cells = [x for x in cells if x is not None]
+        return max(map(self.length_function, cells), default=0)
+
+    def _reserve(self, rows, cols):
+        """Makes room for at least rows rows and cols columns."""
+        if cols > self._stride:
+            stride = max(cols, self._stride * 2)
+            stored = len(self._cells) // self._stride
+            cells = [None] * (stored * stride)
+
+            for i in range(self._stride):
+                cells[i::stride] = self._cells[i::self._stride]
+
+            self._cells = cells
+            self._stride = stride
+
+        missing = rows - len(self._cells) // self._stride
+        if missing > 0:
+            self._cells.extend([None] * (missing * self._stride))
+
+    def _get(self, row, col):
+        if row >= self._col_lengths[col]:
+            return None
+        return self._cells[row * self._stride + col]
+
+    def _row_cells(self, row):
+        start = row * self._stride
+        cells = self._cells[start:start + self.col_num]
+
+        if len(cells) < self.col_num:
+            cells.extend([None] * (self.col_num - len(cells)))
+
+        return cells
+
+    def _set(self, row, col, item, fill_value=None):
+        """Sets a cell past the end of column col, filling the cells in between with fill_value."""
+        length = self._col_lengths[col]
+        index = row * self._stride + col
+
+        if col >= self._stride or index >= len(self._cells):
+            self._reserve(row + 1, col + 1)
+            index = row * self._stride + col
+
+        if row > length and fill_value is not None:
+            fill = slice(length * self._stride + col, index, self._stride)
+            self._cells[fill] = [fill_value] * (row - length)
+            self._col_widths[col] = max(self._col_widths[col], self.length_function(fill_value))
+
+        self._cells[index] = item
+        self._col_lengths[col] = row + 1
+
+        if item is not None:
+            width = self.length_function(item)
+            if width > self._col_widths[col]:
+                self._col_widths[col] = width
+
+    def _add_column(self):
+        self._col_lengths.append(0)
+        self._col_widths.append(0)
+        return self.col_num - 1
 
     def _take(self, n, start=0):
+        columns = self.columns
         rv = []
 
-        while len(rv) < n and start < self.col_num:
-            if self.columns[start]:
-                rv.append(self.columns[start].pop(0))
+        while len(rv) < n and start < len(columns):
+            if columns[start]:
+                rv.append(columns[start].pop(0))
 
-            if not self.columns[start]:
-                del self.columns[start]
+            if not columns[start]:
+                del columns[start]
 
+        self._load(columns)
         return rv
 
     def _compress_columns(self, row_count):
         if row_count < self.row_num:
             raise ValueError("row_count cannot be less than current number of rows")
 
-        i_col = 0
-        while i_col < self.col_num:
-            n = row_count - len(self.columns[i_col])
-            self.columns[i_col].extend(self._take(n, i_col + 1))
-            i_col += 1
+        # Filling every column up to row_count with the items of the next ones is a column-first relayout
+        items = [x for column in self.columns for x in column]
+        self._load([items[i:i + row_count] for i in range(0, len(items), row_count)] or [[]])
+
+    @property
+    def columns(self):
+        """A new list of lists holding the cells of each column."""
+        return [self._cells[i:i + n * self._stride:self._stride] for i, n in enumerate(self._col_lengths)]
 
     @property
     def col_num(self):
-        return len(self.columns)
+        return len(self._col_lengths)
 
     @property
     def row_num(self):
@@ -147,19 +263,27 @@ class Table():
 
     @property
     def rows(self):
-        return tuple(Table.RowIter(self, i) for i in range(self.row_num))
+        return Table.RowsView(self)
+
+    @property
+    def column_widths(self):
+        """The width of the widest cell of each column, as given by length_function."""
+        return list(self._col_widths)
 
     def append_to_column(self, item, start=-1):
         """
         Adds an item to the first column with an empty space beginning from start. 
         If no empty space is available, then a new column is created
         """
-        c = next((x for x in self.columns[start:] if len(x) < self.row_num), None)
+        lengths = self._col_lengths
 
-        if c is None:
-            self.columns.append([item])
+        for c in range(*slice(start, None).indices(len(lengths))):
+            if lengths[c] < self._rows:
+                break
         else:
-            c.append(item)
+            c = self._add_column()
+
+        self._set(self._col_lengths[c], c, item)
     
     def append_to_row(self, item, row, start=0, fill_value=None):
         """
@@ -169,14 +293,15 @@ class Table():
         if row > self.row_num:
             raise IndexError("Row number is out of range.")
 
-        c = next((x for x in self.columns[start:] if len(x) <= row), None)
+        lengths = self._col_lengths
 
-        if c is None:
-            c = []
-            self.columns.append(c)
+        for c in range(*slice(start, None).indices(len(lengths))):
+            if lengths[c] <= row:
+                break
+        else:
+            c = self._add_column()
 
-        c.extend([fill_value] * (row - len(c)))
-        c.append(item)
+        self._set(row, c, item, fill_value)
 
     def add_row(self, compress_columns=True):
         """
@@ -187,73 +312,186 @@ class Table():
         if compress_columns:
             self._compress_columns(self._rows)
     
-    def print_table(self, col_separator="  ", length_f=len, **print_args):
-        """Prints the table."""
-        col_sizes = [max(map(length_f, c)) for c in self.columns]
+    def print_table(self, col_separator="  ", length_f=display_width, **print_args):
+        """Prints the table. Cells are padded to the width of their column as given by length_f."""
+        if length_f is self.length_function:
+            col_sizes = self._col_widths
+        else:
+            col_sizes = [max(map(length_f, (x or "" for x in c)), default=0) for c in self.columns]
 
-        def rewrite_none(s):
-            if not s:
-                return ""
-            return s
+        # Padding has to agree with the widths, and str.ljust only agrees with len
+        pad = str.ljust if length_f is len else ljust
 
-        for r in self.rows:
-            out = (x.ljust(size) for x, size in zip(map(rewrite_none, r), col_sizes))
-            print(*out, sep=col_separator, **print_args)
+        for r in range(self.row_num):
+            cells = self._row_cells(r)
 
-    @classmethod
-    def create_column_first(cls, input, max_row_width: int, column_padding: int = 0, length_function=len):
+            if None in cells:
+                cells = [x or "" for x in cells]
+
+            print(col_separator.join(map(pad, cells, col_sizes)), **print_args)
+
+    @staticmethod
+    def column_first_rows(widths: List[int], max_row_width: int, column_padding: int = 0) -> int:
         """
-        Creates a new table from the input by filling columns first.
+        Returns the smallest number of rows for which a column-first layout of items with the given widths fits in
+        max_row_width, or len(widths) if only a single column fits. A row fits if the sum of the widths of its items,
+        each plus column_padding, is at most max_row_width.
+
+        Whether a layout fits isn't monotonic in the number of rows, so candidates are tried in increasing order,
+        starting from the lower bound given by the total width. Each candidate is checked with one slice and sum
+        per row, and stops at the first row that doesn't fit.
         """
-        table = cls()
+        n = len(widths)
+        padded = [w + column_padding for w in widths]
+        total = sum(padded)
 
-        def n_row_size(n):
-            return sum(length_function(x) + column_padding for x in table.rows[n] if x is not None)
+        if n <= 1 or max_row_width <= 0 or max(padded) > max_row_width:
+            return max(n, 1)
 
-        for item in input:
-            table.append_to_column(item)
-            row = len(table.columns[-1]) - 1
+        for rows in range(max(1, -(-total // max_row_width)), n):
+            if all(sum(padded[r::rows]) <= max_row_width for r in range(rows)):
+                return rows
 
-            # Continiously add rows until the current row and previous rows fit or only have one column
-            for n in range(row, -1, -1):
-                while n_row_size(n) > max_row_width and table.col_num > 1:
-                    table.add_row()
+        return n
 
-        return table
+    @classmethod
+    def create_column_first(cls, input, max_row_width: int, column_padding: int = 0, length_function=display_width):
+        """
+        Creates a new table from the input by filling columns first, using as few rows as possible.
+        """
+        items = list(input)
+        rows = cls.column_first_rows(list(map(length_function, items)), max_row_width, column_padding)
+
+        return cls([items[i:i + rows] for i in range(0, len(items), rows)], length_function)
 
     @classmethod
-    def create_row_first(cls, input, max_row_width, col_padding: int = 0, length_function=len):
+    def create_row_first(cls, input, max_row_width, col_padding: int = 0, length_function=display_width):
         n_col = int(max_row_width / (max(map(length_function, input)) + col_padding))
-        return cls([input[a::n_col] for a in range(n_col)])
+        return cls([input[a::n_col] for a in range(n_col)], length_function)
 
     @classmethod
     def table_from_lines(cls, lines: List[str], separator=set(string.whitespace)):
         table = cls()
 
         for n, row_str in enumerate(lines):
-            for entry in multisplit(row_str, separator, filter_empty=False):
-                table.append_to_row(entry.lstrip(), n, fill_value="")
+            # A new table already has one row
+            if n > 0:
+                table.add_row(False)
 
-            table.add_row(False)
+            # Every column before the ith entry was just filled, so the search can start at column i
+            for i, entry in enumerate(split_row(row_str, separator)):
+                table.append_to_row(entry, n, start=i, fill_value="")
 
         return table
 
 
+def split_row(line: str, separator=set(string.whitespace)) -> List[str]:
+    """Splits a line of input into the cells of a table row."""
+    return [entry.lstrip() for entry in multisplit(line, separator, filter_empty=False)]
+
+
+def _update_widths(widths: List[int], cells: List[str], length_function=display_width):
+    lengths = list(map(length_function, cells))
+    widths[:len(lengths)] = map(max, widths, lengths)
+    widths.extend(lengths[len(widths):])
+
+
+def format_row(cells: List[str], widths: List[int], col_separator: str = "  ") -> str:
+    """
+    Formats the cells of a table row, padding each to the display width of its column. A row with fewer cells than
+    there are widths is padded with empty cells. Cells past the last width aren't padded.
+    """
+    if len(cells) < len(widths):
+        cells = cells + [""] * (len(widths) - len(cells))
+
+    return col_separator.join(map(ljust, cells, chain(widths, repeat(0))))
+
+
+def print_table_spilled(lines: Iterable[str], separator=set(string.whitespace), col_separator: str = "  ",
+                        spill_size: int = SPILL_SIZE, **print_args):
+    """
+    Prints lines as a table, like Table.table_from_lines(lines, separator).print_table(col_separator), but without
+    holding the table in memory.
+
+    The first pass splits every line to find the column widths, and copies the line to a temporary file. The second
+    pass reads the lines back, splits them again and prints them. The temporary file stays in memory until it holds
+    more than spill_size characters.
+    """
+    widths = []
+
+    with tempfile.SpooledTemporaryFile(spill_size, mode="w+", encoding="utf-8", errors="surrogatepass",
+                                       newline="\n") as spill:
+        for line in lines:
+            _update_widths(widths, split_row(line, separator))
+            spill.write(line)
+            spill.write("\n")
+
+        spill.seek(0)
+
+        for line in spill:
+            print(format_row(split_row(line[:-1], separator), widths, col_separator), **print_args)
+
+
+def print_table_sampled(lines: Iterable[str], sample: int, separator=set(string.whitespace),
+                        col_separator: str = "  ", **print_args):
+    """
+    Prints lines as a table whose column widths are taken from the first sample lines only. Every line after those
+    is printed as soon as it is read, so memory use doesn't depend on the input size. Cells that are wider than
+    their column, or past the last column of the sample, push the rest of their row to the right.
+    """
+    lines = iter(lines)
+    head = [split_row(line, separator) for line in islice(lines, sample)]
+    widths = []
+
+    for cells in head:
+        _update_widths(widths, cells)
+
+    for cells in head:
+        print(format_row(cells, widths, col_separator), **print_args)
+
+    del head
+
+    for line in lines:
+        print(format_row(split_row(line, separator), widths, col_separator), **print_args)
+
+
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
+
+    if parsed_args.sample is not None:
+        if parsed_args.sample < 1:
+            arg_parser.error("--sample must be at least 1")
+        if parsed_args.output_mode != OutputMode.TABLE:
+            arg_parser.error("--sample requires -t")
+
     _resolve_defaults(parsed_args)
 
-    parsed_args.file = resolve_paths(parsed_args.file or "-")
-    lines = []
-    for f in iterate_input_files(parsed_args.file):
-        lines.extend([s.strip("\n") for s in f])
+    missing = []
+    parsed_args.file = resolve_paths(parsed_args.file or "-", on_unmatched=missing.append)
+
+    for pattern in missing:
+        print(f"column: {pattern}: No such file or directory", file=sys.stderr)
+
+    # Standard input is only read when no files were given at all
+    if missing and not parsed_args.file:
+        return 1
+
+    status = 1 if missing else 0
+    lines = (s.strip("\n") for f in iterate_input_files(parsed_args.file, prefetch=PREFETCH_FILES) for s in f)
+
+    if parsed_args.output_mode == OutputMode.TABLE:
+        if parsed_args.sample is not None:
+            print_table_sampled(lines, parsed_args.sample, parsed_args.separator, parsed_args.output_separator)
+        else:
+            print_table_spilled(lines, parsed_args.separator, parsed_args.output_separator)
+        return status
+
+    lines = list(lines)
 
     if not parsed_args.output_mode or parsed_args.output_mode == OutputMode.COL_FIRST:
         table = Table.create_column_first(lines, parsed_args.output_width, len(parsed_args.output_separator))
     elif parsed_args.output_mode == OutputMode.ROW_FIRST:
         table = Table.create_row_first(lines, parsed_args.output_width, len(parsed_args.output_separator))
-    elif parsed_args.output_mode == OutputMode.TABLE:
-        table = Table.table_from_lines(lines, parsed_args.separator)
     
     table.print_table(parsed_args.output_separator)
-    return 0
+    return status
@@ -1,36 +1,138 @@
 from typing import List
-from .utils.arg import resolve_paths, iterate_input_files
+from .utils.arg import PREFETCH_FILES, resolve_paths, iterate_input_files
+from .utils.file import BUFFER_SIZE, copy_stream
 import argparse
+import io
+import sys
 
 arg_parser = argparse.ArgumentParser(
     prog="head",
     description="Copies each file to the standard output. Copying will end at the nth line in each input file. If no n is given, 10 is assumed."
 )
-arg_parser.add_argument("-n", type=int, default=10, help="Number of lines to copy to the standard output for each file.")
+number_group = arg_parser.add_mutually_exclusive_group()
+number_group.add_argument("-n", type=int, default=10, help="Number of lines to copy to the standard output for each file.")
+number_group.add_argument("-c", type=int, dest="bytes", help="Number of bytes to copy to the standard output for each file. With a leading '-', copy all but the last N bytes.")
 arg_parser.add_argument("file", nargs="*")
 
-def print_iterator(file_paths):
+def print_iterator(file_paths, **open_args):
     first = True
 
-    for path, f in zip(file_paths, iterate_input_files(file_paths)):
+    for path, f in zip(file_paths, iterate_input_files(file_paths, **open_args)):
         if first:
-            print(f"==> {str(path)} <==")
+            print(f"==> {str(path)} <==", flush=True)
+            first = False
         else:
-            print(f"\n==> {str(path)} <==")
-        
+            print(f"\n==> {str(path)} <==", flush=True)
+
         yield f
 
-def head(files, n):
+def head_lines(f, n: int, out, block_size: int = BUFFER_SIZE) -> int:
+    """
+    Copies the first n lines of the binary file f to out and returns the number of lines copied.
+
+    f is read in blocks of block_size, and newlines are counted per block, so nothing is read after the block
+    that holds the nth line. If f is seekable, its position is left right after the nth line.
+    """
+    read = getattr(f, "read1", f.read)
+    copied = 0
+
+    while copied < n:
+        block = read(block_size)
+
+        if not block:
+            break
+
+        found = block.count(b"\n")
+
+        if copied + found < n:
+            out.write(block)
+            copied += found
+            continue
+
+        # The split leaves everything after the last wanted newline in the final element
+        end = len(block) - len(block.split(b"\n", n - copied)[-1])
+        out.write(block[:end])
+        copied = n
+
+        if end < len(block) and f.seekable():
+            f.seek(end - len(block), io.SEEK_CUR)
+
+    return copied
+
+def head_all_but(f, n: int, out, block_size: int = BUFFER_SIZE) -> int:
+    """
+    Copies the binary file f to out except for its last n bytes, and returns the number of bytes copied.
+
+    If f is seekable, the count is known from its size and the copy stops there. Otherwise the last n bytes read
+    are held back until EOF.
+    """
+    if f.seekable():
+        pos = f.tell()
+        end = f.seek(0, io.SEEK_END)
+        f.seek(pos)
+        return copy_stream(f, out, count=max(end - pos - n, 0))
+
+    read = getattr(f, "read1", f.read)
+    held = bytearray()
+    copied = 0
+
+    while True:
+        block = read(block_size)
+
+        if not block:
+            break
+
+        held += block
+
+        if len(held) > n:
+            out.write(held[:len(held) - n])
+            copied += len(held) - n
+            del held[:len(held) - n]
+
+    return copied
+
+def head(files, n: int, byte_count: bool = False, out=None):
+    """
+    Copies the first n lines, or the first n bytes if byte_count is True, of every binary file in files to out.
+    A negative byte count copies all but the last -n bytes, like GNU head. out defaults to sys.stdout.buffer.
+    """
+    out = out or sys.stdout.buffer
+
     for f in files:
-        for _ in range(n):
-            print(f.readline(), end='')
+        if byte_count and n < 0:
+            head_all_but(f, -n, out)
+        elif byte_count:
+            copy_stream(f, out, count=n)
+        else:
+            head_lines(f, n, out)
+
+    out.flush()
 
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
 
-    file_paths = resolve_paths(parsed_args.file)
+    missing = []
+    file_paths = resolve_paths(parsed_args.file, on_unmatched=missing.append)
+    byte_count = parsed_args.bytes is not None
+    n = parsed_args.bytes if byte_count else parsed_args.n
+
+    if n < 0 and not byte_count:
+        arg_parser.error("-n must not be negative")
+
+    for pattern in missing:
+        print(f"head: {pattern}: No such file or directory", file=sys.stderr)
+
+    # Standard input is only read when no files were given at all
+    if missing and not file_paths:
+        return 1
+
+    open_args = {"default": sys.stdin.buffer, "prefetch": PREFETCH_FILES, "mode": "rb", "buffering": 0}
+
+    sys.stdout.flush()
 
     if len(file_paths) > 1:
-        head(print_iterator(file_paths), parsed_args.n)
+        head(print_iterator(file_paths, **open_args), n, byte_count)
     else:
-        head(iterate_input_files(file_paths), parsed_args.n)
\ No newline at end of file
+        head(iterate_input_files(file_paths, **open_args), n, byte_count)
+
+    return 1 if missing else 0
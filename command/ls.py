@@ -1,11 +1,25 @@
-from typing import List, Iterable
+from functools import lru_cache
+from itertools import chain, islice
+from typing import Any, Callable, List, Iterable, Iterator, Tuple
 from pathlib import Path
 from command.utils.arg import FlagArg, EnumArg, resolve_paths
 from command.column import Table
 import argparse
+import heapq
 import os
+import shutil
+import stat
+import sys
+import time
 import command.utils.file as file_utils
 
+try:
+    import grp
+    import pwd
+except ImportError:
+    # Not available on Windows, where owners are shown by number
+    grp = pwd = None
+
 
 class LongOutputFormat(FlagArg):
     LONG = 1, ["-l"], {"help": "Write output in long format."}
@@ -59,11 +73,14 @@ arg_parser.add_argument("-q", action="store_true", dest="only_printable", help="
 arg_parser.add_argument("-r", action="store_true", dest="reverse_order", help="Reverse the order of the sort.")
 arg_parser.add_argument("-s", action="store_true", dest="display_blocks", help="Indicate the total number of system blocks consumed by each file displayed.")
 
+arg_parser.add_argument("--max", type=int, metavar="N", dest="limit", help="List only the first N entries of each directory in the sort order. Doesn't sort the rest of the directory.")
+arg_parser.add_argument("--workers", type=int, default=1, help="Number of threads reading directories ahead of the output with -R. Helps on slow or network filesystems.")
+
 recurse_group = arg_parser.add_mutually_exclusive_group()
 recurse_group.add_argument("-R", action="store_true", dest="recurse", help="Descend into all subdirectories encountered."),
 recurse_group.add_argument("-d", action="store_false", default=False, dest="recurse", help="Treat subdirectories no differently.")
 
-LongOutputFormat.add_to_parser(arg_parser.add_mutually_exclusive_group())
+LongOutputFormat.add_to_parser(arg_parser)
 EntryOutput.add_to_parser(arg_parser.add_mutually_exclusive_group())
 ShortOutputFormat.add_to_parser(arg_parser.add_mutually_exclusive_group())
 AugmentOutput.add_to_parser(arg_parser.add_mutually_exclusive_group())
@@ -72,33 +89,243 @@ SortBehavior.add_to_parser(arg_parser.add_mutually_exclusive_group())
 TimeBehavior.add_to_parser(arg_parser.add_mutually_exclusive_group())
 
 
-def dir_format(p: Path):
-    if p.is_dir():
-        return p.name + "/"
-    return p.name
+class PathEntry():
+    """
+    Stands in for an os.DirEntry for paths that weren't found by os.scandir, like file operands, "." and "..".
+    Results of stat are cached the same way.
+    """
+    __slots__ = ("name", "path", "_stat", "_lstat")
+
+    def __init__(self, path, name: str = None):
+        self.path = os.fspath(path)
+        self.name = name or os.path.basename(self.path.rstrip(os.sep)) or self.path
+        self._stat = None
+        self._lstat = None
+
+    def __fspath__(self):
+        return self.path
+
+    def __repr__(self):
+        return f"<PathEntry '{self.name}'>"
+
+    def stat(self, *, follow_symlinks=True):
+        if not follow_symlinks:
+            if self._lstat is None:
+                self._lstat = os.lstat(self.path)
+            return self._lstat
+
+        if self._stat is None:
+            self._stat = os.stat(self.path)
+        return self._stat
+
+    def _mode(self, follow_symlinks):
+        try:
+            return self.stat(follow_symlinks=follow_symlinks).st_mode
+        except OSError:
+            return 0
+
+    def is_dir(self, *, follow_symlinks=True):
+        return stat.S_ISDIR(self._mode(follow_symlinks))
+
+    def is_file(self, *, follow_symlinks=True):
+        return stat.S_ISREG(self._mode(follow_symlinks))
+
+    def is_symlink(self):
+        return stat.S_ISLNK(self._mode(False))
+
+    def inode(self):
+        return self.stat(follow_symlinks=False).st_ino
+
+
+def entry_name(entry) -> str:
+    return entry.name
+
+
+def dir_format(entry) -> str:
+    """Formatter for -p. The type of an entry comes from the directory listing, so this doesn't need a stat."""
+    if entry.is_dir(follow_symlinks=False):
+        return entry.name + "/"
+    return entry.name
+
+
+def classify_format(entry) -> str:
+    """Formatter for -F. Only regular files and special files need a stat, to find their permissions or type."""
+    if entry.is_symlink():
+        return entry.name + "@"
+    if entry.is_dir():
+        return entry.name + "/"
+
+    try:
+        mode = entry.stat(follow_symlinks=False).st_mode
+    except OSError:
+        return entry.name
+
+    if stat.S_ISREG(mode) and mode & (stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH):
+        return entry.name + "*"
+    if stat.S_ISFIFO(mode):
+        return entry.name + "|"
+    if stat.S_ISSOCK(mode):
+        return entry.name + "="
+    return entry.name
+
 
+def _terminal_width() -> int:
+    return shutil.get_terminal_size().columns
 
-def short_column_out(items: Iterable[Path], formatter=lambda p: p.name):
-    t = Table.create_column_first(map(formatter, items), os.get_terminal_size()[0], 2)
-    t.print_table()
 
+def short_column_out(items: Iterable, formatter=entry_name, directory=False):
+    names = list(map(formatter, items))
+    if names:
+        Table.create_column_first(names, _terminal_width(), 2).print_table()
 
-def short_row_out(items: Iterable[Path], formatter=lambda p: p.name):
-    t = Table.create_row_first(items, os.get_terminal_size()[0], 2)
-    t.print_table()
 
+def short_row_out(items: Iterable, formatter=entry_name, directory=False):
+    names = list(map(formatter, items))
+    if names:
+        Table.create_row_first(names, _terminal_width(), 2).print_table()
 
-def short_stream_out(items: Iterable[Path], formatter=lambda p: p.name):
-    print(", ".join(map(formatter, items)))
 
+def short_stream_out(items: Iterable, formatter=entry_name, directory=False):
+    names = list(map(formatter, items))
+    if names:
+        print(", ".join(names))
 
-def short_list_out(items: Iterable[Path], formatter=lambda p: p.name):
+
+def short_list_out(items: Iterable, formatter=entry_name, directory=False):
     for i in items:
         print(formatter(i))
 
 
-def long_out(items: Iterable[Path], mode=LongOutputFormat.LONG, formatter=lambda p: p.name):
-    pass
+_MONTHS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+_SIX_MONTHS = 182 * 24 * 60 * 60
+
+
+@lru_cache(maxsize=None)
+def _user_name(uid: int) -> str:
+    try:
+        return pwd.getpwuid(uid).pw_name
+    except (KeyError, AttributeError):
+        return str(uid)
+
+
+@lru_cache(maxsize=None)
+def _group_name(gid: int) -> str:
+    try:
+        return grp.getgrgid(gid).gr_name
+    except (KeyError, AttributeError):
+        return str(gid)
+
+
+@lru_cache(maxsize=None)
+def _mode_string(mode: int) -> str:
+    return stat.filemode(mode)
+
+
+class TimeFormatter():
+    """
+    Formats timestamps for the long format, with the time of day for the last six months and the year otherwise.
+    Results are cached per minute, so a directory of files written together formats few distinct times.
+    """
+
+    def __init__(self, now: float = None):
+        self.now = time.time() if now is None else now
+        self._cache = {}
+
+    def __call__(self, timestamp: float) -> str:
+        minute = int(timestamp // 60)
+        rv = self._cache.get(minute)
+
+        if rv is None:
+            t = time.localtime(minute * 60)
+
+            if self.now - _SIX_MONTHS < timestamp <= self.now + 60:
+                rv = f"{_MONTHS[t.tm_mon - 1]} {t.tm_mday:2} {t.tm_hour:02}:{t.tm_min:02}"
+            else:
+                rv = f"{_MONTHS[t.tm_mon - 1]} {t.tm_mday:2}  {t.tm_year}"
+
+            self._cache[minute] = rv
+
+        return rv
+
+
+def _blocks(st, block_size: int) -> int:
+    blocks = getattr(st, "st_blocks", None)
+    size = st.st_size if blocks is None else blocks * 512
+    return -(-size // block_size)
+
+
+def long_out(items: Iterable, mode=LongOutputFormat.LONG, formatter=entry_name, directory=False,
+             time_field="st_mtime", show_inode=False, show_blocks=False, block_size=512, dereference=False,
+             time_formatter=None):
+    """
+    Prints items in the long format: mode, link count, owner, group, size, time and name, optionally preceded by the
+    serial number and the number of blocks. A directory listing starts with the total number of blocks.
+
+    All entries are stat'ed first, then every column is measured in one pass over the collected fields. Owner and
+    group names, mode strings and times are cached, so a large directory only looks up each owner once.
+    """
+    time_formatter = time_formatter or TimeFormatter()
+    numeric = bool(mode & LongOutputFormat.NUMERIC)
+    show_owner = not mode & LongOutputFormat.NO_OWNER
+    show_group = not mode & LongOutputFormat.NO_GROUP
+    rows = []
+    total = 0
+
+    for entry in items:
+        try:
+            st = entry.stat(follow_symlinks=dereference)
+        except OSError as e:
+            print(f"ls: cannot access '{entry.path}': {e.strerror}", file=sys.stderr)
+            continue
+
+        blocks = _blocks(st, block_size)
+        total += blocks
+        name = formatter(entry)
+
+        if stat.S_ISLNK(st.st_mode):
+            try:
+                name = f"{name} -> {os.readlink(entry.path)}"
+            except OSError:
+                pass
+
+        if stat.S_ISCHR(st.st_mode) or stat.S_ISBLK(st.st_mode):
+            size = f"{os.major(st.st_rdev)}, {os.minor(st.st_rdev)}"
+        else:
+            size = str(st.st_size)
+
+        fields = []
+        if show_inode:
+            fields.append(str(st.st_ino))
+        if show_blocks:
+            fields.append(str(blocks))
+        fields += [_mode_string(st.st_mode), str(st.st_nlink)]
+        if show_owner:
+            fields.append(str(st.st_uid) if numeric else _user_name(st.st_uid))
+        if show_group:
+            fields.append(str(st.st_gid) if numeric else _group_name(st.st_gid))
+        fields += [size, time_formatter(getattr(st, time_field)), name]
+
+        rows.append(fields)
+
+    if directory:
+        print(f"total {total}")
+
+    if not rows:
+        return
+
+    widths = [max(map(len, column)) for column in zip(*rows)]
+    # Owner and group are left aligned, everything else right aligned, and the name isn't padded
+    left = set()
+    owner_column = int(show_inode) + int(show_blocks) + 2
+    if show_owner:
+        left.add(owner_column)
+    if show_group:
+        left.add(owner_column + int(show_owner))
+
+    row_format = " ".join("%-*s" if i in left else "%*s" for i in range(len(widths) - 1)) + " %s"
+
+    for fields in rows:
+        print(row_format % (*chain.from_iterable(zip(widths, fields[:-1])), fields[-1]))
 
 
 _PRINT_FUNC_MAP = {
@@ -109,55 +336,282 @@ _PRINT_FUNC_MAP = {
 }
 
 
-def ls(paths: List[Path], print_func, pf_args={}, show_hidden=False, show_dots=False, recurse=False):
+def sort_key(sort_behavior=None, time_field="st_mtime", follow_links=False) -> Callable:
+    """
+    Returns the key function for sort_behavior. Keys are (value, name) tuples, built from a single stat of the entry,
+    so the largest or newest entries come first and ties are broken by name. Names compare by code point and not by
+    the locale.
+    """
+    if sort_behavior == SortBehavior.FILE_SIZE:
+        field = "st_size"
+    elif sort_behavior == SortBehavior.TIME_MODIFIED:
+        field = time_field + "_ns"
+    else:
+        return entry_name
+
+    def key(entry):
+        try:
+            value = getattr(entry.stat(follow_symlinks=follow_links), field)
+        except OSError:
+            value = 0
+        return -value, entry.name
+
+    return key
+
+
+def order_entries(entries: Iterable, key=entry_name, reverse=False, limit: int = None) -> list:
+    """
+    Returns entries sorted by key. If limit is given, only the first limit entries are returned. They are selected
+    with a heap of limit entries, so the rest are never sorted or kept in memory.
+    """
+    if limit is None:
+        return sorted(entries, key=key, reverse=reverse)
+
+    return (heapq.nlargest if reverse else heapq.nsmallest)(limit, entries, key=key)
+
+
+def _filter_entries(path, it, show_hidden, show_dots):
+    with it:
+        if show_dots:
+            yield PathEntry(os.path.join(path, os.curdir), os.curdir)
+            yield PathEntry(os.path.join(path, os.pardir), os.pardir)
+
+        for entry in it:
+            if show_hidden or not file_utils.is_hidden(entry):
+                yield entry
+
+
+def list_dir(path, show_hidden=False, show_dots=False) -> Iterator:
+    """
+    Returns an iterator over the entries of the directory at path as os.DirEntry objects, in directory order. Hidden
+    entries are skipped unless show_hidden is True. If show_dots is True, "." and ".." come first.
+    The directory is opened by this call, so an error opening it is raised here and not while iterating.
+    """
+    return _filter_entries(path, os.scandir(path), show_hidden, show_dots)
+
+
+def walk(roots: List[str], read_dir, workers: int = 1, prefetch: int = None) -> Iterator[Tuple[str, Any, OSError]]:
+    """
+    Walks the directories in roots and the directories below them depth first, in the order a recursive walk would,
+    without recursion. Yields (path, entries, None) for every directory, or (path, None, error) if it couldn't be
+    read.
+
+    read_dir(path) returns (entries, subdirs), where subdirs are the paths of the directories to walk into after
+    path. subdirs is only read after the caller is done with entries, so it may be filled while entries is consumed.
+
+    If workers is greater than 1, up to prefetch directories that come next in the walk are read ahead on a pool of
+    workers threads, which keeps many reads in flight on slow filesystems. The results are still yielded in walk
+    order, so the output doesn't depend on the number of workers.
     """
-    Iterates over the directories in `paths`, collects items to be printed, and passes them as the first argument to
-    print_func.
+    if workers <= 1:
+        stack = list(reversed(roots))
+
+        while stack:
+            path = stack.pop()
+
+            try:
+                entries, subdirs = read_dir(path)
+            except OSError as e:
+                yield path, None, e
+                continue
+
+            yield path, entries, None
+            stack.extend(reversed(subdirs))
+
+        return
+
+    prefetch = prefetch or workers * 4
+    # Items are [path, future]. The end of the stack is walked first, so it's also read ahead first.
+    stack = [[path, None] for path in reversed(roots)]
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(workers) as pool:
+        try:
+            while stack:
+                for item in stack[:-prefetch - 1:-1]:
+                    if item[1] is None:
+                        item[1] = pool.submit(read_dir, item[0])
+
+                path, future = stack.pop()
+
+                try:
+                    entries, subdirs = future.result()
+                except OSError as e:
+                    yield path, None, e
+                    continue
+
+                yield path, entries, None
+                stack.extend([subdir, None] for subdir in reversed(subdirs))
+        finally:
+            for _, future in stack:
+                if future is not None:
+                    future.cancel()
+
+
+def ls(paths: List[Path], print_func, pf_args={}, show_hidden=False, show_dots=False, recurse=False, sort=True,
+       follow_links=False, workers=1, stat_entries=False, reverse=False, limit=None) -> int:
+    """
+    Lists the directories in `paths`, passing the entries of each to print_func. Returns 0, or 1 if a directory
+    couldn't be read.
+
+    Operands that aren't directories are listed first, together. Directory entries come from os.scandir, and their
+    types from the directory listing itself, so listing, hiding, -p, recursion and sorting by name don't stat
+    anything. If sort is False and workers is 1, entries are passed to print_func as they are read, in directory
+    order.
 
     Arguments:
         paths -- A list of Path objects which point to directories to iterate over.
-        print_func -- A function which takes a list of Path objects to be printed.
+        print_func -- A function which takes an iterable of entries to be printed. It is called with
+            directory=True for the entries of a directory, and without for the operands that aren't directories.
         pf_args -- Aditional arguments to pass to print_func.
         show_hidden -- If True, hidden files will be collected.
         show_dots -- If True "." and ".." will be collected.
         recurse -- If True, ls will recurse on any sub-directories collected.
+        sort -- A key function to sort entries by, such as one returned by sort_key. If True, entries are sorted by
+            name, and if False they are listed in directory order.
+        follow_links -- If True, ls will recurse into symbolic links to directories.
+        workers -- Number of threads reading directories ahead of the output. See walk.
+        stat_entries -- If True and workers is greater than 1, the threads also stat every entry, for print_funcs
+            and formatters that need it.
+        reverse -- If True, the sort order is reversed.
+        limit -- If given, only the first limit entries of each directory and of the other operands are listed.
+            See order_entries.
     """
-    for path in paths:
-        if len(paths) > 1 or recurse:
-            print(f"{path}:")
-
-        if path.is_dir():
-            items = (p for p in path.iterdir() if show_hidden or not file_utils.is_hidden(p))
-
-            print_func(items, **pf_args)
-
-            if recurse:
-                ls([x for x in items if x.is_dir()], print_func, recurse)
+    operands = [PathEntry(p, str(p)) for p in paths]
+    files = [e for e in operands if not e.is_dir()]
+    dirs = [e for e in operands if e.is_dir()]
+    headers = len(paths) > 1 or recurse
+    key = entry_name if sort is True else sort
+    status = 0
+
+    def is_subdir(entry):
+        return entry.name not in (os.curdir, os.pardir) and entry.is_dir(follow_symlinks=follow_links)
+
+    def collect(entries, subdirs):
+        for entry in entries:
+            if is_subdir(entry):
+                subdirs.append(entry.path)
+            yield entry
+
+    def read_dir(path):
+        entries = list_dir(path, show_hidden, show_dots)
+
+        if key:
+            entries = order_entries(entries, key, reverse, limit)
+        elif workers > 1:
+            entries = list(islice(entries, limit))
+        else:
+            # Streamed, so the subdirectories are only known once the entries have been printed
+            entries = islice(entries, limit) if limit is not None else entries
+            subdirs = []
+            return (collect(entries, subdirs) if recurse else entries), subdirs
+
+        if stat_entries and workers > 1:
+            for entry in entries:
+                try:
+                    entry.stat(follow_symlinks=follow_links)
+                except OSError:
+                    pass
+
+        return entries, [entry.path for entry in entries if is_subdir(entry)] if recurse else []
+
+    if files:
+        print_func(order_entries(files, key, reverse, limit) if key else files[:limit], **pf_args)
+
+    first = not files
+    roots = [e.path for e in (order_entries(dirs, key, reverse) if key else dirs)]
+
+    for path, entries, error in walk(roots, read_dir, workers):
+        if headers:
+            print(f"{path}:" if first else f"\n{path}:")
+        first = False
+
+        if error is not None:
+            print(f"ls: cannot open directory '{path}': {error.strerror}", file=sys.stderr)
+            status = 1
+            continue
+
+        print_func(entries, directory=True, **pf_args)
+
+    return status
+
+
+def prefixed_format(formatter, show_inode=False, show_blocks=False, block_size=512):
+    """Wraps a formatter for the short formats to put the serial number and the number of blocks before names."""
+    def format_entry(entry):
+        prefix = ""
+
+        try:
+            if show_inode:
+                prefix += f"{entry.inode()} "
+            if show_blocks:
+                prefix += f"{_blocks(entry.stat(follow_symlinks=False), block_size)} "
+        except OSError:
+            pass
+
+        return prefix + formatter(entry)
+
+    return format_entry
+
+
+_TIME_FIELDS = {
+    TimeBehavior.TIME_MODIFIED: "st_mtime",
+    TimeBehavior.CTIME: "st_ctime",
+    TimeBehavior.TIME_ACCESSED: "st_atime",
+}
 
 
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
     pf_args = {}
+    unsorted = parsed_args.sort_behavior == SortBehavior.ORDER
+    block_size = 1024 if parsed_args.kilo_blocks else 512
+    dereference = parsed_args.dereference_behavior == DereferenceBehavior.ALL
+    time_field = _TIME_FIELDS[parsed_args.time_behavior or TimeBehavior.TIME_MODIFIED]
+
+    # Decide on a formatter
+    formatter = entry_name
+    if parsed_args.augment_output == AugmentOutput.ALL:
+        formatter = classify_format
+    elif parsed_args.augment_output == AugmentOutput.ONLY_DIRECTORIES:
+        formatter = dir_format
 
     # Choose which method of printing should be used
     if parsed_args.long_output_format:
         print_func = long_out
         pf_args["mode"] = parsed_args.long_output_format
-    elif parsed_args.short_output_format:
-        print_func = _PRINT_FUNC_MAP[parsed_args.short_output_format]
+        pf_args["time_field"] = time_field
+        pf_args["show_inode"] = parsed_args.write_serial
+        pf_args["show_blocks"] = parsed_args.display_blocks
+        pf_args["block_size"] = block_size
+        pf_args["dereference"] = dereference
+        pf_args["time_formatter"] = TimeFormatter()
     else:
-        print_func = short_column_out
+        if parsed_args.short_output_format:
+            print_func = _PRINT_FUNC_MAP[parsed_args.short_output_format]
+        elif sys.stdout.isatty():
+            print_func = short_column_out
+        else:
+            print_func = short_list_out
 
-    # Decide on a formatter
-    if parsed_args.augment_output:
-        pf_args["formatter"] = dir_format
+        if parsed_args.write_serial or parsed_args.display_blocks:
+            formatter = prefixed_format(formatter, parsed_args.write_serial, parsed_args.display_blocks, block_size)
+
+    pf_args["formatter"] = formatter
+    key = None if unsorted else sort_key(parsed_args.sort_behavior, time_field, dereference)
 
     paths = resolve_paths(parsed_args.paths, ignore=["."])
-    ls(paths,
-       print_func,
-       pf_args=pf_args,
-       show_hidden=bool(parsed_args.entry_output),
-       show_dots=bool(parsed_args.entry_output == EntryOutput.SHOW_HIDDEN_PLUS),
-       recurse=parsed_args.recurse)
-
-    return 0
\ No newline at end of file
+    return ls(paths,
+              print_func,
+              pf_args=pf_args,
+              # -f lists everything, in directory order
+              show_hidden=bool(parsed_args.entry_output) or unsorted,
+              show_dots=bool(parsed_args.entry_output == EntryOutput.SHOW_HIDDEN_PLUS),
+              recurse=parsed_args.recurse,
+              sort=key or False,
+              follow_links=dereference,
+              workers=parsed_args.workers,
+              stat_entries=print_func is long_out or formatter is not entry_name,
+              reverse=parsed_args.reverse_order,
+              limit=parsed_args.limit)
@@ -1,12 +1,19 @@
 from collections import namedtuple
-from typing import List
+from typing import Dict, List, Optional, Tuple
 from pathlib import Path
+from .rm import remove_tree
 from .utils.arg import resolve_paths
+from .utils.file import copy_stream
+import errno
 import getopt
+import os
+import stat
+import sys
+import tempfile
 
 HELP ="""
-usage: mv [-i] [-f] SOURCE_FILE TARGET_FILE
-   or: mv [-i] [-f] SOURCE_FILE [SOURCE_FILE ...] TARGET_DIR
+usage: mv [-i] [-f] [--jobs N] SOURCE_FILE TARGET_FILE
+   or: mv [-i] [-f] [--jobs N] SOURCE_FILE [SOURCE_FILE ...] TARGET_DIR
 
 Renames SOURCE_FILE to TARGET_FILE, or moves SOURCE_FILE(s) to TARGET_DIR.
 
@@ -14,46 +21,272 @@ optional arguments:
 -h      Show this help message and exit.
 -i      Prompt for confirmation if the destination path exists. Any previous occurance of -f is ignored.
 -f      Do not prompt for confirmation if the destination path exists. Any previous occurrence of the -i option is ignored.
+--jobs  Number of threads copying files when a directory is moved to another file system.
 """
 
-Arguments = namedtuple("Arguments", ["mode", "target", "source"])
+Arguments = namedtuple("Arguments", ["mode", "target", "source", "jobs", "patterns"])
+
+def _parse_jobs(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise getopt.GetoptError(f"option --jobs requires an integer, not {value!r}", "jobs")
 
 def parse_args(args: List[str]):
-    parsed_args, remainder = getopt.getopt(args, "hif")
+    parsed_args, remainder = getopt.getopt(args, "hif", ["jobs="])
 
     if not args or ('-h', '') in parsed_args:
         print(HELP)
         return None
-    
-    mode = None
-    if parsed_args:
-        mode = parsed_args[-1][0][1]
-    
+
+    mode = next((k[1] for k, _ in reversed(parsed_args) if k in ("-i", "-f")), None)
+    jobs = next((_parse_jobs(v) for k, v in reversed(parsed_args) if k == "--jobs"), 1)
+
     target = Path(remainder[-1])
     source = resolve_paths(remainder[:-1])
 
-    return Arguments(mode, target, source)
+    return Arguments(mode, target, source, jobs, remainder[:-1])
+
+def _copy_metadata(src, dst, st: os.stat_result):
+    """Gives dst the owner, mode, times and extended attributes of src, whose lstat is st, as far as allowed."""
+    is_link = stat.S_ISLNK(st.st_mode)
+
+    try:
+        # Before chmod, since changing the owner clears the set-user-ID bit
+        os.chown(dst, st.st_uid, st.st_gid, follow_symlinks=False)
+    except (PermissionError, NotImplementedError):
+        pass
+
+    if hasattr(os, "listxattr"):
+        # Before chmod, which may take away the permission to write them
+        try:
+            for name in os.listxattr(src, follow_symlinks=False):
+                os.setxattr(dst, name, os.getxattr(src, name, follow_symlinks=False), follow_symlinks=False)
+        except OSError as e:
+            if e.errno not in (errno.ENOTSUP, errno.EPERM, errno.ENODATA):
+                raise
+
+    if not is_link:
+        os.chmod(dst, stat.S_IMODE(st.st_mode))
+
+    if not is_link or os.utime in os.supports_follow_symlinks:
+        os.utime(dst, ns=(st.st_atime_ns, st.st_mtime_ns), follow_symlinks=False)
+
+def copy_file(src, dst, st: Optional[os.stat_result] = None):
+    """
+    Copies the file src to dst, which must not exist, with its metadata. st is the lstat of src, if known.
+    Symbolic links are copied as links, and the data of regular files is copied in the kernel where possible.
+    """
+    st = st or os.lstat(src)
+    mode = st.st_mode
+
+    if stat.S_ISLNK(mode):
+        os.symlink(os.readlink(src), dst)
+    elif stat.S_ISREG(mode):
+        with open(src, "rb", buffering=0) as fsrc, open(dst, "xb", buffering=0) as fdst:
+            copy_stream(fsrc, fdst)
+    elif stat.S_ISFIFO(mode):
+        os.mkfifo(dst, stat.S_IMODE(mode))
+    elif stat.S_ISCHR(mode) or stat.S_ISBLK(mode):
+        os.mknod(dst, mode, st.st_rdev)
+    else:
+        raise OSError(errno.EOPNOTSUPP, "Cannot copy this type of file", os.fspath(src))
+
+    _copy_metadata(src, dst, st)
+
+def copy_tree(src, dst, workers: int = 1):
+    """
+    Copies the directory src and everything below it to dst, which must not exist, with their metadata.
+
+    Directories are created as they are read, and the files are copied on a pool of workers threads if workers is
+    greater than 1. The metadata of the directories is copied last, so copying their contents doesn't change their
+    times. Raises the first error met.
+    """
+    dirs = []
+    stack = [(os.fspath(src), os.fspath(dst), os.lstat(src))]
+    pool = None
+
+    if workers > 1:
+        from concurrent.futures import ThreadPoolExecutor
+        pool = ThreadPoolExecutor(workers)
+
+    futures = []
+
+    try:
+        while stack:
+            src_dir, dst_dir, st = stack.pop()
+            # Only the owner may use the directory until its metadata is copied
+            os.mkdir(dst_dir, 0o700)
+            dirs.append((src_dir, dst_dir, st))
+
+            with os.scandir(src_dir) as it:
+                for entry in it:
+                    entry_st = entry.stat(follow_symlinks=False)
+                    dst_path = os.path.join(dst_dir, entry.name)
+
+                    if stat.S_ISDIR(entry_st.st_mode):
+                        stack.append((entry.path, dst_path, entry_st))
+                    elif pool is not None:
+                        futures.append(pool.submit(copy_file, entry.path, dst_path, entry_st))
+                    else:
+                        copy_file(entry.path, dst_path, entry_st)
+
+        for future in futures:
+            future.result()
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    for src_dir, dst_dir, st in reversed(dirs):
+        _copy_metadata(src_dir, dst_dir, st)
+
+def move(src, dst, workers: int = 1):
+    """
+    Moves src to dst, replacing dst like os.replace. Raises OSError if src couldn't be moved.
+
+    os.replace is tried first. If src and dst are on different file systems, src is copied to a temporary name next
+    to dst, with copy_file or copy_tree, renamed over dst and then removed. If the copy fails, src is left as it was.
+    """
+    try:
+        os.replace(src, dst)
+        return
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+
+    st = os.lstat(src)
+    is_dir = stat.S_ISDIR(st.st_mode)
+
+    try:
+        dst_is_dir = stat.S_ISDIR(os.lstat(dst).st_mode)
+    except FileNotFoundError:
+        dst_is_dir = is_dir
+
+    if dst_is_dir != is_dir:
+        code = errno.ENOTDIR if is_dir else errno.EISDIR
+        raise OSError(code, os.strerror(code), os.fspath(dst))
+
+    tmp_dir = tempfile.mkdtemp(prefix=".mv-", dir=os.path.dirname(os.path.abspath(dst)))
+    tmp = os.path.join(tmp_dir, os.path.basename(dst))
+
+    try:
+        if is_dir:
+            copy_tree(src, tmp, workers)
+        else:
+            copy_file(src, tmp, st)
+
+        os.replace(tmp, dst)
+    finally:
+        remove_tree(tmp_dir)
+
+    if not is_dir:
+        os.unlink(src)
+        return
+
+    errors = []
+    if not remove_tree(src, lambda path, e: errors.append(e), workers):
+        raise errors[0]
+
+def plan_moves(sources: List[Path], target_dir: Path) -> Dict[Path, Optional[Tuple[int, int]]]:
+    """
+    Maps every source to the (st_dev, st_ino) of the entry of the same name in target_dir, or to None if there is
+    none. target_dir is opened once and each name is looked up with an lstat relative to it, so the cost only
+    depends on the number of sources. Raises NotADirectoryError or FileNotFoundError if target_dir isn't a
+    directory.
+    """
+    fd = None
+
+    if os.stat in os.supports_dir_fd and hasattr(os, "O_DIRECTORY"):
+        # O_PATH needs no permission on target_dir itself, like moving into a write-only drop box
+        flags = getattr(os, "O_PATH", os.O_RDONLY) | os.O_DIRECTORY | getattr(os, "O_CLOEXEC", 0)
+
+        try:
+            fd = os.open(target_dir, flags)
+        except PermissionError:
+            # Without O_PATH, opening needs read permission, which names can be looked up without
+            pass
+
+    if fd is not None:
+        def lookup(name):
+            return os.stat(name, dir_fd=fd, follow_symlinks=False)
+    else:
+        if not stat.S_ISDIR(os.stat(target_dir).st_mode):
+            raise NotADirectoryError(errno.ENOTDIR, os.strerror(errno.ENOTDIR), os.fspath(target_dir))
+
+        def lookup(name):
+            return os.lstat(os.path.join(target_dir, name))
+
+    plan = {}
+
+    try:
+        for source in sources:
+            try:
+                st = lookup(source.name)
+                plan[source] = (st.st_dev, st.st_ino)
+            except FileNotFoundError:
+                plan[source] = None
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+    return plan
 
 def _cmd_main(args: List[str]):
-    args = parse_args(args)
+    try:
+        args = parse_args(args)
+    except getopt.GetoptError as e:
+        print(f"mv: error: {e.msg}", file=sys.stderr)
+        return 1
 
     if not args:
         return 0
 
-    # First synopsis is assumed if target_file does not name an exisiting directory
-    if not args.target.is_dir():
-        args.source[0].rename(args.target)
-        return 0
+    status = 0
 
-    # Second synopsis
-    for s in args.source:
-        target = args.target / s.name
+    if not args.source:
+        for pattern in args.patterns:
+            print(f"mv: cannot stat {pattern}: No such file or directory", file=sys.stderr)
+        return 1
 
-        if target.exists() and args.mode == 'i':
-            answer = input(f"mv: overwrite {target}?")
-            if answer.beginswith("y"):
-                s.replace(target)
-        elif target.exists() and s.samefile(target):
-            print(f"mv: error: {target} points to same location {s}")
-        else:
-            s.rename(target)
\ No newline at end of file
+    try:
+        # Second synopsis
+        conflicts = plan_moves(args.source, args.target)
+        targets = {s: args.target / s.name for s in args.source}
+    except (FileNotFoundError, NotADirectoryError):
+        # First synopsis is assumed if target_file does not name an exisiting directory
+        if len(args.source) != 1:
+            print(f"mv: error: target {args.target} is not a directory", file=sys.stderr)
+            return 1
+
+        try:
+            st = os.lstat(args.target)
+            conflicts = {args.source[0]: (st.st_dev, st.st_ino)}
+        except FileNotFoundError:
+            conflicts = {args.source[0]: None}
+
+        targets = {args.source[0]: args.target}
+    except OSError as e:
+        print(f"mv: cannot access {args.target}: {e.strerror}", file=sys.stderr)
+        return 1
+
+    for s, existing in conflicts.items():
+        target = targets[s]
+
+        if existing is not None:
+            st = os.lstat(s)
+
+            if existing == (st.st_dev, st.st_ino):
+                print(f"mv: error: {target} points to same location {s}", file=sys.stderr)
+                status = 1
+                continue
+
+            if args.mode == 'i' and not input(f"mv: overwrite {target}?").startswith("y"):
+                continue
+
+        try:
+            move(s, target, args.jobs)
+        except OSError as e:
+            print(f"mv: cannot move {s} to {target}: {e.strerror}", file=sys.stderr)
+            status = 1
+
+    return status
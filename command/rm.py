@@ -1,12 +1,16 @@
-from collections import namedtuple
-from typing import List
+from collections import deque, namedtuple
+from typing import Callable, List, Optional
 from pathlib import Path
 from .utils.arg import resolve_paths
+import errno
 import getopt
+import os
+import shutil
+import stat
 import sys
 
 HELP = """
-usage: rm [-f] [-i] [-R] [-r] file [file ...]
+usage: rm [-f] [-i] [-R] [-r] [--jobs N] file [file ...]
 
 Removes all specified files.
 
@@ -16,55 +20,295 @@ optional arguments:
 -i      Prompt for confirmation.
 -R      Remove heirarchies
 -r      Same as -R
+--jobs  Number of threads removing subtrees of a hierarchy at the same time. Ignored with -i.
 """
 
-Arguments = namedtuple("Arguments", ["mode", "recurse", "files"])
+# Number of directory file descriptors a removal keeps open. Deeper directories are closed and reopened as needed.
+FD_WINDOW = 64
+
+_OPEN_FLAGS = os.O_RDONLY | getattr(os, "O_DIRECTORY", 0) | getattr(os, "O_NOFOLLOW", 0) | getattr(os, "O_CLOEXEC", 0)
+_USE_FD = {os.open, os.unlink, os.rmdir} <= os.supports_dir_fd and os.scandir in os.supports_fd
+
+Arguments = namedtuple("Arguments", ["mode", "recurse", "files", "jobs"])
+
+def _parse_jobs(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        raise getopt.GetoptError(f"option --jobs requires an integer, not {value!r}", "jobs")
 
 def parse_args(args: List[str]):
     if not args:
         return None
 
-    parsed_args, remainder = getopt.getopt(args, "hfiRr")
+    parsed_args, remainder = getopt.getopt(args, "hfiRr", ["jobs="])
+    jobs = next((_parse_jobs(v) for k, v in reversed(parsed_args) if k == "--jobs"), 1)
     parsed_args = [x[0] for x in parsed_args]
 
     if '-h' in parsed_args:
         print(HELP)
         return None
-    
+
     return Arguments(
         next((i[1] for i in reversed(parsed_args) if i == "-f" or i == "-i"), None),
         "-r" in parsed_args or "-R" in parsed_args,
-        resolve_paths(remainder)
+        # Operands matching nothing are kept, so remove() reports them unless -f is given
+        resolve_paths(remainder, on_unmatched=Path),
+        jobs
     )
 
-def remove(files: List[Path], mode: str, recurse: bool):
+class _Dir():
+    """
+    A directory being removed. It is opened relative to the file descriptor of its parent, and its own descriptor
+    may be closed and reopened while its subdirectories are removed.
+    """
+    __slots__ = ("name", "parent", "path", "fd", "ident", "subdirs", "failed")
+
+    def __init__(self, name: str, parent: "_Dir" = None):
+        self.name = name
+        self.parent = parent
+        self.path = name if parent is None else os.path.join(parent.path, name)
+        self.fd = None
+        # (st_dev, st_ino) of the first open, to make sure a reopened directory is still the same one
+        self.ident = None
+        # Names of the subdirectories still to remove, or None until the directory was read
+        self.subdirs = None
+        # Set when something below the directory couldn't be removed, so the directory itself isn't either
+        self.failed = False
+
+def _open(d: _Dir, window: Optional[deque] = None, window_size: int = FD_WINDOW) -> int:
+    """
+    Returns the file descriptor of d, opening d and any of its closed ancestors first. Symbolic links are never
+    followed. Descriptors opened here are added to window, and the oldest ones are closed once it holds more than
+    window_size.
+    """
+    closed = []
+    node = d
+
+    while node is not None and node.fd is None:
+        closed.append(node)
+        node = node.parent
+
+    for node in reversed(closed):
+        fd = os.open(node.name, _OPEN_FLAGS, dir_fd=node.parent.fd if node.parent else None)
+        st = os.fstat(fd)
+
+        if node.ident is None:
+            node.ident = (st.st_dev, st.st_ino)
+        elif node.ident != (st.st_dev, st.st_ino):
+            os.close(fd)
+            raise OSError(errno.ESTALE, "Directory was replaced during removal", node.path)
+
+        node.fd = fd
+
+        if window is not None:
+            window.append(node)
+
+    while window is not None and len(window) > max(window_size, 1):
+        _close(window.popleft())
+
+    return d.fd
+
+def _close(d: _Dir, window: Optional[deque] = None):
+    if d.fd is not None:
+        os.close(d.fd)
+        d.fd = None
+
+        if window is not None:
+            window.remove(d)
+
+def _clear(d: _Dir, fd: int, on_error: Callable, confirm: Optional[Callable]) -> List[str]:
+    """Unlinks everything in d that isn't a directory and returns the names of the subdirectories."""
+    subdirs = []
+
+    with os.scandir(fd) as it:
+        for entry in it:
+            try:
+                is_dir = entry.is_dir(follow_symlinks=False)
+
+                if confirm is not None and not confirm(os.path.join(d.path, entry.name), is_dir):
+                    d.failed = True
+                elif is_dir:
+                    subdirs.append(entry.name)
+                else:
+                    os.unlink(entry.name, dir_fd=fd)
+            except OSError as e:
+                on_error(os.path.join(d.path, entry.name), e)
+                d.failed = True
+
+    return subdirs
+
+def _rmdir(d: _Dir, on_error: Callable, window: Optional[deque] = None):
+    if d.failed:
+        if d.parent is not None:
+            d.parent.failed = True
+        return
+
+    try:
+        os.rmdir(d.name, dir_fd=_open(d.parent, window) if d.parent else None)
+    except OSError as e:
+        on_error(d.path, e)
+        if d.parent is not None:
+            d.parent.failed = True
+
+def _remove_subtree(root: _Dir, on_error: Callable, confirm: Optional[Callable] = None,
+                    window_size: int = FD_WINDOW):
+    """Removes root and everything below it depth first, with an explicit stack instead of recursion."""
+    window = deque()
+    stack = [root]
+
+    try:
+        while stack:
+            d = stack[-1]
+
+            if d.subdirs is None:
+                try:
+                    d.subdirs = _clear(d, _open(d, window, window_size), on_error, confirm)
+                except OSError as e:
+                    on_error(d.path, e)
+                    d.subdirs = []
+                    d.failed = True
+
+            if d.subdirs:
+                stack.append(_Dir(d.subdirs.pop(), d))
+                continue
+
+            stack.pop()
+            _close(d, window)
+            _rmdir(d, on_error, window)
+    finally:
+        while window:
+            _close(window.pop())
+
+def _expand(root: _Dir, on_error: Callable, target: int, max_depth: int = 8):
+    """
+    Reads directories breadth first from root until a level holds at least target subdirectories, or max_depth levels
+    were read. Returns the directories that were read, which stay open, and the subdirectories of the last level.
+    """
+    expanded = []
+    level = [root]
+
+    for _ in range(max_depth):
+        if len(level) >= target:
+            break
+
+        next_level = []
+
+        for d in level:
+            try:
+                subdirs = _clear(d, _open(d), on_error, None)
+            except OSError as e:
+                on_error(d.path, e)
+                d.failed = True
+                _rmdir(d, on_error)
+                continue
+
+            d.subdirs = []
+            expanded.append(d)
+            next_level.extend(_Dir(name, d) for name in subdirs)
+
+        level = next_level
+
+    return expanded, level
+
+def remove_tree(path, on_error: Callable = None, workers: int = 1, confirm: Callable = None,
+                window_size: int = FD_WINDOW) -> bool:
+    """
+    Removes the directory at path and everything below it. Returns True if everything was removed.
+
+    Directories are read with os.scandir on a file descriptor, and their entries are unlinked relative to it, so
+    paths aren't resolved again for every entry and symbolic links are never followed, even if a directory is
+    replaced by a link during the removal. An explicit stack is used instead of recursion, and at most window_size
+    descriptors are kept open, so the depth of the tree isn't limited.
+
+    If workers is greater than 1, the top of the tree is read until there are enough subdirectories to keep the
+    workers busy, and those subtrees are removed on a pool of threads.
+
+    on_error(path, error) is called for every entry that couldn't be removed. If confirm is given, it is called as
+    confirm(path, is_dir) for every entry below path, and entries it returns False for are left alone.
+    """
+    errors = []
+
+    def record(p, e):
+        errors.append(e)
+        if on_error is not None:
+            on_error(p, e)
+
+    if not _USE_FD:
+        # No directory file descriptors on this platform
+        shutil.rmtree(path, onerror=lambda func, p, exc_info: record(p, exc_info[1]))
+        return not errors
+
+    root = _Dir(os.fspath(path))
+
+    if workers <= 1 or confirm is not None:
+        _remove_subtree(root, record, confirm, window_size)
+        return not (errors or root.failed)
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    expanded, subtrees = _expand(root, record, workers * 4)
+
+    try:
+        with ThreadPoolExecutor(workers) as pool:
+            for _ in pool.map(lambda d: _remove_subtree(d, record, None, window_size), subtrees):
+                pass
+    finally:
+        # Children come after their parents, so this removes every directory after its subdirectories
+        for d in reversed(expanded):
+            _close(d)
+            _rmdir(d, record)
+
+    return not (errors or root.failed)
+
+def remove(files: List[Path], mode: str, recurse: bool, workers: int = 1) -> int:
+    """Removes files, prompting before each if mode is "i". Returns 0, or 1 if anything couldn't be removed."""
+    status = 0
+
+    def report(path, e):
+        nonlocal status
+        print(f"rm: cannot remove {path}: {e.strerror}", file=sys.stderr)
+        status = 1
+
+    def ask(path, is_dir):
+        prompt = "descend into directory" if is_dir else "remove file"
+        return input(f"rm: {prompt} {path}?").startswith("y")
+
     for path in files:
-        if not path.exists():
+        try:
+            is_dir = stat.S_ISDIR(os.lstat(path).st_mode)
+        except FileNotFoundError:
             if mode != "f":
                 print(f"rm: {path} not found", file=sys.stderr)
-        elif path.is_dir():
-            if not recurse:
-                print(f"rm: cannot remove {path}: is a directory", file=sys.stderr)
-            elif mode == "i":
-                answer = input(f"rm: descend into directory {path}?")
-                if answer.startswith("y"):
-                    remove(list(path.iterdir()), mode, recurse)
-                    path.rmdir()
-            else:
-                remove(list(path.iterdir()), mode, recurse)
-                path.rmdir()
-        elif mode == "i":
-            answer = input(f"rm: remove file {path}?")
-            if answer.startswith("y"):
-                path.unlink()
+                status = 1
+            continue
+        except OSError as e:
+            report(path, e)
+            continue
+
+        if is_dir and not recurse:
+            print(f"rm: cannot remove {path}: is a directory", file=sys.stderr)
+            status = 1
+        elif mode == "i" and not ask(path, is_dir):
+            continue
+        elif is_dir:
+            remove_tree(path, report, workers, ask if mode == "i" else None)
         else:
-            path.unlink()
+            try:
+                os.unlink(path)
+            except OSError as e:
+                report(path, e)
+
+    return status
 
 def _cmd_main(args: List[str]):
-    parsed_args = parse_args(args)
+    try:
+        parsed_args = parse_args(args)
+    except getopt.GetoptError as e:
+        print(f"rm: error: {e.msg}", file=sys.stderr)
+        return 1
+
     if not parsed_args:
         return 0
 
-    remove(parsed_args.files, parsed_args.mode, parsed_args.recurse)
-
-    
+    return remove(parsed_args.files, parsed_args.mode, parsed_args.recurse, parsed_args.jobs)
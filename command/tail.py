@@ -1,12 +1,21 @@
-from typing import List
+from collections import deque
+from typing import List, Optional
 from pathlib import Path
+from .utils.file import BUFFER_SIZE, copy_stream
+from .utils.watch import make_watcher
 import argparse
 import io
+import os
+import sys
 
 
 def parse_n(in_str: str) -> int:
+    """
+    Positive results count from the start of the file, starting at 1. Negative results count from the end.
+    """
     if in_str.startswith("+"):
-        return int(in_str[1:])
+        # +0 and +1 both mean the whole file
+        return max(int(in_str[1:]), 1)
     if in_str.startswith("-"):
         return -1 * int(in_str[1:])
     return -1 * int(in_str)
@@ -17,66 +26,361 @@ arg_parser = argparse.ArgumentParser(
     description="Copy the last part of a file."
 )
 arg_parser.add_argument("-f", action="store_true", dest="wait", help="Do not terminate when the last line has been copied. Copy new lines as they become available until the limit is reached.")
-arg_parser.add_argument("file", type=Path, nargs="?")
+arg_parser.add_argument("-F", action="store_true", dest="retry", help="Same as -f, but follow files by name: reopen a file that was truncated, rotated or removed and recreated.")
+arg_parser.add_argument("file", type=Path, nargs="*", default=[Path("-")], help="Files to read. Standard input is read if none are given or a file is -.")
 number_group = arg_parser.add_mutually_exclusive_group()
 number_group.add_argument("-c", type=parse_n, metavar="n", dest="n_bytes", help="Read n bytes from the file.")
-number_group.add_argument("-n", type=parse_n, metavar="n", dest="n_lines", default=10, help="Read n lines from the file.")
+number_group.add_argument("-n", type=parse_n, metavar="n", dest="n_lines", default=-10, help="Read n lines from the file.")
 
 
-def read_bytes(file, n: int, wait: bool = False):
+def last_lines_offset(file, n: int, block_size: int = BUFFER_SIZE) -> int:
     """
-    Reads n bytes relative to the start of the file.
-    If n is negative, then the read will be relative to the end.
+    Returns the offset of the start of the last n lines of the seekable binary file.
 
-    If wait is true, then the function will print bytes as they become available until exactly n bytes are read.
+    Blocks are read backwards from the end until n line starts have been found, so the cost depends on the size
+    of those lines and not on the size of the file. A final line without a newline counts as a line.
     """
+    end = file.seek(0, io.SEEK_END)
 
-    if not file.seekable():
-        raise ValueError("file is not seekable")
+    if n <= 0 or end == 0:
+        return end
 
-    if n < 0:
-        file.seek(n, io.SEEK_END)
-        n = n * -1
+    file.seek(end - 1)
+    # The newline ending the last line doesn't start another line
+    wanted = n + 1 if file.read(1) == b"\n" else n
+    pos = end
 
-    if not wait:
-        print(file.read(n), end="")
-    else:
-        while n > 0:
-            output = file.read(n)
+    while pos > 0:
+        start = max(0, pos - block_size)
+        file.seek(start)
+        block = file.read(pos - start)
+        found = block.count(b"\n")
 
-            if not output:
-                continue
-            else:
-                print(output, end="")
-                n -= len(output)
+        if found >= wanted:
+            # The first element of the split ends right before the wanted newline
+            return start + len(block.rsplit(b"\n", wanted)[0]) + 1
 
+        wanted -= found
+        pos = start
 
-def read_lines(file, n: int, wait: bool = False):
+    return 0
+
+
+def skip_lines(file, n: int, block_size: int = BUFFER_SIZE) -> bytes:
+    """
+    Reads past the first n lines of the binary file by counting newlines per block.
+    Returns whatever was read after the nth line, which is empty at the end of the file.
     """
-    Reads n lines relative to the start of the file.
-    If n is negative, then the read will be relative to the end.
+    read = getattr(file, "read1", file.read)
+
+    while n > 0:
+        block = read(block_size)
+
+        if not block:
+            return b""
+
+        found = block.count(b"\n")
+
+        if found >= n:
+            return block.split(b"\n", n)[-1]
+
+        n -= found
+
+    return b""
+
+
+def last_stream_lines(file, n: int, block_size: int = BUFFER_SIZE) -> memoryview:
+    """
+    Reads the binary file to the end and returns its last n lines. Works on pipes and other files that can't seek.
+
+    Only a bounded queue of blocks is kept: the oldest block is dropped as soon as the blocks after it hold more
+    than n newlines, so memory use is proportional to the size of the last n lines and not of the whole stream.
+    """
+    read = getattr(file, "read1", file.read)
+    blocks = deque()
+    newlines = 0
+
+    while True:
+        block = read(block_size)
+
+        if not block:
+            break
+
+        found = block.count(b"\n")
+        blocks.append((block, found))
+        newlines += found
+
+        # n + 1 newlines delimit the last n lines even when the stream ends with a newline
+        while len(blocks) > 1 and newlines - blocks[0][1] > n:
+            newlines -= blocks.popleft()[1]
+
+    data = b"".join(block for block, _ in blocks)
+    return memoryview(data)[last_lines_offset(io.BytesIO(data), n):]
+
+
+def last_stream_bytes(file, n: int, block_size: int = BUFFER_SIZE) -> memoryview:
+    """
+    Reads the binary file to the end and returns its last n bytes, keeping only a bounded queue of blocks.
+    """
+    read = getattr(file, "read1", file.read)
+    blocks = deque()
+    size = 0
+
+    while True:
+        block = read(block_size)
+
+        if not block:
+            break
+
+        blocks.append(block)
+        size += len(block)
+
+        while len(blocks) > 1 and size - len(blocks[0]) >= n:
+            size -= len(blocks.popleft())
+
+    data = b"".join(blocks)
+    return memoryview(data)[max(0, len(data) - n):]
+
+
+def _skip_bytes(file, n: int, block_size: int = BUFFER_SIZE):
+    read = getattr(file, "read1", file.read)
+
+    while n > 0:
+        block = read(min(n, block_size))
+
+        if not block:
+            return
+
+        n -= len(block)
+
+
+def read_bytes(file, n: int, out=None):
+    """
+    Copies the binary file to out, starting at byte n (counting from 1).
+    If n is zero or negative, the last -n bytes are copied instead. out defaults to sys.stdout.buffer.
+    """
+    out = out or sys.stdout.buffer
+
+    if n <= 0 and not file.seekable():
+        out.write(last_stream_bytes(file, -n))
+        return
+
+    if n <= 0:
+        end = file.seek(0, io.SEEK_END)
+        file.seek(max(0, end + n))
+    elif file.seekable():
+        file.seek(n - 1, io.SEEK_CUR)
+    else:
+        _skip_bytes(file, n - 1)
+
+    copy_stream(file, out)
+
 
-    If wait is true, then the function will print lines as they become available until exactly n lines are read.
+def read_lines(file, n: int, out=None):
     """
+    Copies the binary file to out, starting at line n (counting from 1).
+    If n is zero or negative, the last -n lines are copied instead. out defaults to sys.stdout.buffer.
+    """
+    out = out or sys.stdout.buffer
+
+    if n <= 0 and not file.seekable():
+        out.write(last_stream_lines(file, -n))
+        return
 
-    if n >= 0:
-        lines = [next(file) for _ in range(n)]
+    if n <= 0:
+        file.seek(last_lines_offset(file, -n))
     else:
-        # TODO: This will only work for smaller files, and use a lot of memory
-        lines = list(file)[n:]
+        out.write(skip_lines(file, n - 1))
+
+    copy_stream(file, out)
+
+
+class FollowedFile():
+    """
+    A file followed by tail -f. If retry is True the file is followed by name, so a file that is rotated or removed
+    and recreated is reopened, as with -F.
+    """
+
+    def __init__(self, path: Path, file=None, retry: bool = False):
+        self.path = path
+        self.retry = retry
+        self.file = None
+        self.pos = 0
+        self.ident = None
+        # Set when a new file was opened, so the caller knows to watch it
+        self.reopened = False
+
+        if file is not None:
+            self._set_file(file)
+
+    def _set_file(self, file):
+        st = os.fstat(file.fileno())
+        self.file = file
+        self.ident = (st.st_dev, st.st_ino)
+        self.pos = file.tell()
+
+    def _close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def _open(self) -> bool:
+        try:
+            self._set_file(open(self.path, "rb", buffering=0))
+        except OSError:
+            return False
+
+        self.reopened = True
+        return True
+
+    def _drain(self, out, before_write) -> bool:
+        wrote = False
+
+        while True:
+            chunk = self.file.read(BUFFER_SIZE)
+
+            if not chunk:
+                return wrote
+
+            if not wrote:
+                before_write(self)
+                wrote = True
+
+            out.write(chunk)
+            self.pos += len(chunk)
+
+    def poll(self, out, before_write) -> bool:
+        """
+        Copies data appended since the last call to out, calling before_write(self) before the first write.
+        Handles truncation, and with retry also rotation and removal. Returns True if anything changed.
+        """
+        if self.file is None:
+            if not self.retry or not self._open():
+                return False
+
+            print(f"tail: '{self.path}' has appeared;  following new file", file=sys.stderr)
+            self.file.seek(0)
+            self.pos = 0
+        elif os.fstat(self.file.fileno()).st_size < self.pos:
+            print(f"tail: {self.path}: file truncated", file=sys.stderr)
+            self.file.seek(0)
+            self.pos = 0
+
+        changed = self._drain(out, before_write)
+
+        if not self.retry:
+            return changed
+
+        try:
+            st = os.stat(self.path)
+        except OSError as e:
+            print(f"tail: '{self.path}' has become inaccessible: {e.strerror}", file=sys.stderr)
+            self._close()
+            return True
 
-    for l in lines:
-        print(l)
+        if (st.st_dev, st.st_ino) != self.ident:
+            # Whatever was written to the old file before the rotation was drained above
+            self._close()
+
+            if self._open():
+                print(f"tail: '{self.path}' has been replaced;  following new file", file=sys.stderr)
+                self._drain(out, before_write)
+
+            changed = True
+
+        return changed
+
+
+def follow(files: List[FollowedFile], out=None, headers: bool = False, current: Optional[FollowedFile] = None,
+           watcher=None, should_stop=None, timeout: Optional[float] = None):
+    """
+    Copies data appended to files to out until interrupted or should_stop() returns True.
+
+    The process sleeps in the watcher until a file changes, so idle files cost no CPU with inotify and very little
+    with polling. If headers is True, a "==> name <==" header is written whenever the output switches to another
+    file; current is the file whose data was written last. timeout limits how long a single wait may block.
+    """
+    out = out or sys.stdout.buffer
+    watcher = watcher or make_watcher()
+    last = [current]
+
+    def before_write(f):
+        if headers and last[0] is not f:
+            out.write(f"\n==> {f.path} <==\n".encode())
+        last[0] = f
+
+    for key, f in enumerate(files):
+        watcher.watch(key, f.path)
+        f.reopened = False
+
+    try:
+        while not (should_stop and should_stop()):
+            # Files that don't exist yet are retried once a second in case their directory can't be watched either
+            missing = [key for key, f in enumerate(files) if f.file is None and f.retry]
+            wait_timeout = 1.0 if missing and (timeout is None or timeout > 1.0) else timeout
+            changed = watcher.wait(wait_timeout)
+            keys = range(len(files)) if changed is None else sorted(set(changed).union(missing))
+
+            active = False
+            for key in keys:
+                active = files[key].poll(out, before_write) or active
+
+                if files[key].reopened:
+                    watcher.watch(key, files[key].path)
+                    files[key].reopened = False
+
+            watcher.report_activity(active)
+            out.flush()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
 
 
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
+    out = sys.stdout.buffer
+    headers = len(parsed_args.file) > 1
+    wait = parsed_args.wait or parsed_args.retry
+    followed = []
+    status = 0
+
+    sys.stdout.flush()
+
+    for i, path in enumerate(parsed_args.file):
+        is_stdin = str(path) == "-"
+
+        try:
+            f = sys.stdin.buffer if is_stdin else open(path, mode="rb", buffering=0)
+        except OSError as e:
+            print(f"tail: cannot open '{path}' for reading: {e.strerror}", file=sys.stderr)
+            status = 1
+
+            if parsed_args.retry:
+                followed.append(FollowedFile(path, retry=True))
+            continue
+
+        if headers:
+            name = "standard input" if is_stdin else path
+            out.write((f"==> {name} <==\n" if i == 0 else f"\n==> {name} <==\n").encode())
+
+        if parsed_args.n_bytes is not None:
+            read_bytes(f, parsed_args.n_bytes, out)
+        else:
+            read_lines(f, parsed_args.n_lines, out)
+
+        if is_stdin:
+            # Like other tails, standard input isn't followed
+            continue
+        elif wait:
+            followed.append(FollowedFile(path, f, retry=parsed_args.retry))
+        else:
+            f.close()
+
+    out.flush()
 
-    if parsed_args.n_bytes:
-        with open(parsed_args.file, mode="rb") as f:
-            read_bytes(f, parsed_args.n_bytes)
-    elif parsed_args.n_lines:
-        with open(parsed_args.file, mode="r") as f:
-            read_lines(f, parsed_args.n_lines)
+    if followed:
+        current = followed[-1] if followed[-1].file is not None else None
+        follow(followed, out, headers, current)
 
-    return 0
\ No newline at end of file
+    return status
@@ -1,8 +1,14 @@
-from typing import List, Union
+from collections import deque
+from itertools import chain
+from typing import Iterable, List, Optional, Tuple, Union
+from .utils.file import read_file_list
 import argparse
 import datetime
+import errno
 import pathlib
 import os
+import sys
+import time
 
 def parse_time_decimal(time: str):
     """Parses the string into a datetime according to [[CC]YY]MMDDhhmm[.SS]"""
@@ -47,59 +53,171 @@ arg_parser = argparse.ArgumentParser(
 
     By default, touch sets a file's timestamps to the current time.
     """)
-arg_parser.add_argument("file", type=pathlib.Path, metavar="FILE", nargs="+", help="The pathname of a file whose times will be modified.")
+arg_parser.add_argument("file", type=pathlib.Path, metavar="FILE", nargs="*", help="The pathname of a file whose times will be modified.")
 arg_parser.add_argument("-a", action="store_true", dest="change_access_time", help="Change the access time of FILE.")
 arg_parser.add_argument("-c", action="store_false", dest="create_file", help="Do no create FILE if it doesn not exist.")
 arg_parser.add_argument("-m", action="store_true", dest="change_modification_time", help="Change the modification time of FILE.")
+arg_parser.add_argument("--files-from", metavar="LIST", dest="files_from", help="Also touch the files named in LIST, one per line. Use - to read the list from standard input.")
+arg_parser.add_argument("-0", "--null", action="store_true", dest="null", help="Names in the --files-from list are separated by NUL characters instead of newlines.")
+arg_parser.add_argument("--jobs", type=int, default=1, help="Number of files to touch at the same time. Helps on network filesystems.")
 
 date_group = arg_parser.add_mutually_exclusive_group()
 date_group.add_argument("-r", type=pathlib.Path, dest="ref_path", help="Use the corresponding time of file named by the path instead of the current time.")
 date_group.add_argument("-t", type=parse_time_decimal, dest="time", help="Use the specified time instead of the current time.")
 date_group.add_argument("-d", type=datetime.datetime.fromisoformat, dest="date_time", help="Use the specified date_time instead of the current time.")
 
-def get_desired_time(file_path: pathlib.Path, 
-                     option: Union[pathlib.Path, datetime.datetime, None] = None, 
-                     change_access_time: bool = False,
-                     change_modification_time: bool = False):
+# Flags for creating files. O_NONBLOCK keeps a FIFO from blocking the open.
+_CREATE_FLAGS = os.O_WRONLY | os.O_CREAT | getattr(os, "O_NONBLOCK", 0) | getattr(os, "O_NOCTTY", 0) | \
+    getattr(os, "O_CLOEXEC", 0)
+# errnos of opening an existing file that can still have its times changed by name
+_TOUCH_BY_NAME = {errno.EISDIR, errno.EACCES, errno.EPERM, errno.ETXTBSY, errno.EROFS, errno.ENXIO}
+
+Times = Optional[Tuple[Optional[int], Optional[int]]]
+
+def resolve_times(option: Union[pathlib.Path, datetime.datetime, None] = None,
+                  change_access_time: bool = True,
+                  change_modification_time: bool = True) -> Times:
     """
-    Returns a 2-tuple that can be passed to os.utime(). If change_access_time is True, then
-    the first element of the tuple will use the time set in `option`. If change_modification_time is 
-    True, then the second element of the tuple will use the time set in `option`.
+    Returns the (atime, mtime) to give every file, in nanoseconds, with None for a time that must be kept. If both
+    times are set to the current time, None is returned instead, so the kernel sets them.
 
     If `option` is a Path, then that file's times will be used. If `option` is a datetime, then `option`
-    will be used as the time. If option is None, the current time will be used.
+    will be used as the time. If option is None, the current time will be used. The reference file is only
+    stat'ed here, once for all the files.
+    """
+    if isinstance(option, pathlib.Path):
+        ref_stat = option.stat()
+        ref_times = (ref_stat.st_atime_ns, ref_stat.st_mtime_ns)
+    elif option is not None:
+        ns = int(option.replace(microsecond=0).timestamp()) * 10**9 + option.microsecond * 1000
+        ref_times = (ns, ns)
+    elif change_access_time and change_modification_time:
+        return None
+    else:
+        ns = time.time_ns()
+        ref_times = (ns, ns)
+
+    return (ref_times[0] if change_access_time else None,
+            ref_times[1] if change_modification_time else None)
+
+def touch_file(path, times: Times = None, create: bool = True):
     """
+    Sets the times of the file at path to times, as returned by resolve_times, creating the file if create is True.
+
+    The file is created and its times set through a single descriptor. It is only stat'ed if one of its times must
+    be kept. A missing file is ignored if create is False.
+    """
+    fd = None
+    create_error = None
+
+    if create:
+        try:
+            fd = os.open(path, _CREATE_FLAGS, 0o666)
+        except OSError as e:
+            if e.errno not in _TOUCH_BY_NAME:
+                raise
+            create_error = e
 
-    original_stat = file_path.stat()
-    original_times = (original_stat.st_atime, original_stat.st_mtime)
+    target = fd if fd is not None and os.utime in os.supports_fd else path
 
     try:
-        ref_stat = option.stat()
-        ref_times = (ref_stat.st_atime, ref_stat.st_mtime)
-    except AttributeError:
-        if not option:
-            option = datetime.datetime.now()
-        ref_times = (option.timestamp(), option.timestamp())
-    
-    return (ref_times[0] if change_access_time else original_times[0],
-            ref_times[1] if change_modification_time else original_times[1])
+        if times is not None and None in times:
+            st = os.stat(target)
+            times = (st.st_atime_ns if times[0] is None else times[0],
+                     st.st_mtime_ns if times[1] is None else times[1])
+
+        if times is None:
+            os.utime(target)
+        else:
+            os.utime(target, ns=times)
+    except FileNotFoundError:
+        # The file couldn't be created, so why it couldn't is the more useful error
+        if create_error is not None:
+            raise create_error from None
+        if create:
+            raise
+    finally:
+        if fd is not None:
+            os.close(fd)
+
+def touch(paths: Iterable, times: Times = None, create: bool = True, workers: int = 1) -> int:
+    """
+    Touches every file in paths with touch_file, on a pool of workers threads if workers is greater than 1. paths
+    is consumed as the files are touched, so it may be a long generator. Returns 0, or 1 if a file couldn't be
+    touched.
+    """
+    status = 0
+
+    def report(path, e):
+        nonlocal status
+        print(f"touch: cannot touch '{path}': {e.strerror}", file=sys.stderr)
+        status = 1
+
+    if workers <= 1:
+        for path in paths:
+            try:
+                touch_file(path, times, create)
+            except OSError as e:
+                report(path, e)
+
+        return status
+
+    def touch_one(path):
+        try:
+            touch_file(path, times, create)
+        except OSError as e:
+            return e
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = deque()
+
+    with ThreadPoolExecutor(workers) as pool:
+        for path in paths:
+            pending.append((path, pool.submit(touch_one, path)))
+
+            # Only a few files per worker are queued, so the list isn't read ahead of the pool
+            while len(pending) > workers * 4 or (pending and pending[0][1].done()):
+                path, future = pending.popleft()
+                error = future.result()
+                if error is not None:
+                    report(path, error)
+
+        for path, future in pending:
+            error = future.result()
+            if error is not None:
+                report(path, error)
+
+    return status
 
 def _cmd_main(args: List[str]):
     parsed_args = arg_parser.parse_args(args)
 
+    if not parsed_args.file and not parsed_args.files_from:
+        arg_parser.error("the following arguments are required: FILE")
+
     # If '-m' and '-a' were both not specified, then touch acts like they both were specified
     if not parsed_args.change_access_time and not parsed_args.change_modification_time:
         parsed_args.change_access_time = True
         parsed_args.change_modification_time = True
 
-    for file_path in parsed_args.file:
-        if not file_path.exists() and parsed_args.create_file:
-            f = file_path.open("w+")
-            f.close()
+    try:
+        times = resolve_times(parsed_args.ref_path or parsed_args.time or parsed_args.date_time,
+                              parsed_args.change_access_time,
+                              parsed_args.change_modification_time)
+    except OSError as e:
+        print(f"touch: failed to get attributes of '{parsed_args.ref_path}': {e.strerror}", file=sys.stderr)
+        return 1
 
-        os.utime(file_path.resolve(), 
-                 times=get_desired_time(file_path, 
-                                        parsed_args.ref_path or parsed_args.time or parsed_args.date_time,
-                                        parsed_args.change_access_time,
-                                        parsed_args.change_modification_time))
-        
+    paths = parsed_args.file
+    list_file = None
+
+    if parsed_args.files_from:
+        list_file = sys.stdin.buffer if parsed_args.files_from == "-" else open(parsed_args.files_from, "rb")
+        paths = chain(paths, read_file_list(list_file, b"\0" if parsed_args.null else b"\n"))
+
+    try:
+        return touch(paths, times, parsed_args.create_file, parsed_args.jobs)
+    finally:
+        if list_file is not None and list_file is not sys.stdin.buffer:
+            list_file.close()
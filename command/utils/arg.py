@@ -1,9 +1,18 @@
-from typing import Any, List, Union, Optional
+from collections import deque
+from itertools import islice
+from stat import S_ISREG
+from typing import Any, Callable, Iterator, List, Union, Optional
 from pathlib import Path
 from enum import Enum, Flag, auto
+from .file import BUFFER_SIZE
+from .glob import Globber
+import os
 import re
 import sys
 
+# Number of files commands reading many inputs open ahead of the one being read
+PREFETCH_FILES = 8
+
 
 _camel_match = re.compile(r"(.)([A-Z][a-z])")
 
@@ -69,7 +78,8 @@ def flag_or_action(flag_type):
                            help=None,
                            metavar=None):
         def perform_action(parser, namespace, values, option_string=None):
-            if hasattr(namespace, dest):
+            # argparse sets every dest to its default, None, before parsing
+            if getattr(namespace, dest, None) is not None:
                 setattr(namespace, dest, getattr(namespace, dest) | const or flag_type(0))
             else:
                 setattr(namespace, dest, const or flag_type(0))
@@ -116,34 +126,153 @@ class FlagArg(Flag):
             parser.add_argument(*i.flags, dest=dest, action=action, const=i, **kwargs)
 
 
-def resolve_paths(paths: List[str], base_dir: Path = Path.cwd(), ignore: List[str] = ["-"]) -> List[Path]:
+def iter_resolve_paths(paths: List[str], base_dir: Optional[Path] = None, ignore: List[str] = ["-"],
+                       on_unmatched: Optional[Callable[[str], Optional[Path]]] = None) -> Iterator[Path]:
     """
-    Given a list of paths, which may contain patterns, return a list of Path objects to real files.
+    Lazy version of resolve_paths. Paths are produced as they are matched, in the order of their patterns.
     """
-    real_paths = []
+    globber = Globber(base_dir)
 
     for p in paths:
-        if p not in ignore:
-            real_paths.extend(base_dir.glob(p))
-        else:
-            real_paths.append(Path(p))
+        # Ignored operands are passed through before any matching, so they never take base_dir
+        if p in ignore:
+            yield Path(p)
+            continue
+
+        matched = False
+
+        for match in globber.glob(p):
+            matched = True
+            yield Path(match) if base_dir is None else base_dir / match
+
+        if not matched and on_unmatched is not None:
+            replacement = on_unmatched(p)
+
+            if replacement is not None:
+                yield replacement
+
+
+def resolve_paths(paths: List[str], base_dir: Optional[Path] = None, ignore: List[str] = ["-"],
+                  on_unmatched: Optional[Callable[[str], Optional[Path]]] = None) -> List[Path]:
+    """
+    Given a list of paths, which may contain patterns, return a list of Path objects to real files.
 
-    return real_paths
+    Patterns work like pathlib.Path.glob, and may be absolute. Every directory is listed at most once, however many
+    patterns reach it. If base_dir is None, patterns are matched in the current working directory at the time of
+    the call, and relative results are returned as they would be written there. Otherwise they are joined to
+    base_dir.
+
+    Patterns that match nothing are dropped. If on_unmatched is given, it is called with each of them, and
+    whatever it returns other than None takes the place of the pattern's matches.
+    """
+    return list(iter_resolve_paths(paths, base_dir, ignore, on_unmatched))
 
 
-def iterate_input_files(paths: List[Path], default=sys.stdin, **open_args):
+def _open_input(path: Path, open_args: dict, sequential: bool, read_ahead: bool):
     """
-    Generator that returns open file handles. If the path is "-", stdin is returned instead.
+    Opens path with open_args. If it is a regular file, the kernel is told it will be read sequentially, and with
+    read_ahead its first block is read before it is returned, without moving the file position.
     """
+    f = open(path, **open_args)
+
+    try:
+        fd = f.fileno()
+
+        if not S_ISREG(os.fstat(fd).st_mode):
+            return f
+
+        if sequential and hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+
+        if read_ahead:
+            buffered = getattr(f, "buffer", f)
+
+            if hasattr(buffered, "peek"):
+                # Fills the buffer of the file object itself
+                buffered.peek(1)
+            else:
+                # Unbuffered, so the block only ends up in the page cache
+                os.pread(fd, BUFFER_SIZE, 0)
+    except OSError:
+        # Only hints failed, the file is still readable or the reader will see the error itself
+        pass
+    except BaseException:
+        f.close()
+        raise
+
+    return f
+
+
+def _close_result(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def iterate_input_files(paths: List[Path], default=None, prefetch: int = 0, sequential: bool = True, **open_args):
+    """
+    Generator that returns open file handles. If the path is "-" or paths is empty, default is returned instead.
+    If default is None, sys.stdin is looked up when the generator runs.
+
+    Files are opened with open_args, so mode="rb" gives binary files and buffering sets their buffer size. Every
+    file is closed when the next one is requested, or when the generator is closed. If sequential is True, regular
+    files are opened with a posix_fadvise(SEQUENTIAL) hint.
+
+    If prefetch is greater than 0, up to prefetch files after the current one are opened and have their first
+    block read on a pool of threads, so waiting on slow storage overlaps with reading the current file. Errors
+    opening a file are still raised when that file is reached. A single path is always opened in the caller.
+    """
+    default = default or sys.stdin
+
     if not paths:
-        return default
+        yield default
+        return
+
+    if prefetch <= 0 or len(paths) == 1:
+        for path in paths:
+            if str(path) == "-":
+                yield default
+                continue
+
+            f = _open_input(path, open_args, sequential, False)
+
+            try:
+                yield f
+            finally:
+                f.close()
+
+        return
+
+    # Imported here since it costs more at startup than the rest of the module, and most calls read a single file
+    from concurrent.futures import ThreadPoolExecutor
+
+    paths = iter(paths)
+    ahead = deque()
+    pool = ThreadPoolExecutor(prefetch)
+
+    try:
+        while True:
+            for path in islice(paths, prefetch - len(ahead)):
+                ahead.append(None if str(path) == "-" else pool.submit(_open_input, path, open_args, sequential, True))
+
+            if not ahead:
+                break
+
+            future = ahead.popleft()
+
+            if future is None:
+                yield default
+                continue
+
+            f = future.result()
 
-    for path in paths:
-        if str(path) == "-":
-            yield default
-        else:
-            f = open(path, **open_args)
-            yield f
+            try:
+                yield f
+            finally:
+                f.close()
+    finally:
+        # Files opened ahead of an abandoned iteration are closed as soon as their open finishes
+        for future in ahead:
+            if future is not None and not future.cancel():
+                future.add_done_callback(_close_result)
 
-            if not f.closed:
-                f.close()
\ No newline at end of file
+        pool.shutdown(wait=False)
@@ -1,12 +1,128 @@
 from stat import *
+from typing import Iterator
+import errno
+import io
 import platform
 import os
 
 
 def is_hidden(file):
+    """file is a Path or an os.DirEntry. The stat of a DirEntry comes from the directory listing on Windows."""
     if platform.system() == "Windows":
-        stat = os.stat(file)
+        stat = file.stat() if isinstance(file, os.DirEntry) else os.stat(file)
 
-        return file.name.startswith(".") or stat.st_file_attributes == FILE_ATTRIBUTE_HIDDEN
+        return file.name.startswith(".") or bool(stat.st_file_attributes & FILE_ATTRIBUTE_HIDDEN)
     else:
-        return file.name.startswith(".")
\ No newline at end of file
+        return file.name.startswith(".")
+
+BUFFER_SIZE = 128 * 1024
+
+# errnos meaning "this kind of copy isn't supported between these two files", as opposed to a real I/O error
+_UNSUPPORTED_COPY = {errno.EINVAL, errno.ENOSYS, errno.EXDEV, errno.EBADF, errno.EOPNOTSUPP, errno.ETXTBSY,
+                     errno.ESPIPE}
+
+
+def _fileno(f):
+    try:
+        return f.fileno()
+    except (AttributeError, OSError, ValueError):
+        # io.UnsupportedOperation is an OSError and a ValueError
+        return None
+
+
+def _kernel_copy(copy_func, src_fd: int, dst_fd: int, count: int) -> int:
+    """
+    Copies with copy_func(src_fd, dst_fd, n) until EOF or count bytes. Returns the number of bytes copied, or -1
+    if copy_func isn't supported for these files and nothing was copied.
+    """
+    copied = 0
+
+    while count < 0 or copied < count:
+        n = BUFFER_SIZE * 64 if count < 0 else min(count - copied, BUFFER_SIZE * 64)
+
+        try:
+            n = copy_func(src_fd, dst_fd, n)
+        except OSError as e:
+            if copied == 0 and e.errno in _UNSUPPORTED_COPY:
+                return -1
+            raise
+
+        if n == 0:
+            break
+        copied += n
+
+    return copied
+
+
+def _copy_file_range(src_fd, dst_fd, n):
+    return os.copy_file_range(src_fd, dst_fd, n)
+
+
+def _sendfile(src_fd, dst_fd, n):
+    return os.sendfile(dst_fd, src_fd, None, n)
+
+
+def copy_stream(src, dst, count: int = -1, buffer: bytearray = None, flush: bool = False) -> int:
+    """
+    Copies the binary file src to the binary file dst from their current positions until EOF, or until count bytes
+    have been copied if count isn't negative. Returns the number of bytes copied.
+
+    If both are backed by file descriptors and src is unbuffered, the copy is done in the kernel with
+    copy_file_range or sendfile. Otherwise the data goes through `buffer` (allocated if not given) with readinto1
+    where src has it, so memory use doesn't depend on the size of src. Data from a pipe or terminal is passed on
+    as it arrives: dst is flushed after every short read, which means src had nothing more to give yet, and after
+    every write if flush is True.
+    """
+    src_fd = _fileno(src) if isinstance(src, io.RawIOBase) else None
+    dst_fd = _fileno(dst)
+
+    if src_fd is not None and dst_fd is not None:
+        dst.flush()
+
+        for copy_func in (_copy_file_range, _sendfile):
+            if hasattr(os, copy_func.__name__[1:]):
+                copied = _kernel_copy(copy_func, src_fd, dst_fd, count)
+                if copied >= 0:
+                    return copied
+
+    buffer = buffer or bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    readinto = getattr(src, "readinto1", src.readinto)
+    copied = 0
+
+    while count < 0 or copied < count:
+        chunk = view if count < 0 else view[:count - copied]
+        n = readinto(chunk)
+
+        if not n:
+            break
+
+        dst.write(view[:n])
+        copied += n
+
+        if flush or n < len(chunk):
+            dst.flush()
+
+    return copied
+
+
+def read_file_list(f, separator: bytes = b"\n", block_size: int = 64 * 1024) -> Iterator[str]:
+    """Yields the non-empty names in the binary file f, which are separated by separator, as they are read."""
+    read = getattr(f, "read1", f.read)
+    rest = b""
+
+    while True:
+        block = read(block_size)
+
+        if not block:
+            break
+
+        names = (rest + block).split(separator)
+        rest = names.pop()
+
+        for name in names:
+            if name:
+                yield os.fsdecode(name)
+
+    if rest:
+        yield os.fsdecode(rest)
@@ -0,0 +1,148 @@
+"""
+Pattern matching for file operands, used by resolve_paths.
+
+Patterns follow the rules of pathlib.Path.glob: "*", "?" and "[...]" match within a path component, "**" matches
+any number of directories, and a trailing separator only matches directories. Absolute patterns are accepted too.
+
+A Globber resolves many patterns against the same file system: every directory is listed with os.scandir at most
+once and shared by all the patterns that reach it, so "src/*.py src/*.txt src/**/*.md" reads src a single time.
+"""
+from fnmatch import translate
+from typing import Iterator, List, Optional, Tuple
+import os
+import re
+
+_MAGIC = re.compile(r"[*?[]")
+_CASE_FLAGS = re.IGNORECASE if os.name == "nt" else 0
+
+_LITERAL, _WILDCARD, _RECURSIVE = range(3)
+
+
+def has_magic(pattern: str) -> bool:
+    return _MAGIC.search(pattern) is not None
+
+
+def _split_pattern(pattern: str) -> Tuple[str, List[Tuple[int, object]], bool]:
+    """Returns the anchor of pattern, its compiled components and whether it only matches directories."""
+    if not pattern:
+        raise ValueError(f"Unacceptable pattern: {pattern!r}")
+
+    drive, rest = os.path.splitdrive(pattern)
+    seps = os.sep + (os.altsep or "")
+    anchor = drive + os.sep if rest[:1] in seps and rest else drive
+    dir_only = pattern[-1] in seps
+    parts = []
+
+    for part in re.split(f"[{re.escape(seps)}]", rest):
+        if part in ("", "."):
+            continue
+        elif part == "**":
+            parts.append((_RECURSIVE, None))
+        elif "**" in part:
+            raise ValueError("Invalid pattern: '**' can only be an entire path component")
+        elif has_magic(part):
+            parts.append((_WILDCARD, re.compile(translate(part), _CASE_FLAGS).match))
+        else:
+            parts.append((_LITERAL, part))
+
+    if not parts and not anchor:
+        raise ValueError(f"Unacceptable pattern: {pattern!r}")
+
+    return anchor, parts, dir_only
+
+
+def _is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+class Globber():
+    """
+    Matches patterns against the file system relative to base_dir, or the current directory if it is None.
+
+    Directory listings are cached while cache is True, so patterns over the same directories only list them once.
+    Results are paths as strings, relative like the pattern, and are produced lazily.
+    """
+
+    def __init__(self, base_dir: Optional[str] = None, cache: bool = True):
+        self.base_dir = os.fspath(base_dir) if base_dir is not None else None
+        self.cache = cache
+        self._listings = {}
+        self._stats = {}
+
+    def _real(self, path: str) -> str:
+        if os.path.isabs(path) or self.base_dir is None:
+            return path or os.curdir
+        return os.path.join(self.base_dir, path)
+
+    def _list(self, path: str) -> List[os.DirEntry]:
+        entries = self._listings.get(path)
+
+        if entries is None:
+            try:
+                with os.scandir(self._real(path)) as it:
+                    entries = list(it)
+            except OSError:
+                entries = []
+
+            if self.cache:
+                self._listings[path] = entries
+
+        return entries
+
+    def _check(self, path: str, need_dir: bool) -> bool:
+        key = (path, need_dir)
+        rv = self._stats.get(key)
+
+        if rv is None:
+            rv = (os.path.isdir if need_dir else os.path.exists)(self._real(path))
+
+            if self.cache:
+                self._stats[key] = rv
+
+        return rv
+
+    def _walk_dirs(self, path: str) -> Iterator[str]:
+        """Yields path and every directory below it, depth first, without following symlinks."""
+        stack = [path]
+
+        while stack:
+            path = stack.pop()
+            yield path
+            stack.extend(reversed([os.path.join(path, e.name) for e in self._list(path)
+                                   if _is_dir(e) and not e.is_symlink()]))
+
+    def _select(self, path: str, parts, i: int, dir_only: bool) -> Iterator[str]:
+        if i == len(parts):
+            yield path
+            return
+
+        kind, value = parts[i]
+        need_dir = dir_only or i + 1 < len(parts)
+
+        if kind == _LITERAL:
+            child = os.path.join(path, value)
+            if self._check(child, need_dir):
+                yield from self._select(child, parts, i + 1, dir_only)
+        elif kind == _WILDCARD:
+            for entry in self._list(path):
+                if value(entry.name) and (not need_dir or _is_dir(entry)):
+                    yield from self._select(os.path.join(path, entry.name), parts, i + 1, dir_only)
+        else:
+            seen = set()
+
+            for directory in self._walk_dirs(path):
+                for match in self._select(directory, parts, i + 1, dir_only):
+                    if match not in seen:
+                        seen.add(match)
+                        yield match
+
+    def glob(self, pattern: str) -> Iterator[str]:
+        """Yields the paths matching pattern, in the order pathlib.Path.glob would."""
+        anchor, parts, dir_only = _split_pattern(pattern)
+
+        for match in self._select(anchor, parts, 0, dir_only):
+            # "**" matches the starting directory itself
+            yield match or os.curdir
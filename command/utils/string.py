@@ -1,32 +1,102 @@
-from itertools import chain
+from functools import lru_cache
+from typing import AnyStr, Iterable, Iterator, List, Tuple
+import re
 
 
-def multifind(s: str, items: set, start=0):
-    """Finds the first occurance of an item in `items` in `s`, and return the start and end indices."""
-    items_lengths = set(len(i) for i in items)
-    slices = ((slice(b, b+e) for e in items_lengths) for b in range(start, len(s)))  # O(len(items) * len(s))
+class Splitter():
+    """
+    Splits str or bytes on any of a set of delimiters, like repeated calls to multifind but in a single scan.
 
-    for sl in chain.from_iterable(slices):
-        if s[sl] in items:
-            return (sl.start, sl.stop)
+    A set holding one delimiter uses str.split. A set of single bytes is mapped to one of them with bytes.translate
+    before bytes.split, which is faster than a regex on bytes. Any other set of single characters becomes a regex
+    character class, and the rest a regex alternation. When several delimiters match at the same position, the
+    shortest one is used.
 
-    return (len(s), len(s))
+    Use get_splitter to share splitters for the same set.
+    """
 
+    def __init__(self, delims: Iterable[AnyStr]):
+        delims = frozenset(delims)
 
-def multisplit(s: str, delims: set, max_split=-1, filter_empty=True):
-    rv = []
+        if not delims or not all(delims):
+            raise ValueError("delimiters must be non-empty")
+        if len({type(d) for d in delims}) != 1:
+            raise TypeError("delimiters must be all str or all bytes")
+
+        self.delims = delims
+        self._single = next(iter(delims)) if len(delims) == 1 else None
+        self._table = None
+
+        ordered = sorted(delims, key=lambda d: (len(d), d))
+        empty, open_class, close_class, bar = (b"", b"[", b"]", b"|") if isinstance(ordered[0], bytes) else \
+            ("", "[", "]", "|")
+
+        if all(len(d) == 1 for d in ordered):
+            pattern = open_class + empty.join(map(re.escape, ordered)) + close_class
+
+            if isinstance(empty, bytes) and self._single is None:
+                self._single = ordered[0]
+                self._table = bytes.maketrans(empty.join(ordered), self._single * len(ordered))
+        else:
+            pattern = bar.join(map(re.escape, ordered))
+
+        self._regex = re.compile(pattern)
+
+    def find(self, s: AnyStr, start: int = 0) -> Tuple[int, int]:
+        """Returns the start and end of the first delimiter in s at or after start, or (len(s), len(s))."""
+        m = self._regex.search(s, start)
+        return (m.start(), m.end()) if m else (len(s), len(s))
+
+    def iter_split(self, s: AnyStr, filter_empty: bool = False) -> Iterator[AnyStr]:
+        """Yields the pieces of s between delimiters. Empty pieces are skipped if filter_empty is True."""
+        start = 0
+
+        for m in self._regex.finditer(s):
+            piece = s[start:m.start()]
+            if piece or not filter_empty:
+                yield piece
+            start = m.end()
 
-    last_end = 0
-    while max_split != 0:
-        b, e = multifind(s, delims, last_end)
+        piece = s[start:]
+        if piece or not filter_empty:
+            yield piece
 
-        if not filter_empty or last_end != b:
-            rv.append(s[last_end:b])
-            max_split -= 1
+    def split(self, s: AnyStr, max_split: int = -1, filter_empty: bool = True) -> List[AnyStr]:
+        """
+        Returns the pieces of s between delimiters, like multisplit. If max_split isn't negative, at most max_split
+        pieces are returned and the rest of s is dropped.
+        """
+        if self._table is not None:
+            pieces = s.translate(self._table).split(self._single)
+        elif self._single is not None:
+            pieces = s.split(self._single)
+        else:
+            pieces = self._regex.split(s)
 
-        if b == len(s) and e == len(s):
-            break
+        if filter_empty:
+            pieces = [p for p in pieces if p]
 
-        last_end = e
+        return pieces if max_split < 0 else pieces[:max_split]
 
-    return rv
+
+@lru_cache(maxsize=64)
+def _cached_splitter(delims: frozenset) -> Splitter:
+    return Splitter(delims)
+
+
+def get_splitter(delims: Iterable[AnyStr]) -> Splitter:
+    """Returns a Splitter for delims. Splitters are cached per set of delimiters."""
+    return _cached_splitter(frozenset(delims))
+
+
+def multifind(s: str, items: set, start=0):
+    """Finds the first occurance of an item in `items` in `s`, and return the start and end indices."""
+    return get_splitter(items).find(s, start)
+
+
+def multisplit(s: str, delims: set, max_split=-1, filter_empty=True):
+    """
+    Splits s on any of the delimiters in delims. Empty pieces are dropped if filter_empty is True. If max_split isn't
+    negative, at most max_split pieces are returned.
+    """
+    return get_splitter(delims).split(s, max_split, filter_empty)
@@ -0,0 +1,205 @@
+"""
+Change notification for followed files, used by `tail -f`.
+
+On Linux, inotify is used through ctypes, so waiting costs nothing until a file changes. Everywhere else, or if
+inotify can't be set up, files are polled with an interval that backs off while nothing changes.
+"""
+from typing import Dict, Hashable, Optional, Set
+import ctypes
+import os
+import select
+import struct
+import sys
+import time
+
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+FILE_EVENTS = IN_MODIFY | IN_ATTRIB | IN_DELETE_SELF | IN_MOVE_SELF
+DIR_EVENTS = IN_CREATE | IN_MOVED_TO | IN_DELETE | IN_MOVED_FROM
+
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class Inotify():
+    """Minimal ctypes binding of the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(None, use_errno=True)
+        self._add_watch = libc.inotify_add_watch
+        self._add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._rm_watch = libc.inotify_rm_watch
+        self._rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path, mask: int) -> int:
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e), str(path))
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: Optional[float] = None):
+        """Waits up to timeout seconds and returns a list of (wd, mask, name) tuples."""
+        if not select.select([self.fd], [], [], timeout)[0]:
+            return []
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        offset = 0
+
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+            events.append((wd, mask, os.fsdecode(name)))
+
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PollWatcher():
+    """
+    Watcher that can't tell which file changed, so every wait reports all keys as possibly changed.
+    The wait grows from min_interval to max_interval while report_activity(False) is called.
+    """
+
+    def __init__(self, min_interval: float = 0.01, max_interval: float = 1.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+
+    def watch(self, key: Hashable, path):
+        pass
+
+    def unwatch(self, key: Hashable):
+        pass
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Set[Hashable]]:
+        time.sleep(self.interval if timeout is None else min(self.interval, timeout))
+        return None
+
+    def report_activity(self, active: bool):
+        if active:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher():
+    """
+    Watcher that reports the keys of files that changed. The parent directory of every file is watched too, so
+    files that are created, removed or renamed over are reported as well.
+    """
+
+    def __init__(self):
+        self._inotify = Inotify()
+        self._file_watches: Dict[int, Set[Hashable]] = {}
+        self._dir_watches: Dict[int, Dict[str, Set[Hashable]]] = {}
+        self._keys: Dict[Hashable, tuple] = {}
+
+    def watch(self, key: Hashable, path):
+        """Watches path for key. Calling this again after the file was replaced watches the new file."""
+        self.unwatch(key)
+
+        path = os.fspath(path)
+        directory, name = os.path.split(os.path.abspath(path))
+        file_wd = dir_wd = None
+
+        try:
+            file_wd = self._inotify.add_watch(path, FILE_EVENTS)
+            self._file_watches.setdefault(file_wd, set()).add(key)
+        except OSError:
+            # The file may not exist yet; the directory watch reports when it appears
+            pass
+
+        try:
+            dir_wd = self._inotify.add_watch(directory, DIR_EVENTS)
+            self._dir_watches.setdefault(dir_wd, {}).setdefault(name, set()).add(key)
+        except OSError:
+            pass
+
+        self._keys[key] = (file_wd, dir_wd, name)
+
+    def unwatch(self, key: Hashable):
+        file_wd, dir_wd, name = self._keys.pop(key, (None, None, None))
+
+        if file_wd in self._file_watches:
+            self._file_watches[file_wd].discard(key)
+            if not self._file_watches[file_wd]:
+                del self._file_watches[file_wd]
+                self._inotify.rm_watch(file_wd)
+
+        if dir_wd in self._dir_watches:
+            names = self._dir_watches[dir_wd]
+            names.get(name, set()).discard(key)
+            if not names.get(name, True):
+                del names[name]
+            if not names:
+                del self._dir_watches[dir_wd]
+                self._inotify.rm_watch(dir_wd)
+
+    def wait(self, timeout: Optional[float] = None) -> Optional[Set[Hashable]]:
+        """Blocks until a watched file changes or timeout runs out. Returns the keys that may have changed."""
+        changed = set()
+
+        for wd, mask, name in self._inotify.read_events(timeout):
+            if mask & IN_Q_OVERFLOW:
+                return None
+
+            if mask & IN_IGNORED:
+                # The kernel dropped the watch because the file is gone; forget it without calling rm_watch
+                for key in self._file_watches.pop(wd, ()):
+                    changed.add(key)
+                    file_wd, dir_wd, key_name = self._keys[key]
+                    self._keys[key] = (None, dir_wd, key_name)
+                continue
+
+            changed.update(self._file_watches.get(wd, ()))
+            changed.update(self._dir_watches.get(wd, {}).get(name, ()))
+
+        return changed
+
+    def report_activity(self, active: bool):
+        pass
+
+    def close(self):
+        self._inotify.close()
+
+
+def make_watcher(use_inotify: bool = True):
+    """Returns an InotifyWatcher if inotify is available, and a PollWatcher otherwise."""
+    if use_inotify and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher()
+        except (OSError, AttributeError):
+            pass
+
+    return PollWatcher()
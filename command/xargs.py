@@ -1,8 +1,266 @@
-from typing import List
+from collections import deque
+from itertools import chain
+from typing import Iterable, Iterator, List, Optional
+from .utils.file import read_file_list
 import argparse
+import io
+import os
+import shlex
+import subprocess
+import sys
+
+try:
+    import cmds
+    import pipeline
+except ImportError:
+    # Used as a library without the toolbox, so every command is run as a process
+    cmds = pipeline = None
+
+# Commands of this package, which are run in-process. Modules are shared through sys.modules with any other registry.
+_commands = cmds.CommandRegistry() if cmds is not None else {}
+
+# Size of a pointer in argv and envp
+_POINTER_SIZE = 8
+# Left free for the program name and the auxiliary vector, as GNU xargs does
+_HEADROOM = 2048
+# Number of command lines -P 0 runs at the same time
+MAX_PROCS = 64
 
 arg_parser = argparse.ArgumentParser(
     prog="xargs",
     description="Builds and executes commands by converting standard input into arguments to a command."
 )
-arg_parser.add_argument("test")
\ No newline at end of file
+arg_parser.add_argument("command", nargs=argparse.REMAINDER, help="The command to run, followed by its initial arguments. Defaults to echo. Commands of this toolbox are run in-process.")
+arg_parser.add_argument("-0", "--null", action="store_true", dest="null", help="Input items are separated by NUL characters, and quotes and backslashes aren't special.")
+arg_parser.add_argument("-n", type=int, dest="max_args", metavar="N", help="Use at most N arguments per command line.")
+arg_parser.add_argument("-s", type=int, dest="max_chars", metavar="SIZE", help="Use at most SIZE characters per command line, counting a terminating NUL per argument.")
+arg_parser.add_argument("-I", dest="replace", metavar="REPLSTR", help="Run the command once per input line, replacing REPLSTR in the initial arguments with the line.")
+arg_parser.add_argument("-P", type=int, dest="max_procs", default=1, metavar="N", help=f"Run up to N commands at the same time. 0 runs as many as possible, up to {MAX_PROCS}.")
+
+def arg_max() -> int:
+    """
+    Returns the number of bytes available for the arguments of a new process: SC_ARG_MAX, less the environment and
+    some headroom. Every argument takes its length, a terminating NUL and a pointer.
+    """
+    try:
+        limit = os.sysconf("SC_ARG_MAX")
+    except (AttributeError, ValueError, OSError):
+        limit = -1
+
+    if limit <= 0:
+        # The minimum POSIX allows
+        limit = 4096
+
+    env_size = sum(len(os.fsencode(k)) + len(os.fsencode(v)) + 2 + _POINTER_SIZE for k, v in os.environ.items())
+    return max(limit - env_size - _HEADROOM, 0)
+
+def split_items(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Yields the items in lines, which are separated by blanks and newlines. Quotes and backslashes work as in the
+    shell, but a quoted item can't span lines. Lines without any of them are split without the shell lexer.
+    """
+    for line in lines:
+        if "'" in line or '"' in line or "\\" in line:
+            yield from shlex.split(line)
+        else:
+            yield from line.split()
+
+def build_batches(items: Iterable[str], command: List[str], max_args: Optional[int] = None,
+                  max_chars: Optional[int] = None, max_size: Optional[int] = None) -> Iterator[List[str]]:
+    """
+    Groups items into command lines that start with command. A line holds at most max_args items, takes at most
+    max_chars characters counting a NUL after every argument, and at most max_size bytes of argument space, which
+    defaults to arg_max(). Items are read as the lines are consumed.
+
+    Raises ValueError if command, or command with a single item, doesn't fit, or if max_args is less than 1.
+    """
+    if max_args is not None and max_args < 1:
+        raise ValueError("value for -n must be at least 1")
+
+    max_size = arg_max() if max_size is None else max_size
+    max_chars = max_size if max_chars is None else max_chars
+    base_chars = sum(len(arg) + 1 for arg in command)
+    base_size = sum(len(os.fsencode(arg)) + 1 + _POINTER_SIZE for arg in command)
+
+    if base_chars > max_chars or base_size > max_size:
+        raise ValueError("command line too long")
+
+    batch = []
+    chars, size = base_chars, base_size
+
+    for item in items:
+        item_chars = len(item) + 1
+        item_size = len(os.fsencode(item)) + 1 + _POINTER_SIZE
+
+        if batch and (len(batch) == max_args or chars + item_chars > max_chars or size + item_size > max_size):
+            yield command + batch
+            batch = []
+            chars, size = base_chars, base_size
+
+        if chars + item_chars > max_chars or size + item_size > max_size:
+            raise ValueError("argument line too long")
+
+        batch.append(item)
+        chars += item_chars
+        size += item_size
+
+    if batch:
+        yield command + batch
+
+def replace_batches(lines: Iterable[str], command: List[str], replace: str) -> Iterator[List[str]]:
+    """Yields a command line per non-blank line, with replace in the arguments of command replaced by the line."""
+    for line in lines:
+        line = line.rstrip("\n").lstrip()
+
+        if line:
+            yield [command[0]] + [arg.replace(replace, line) for arg in command[1:]]
+
+def _write(out, data: bytes):
+    if not data:
+        return
+
+    out.flush()
+
+    if hasattr(out, "buffer"):
+        out.buffer.write(data)
+        out.buffer.flush()
+    else:
+        out.write(data.decode(errors="replace"))
+
+def _fileno(f) -> Optional[int]:
+    try:
+        return f.fileno()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+def run_external(argv: List[str], out) -> int:
+    """
+    Runs argv as a new process with an empty standard input and returns its exit status. Its output goes straight
+    to the descriptor of out if there is one, and is copied to out otherwise.
+    """
+    fd = _fileno(out)
+
+    try:
+        if fd is not None:
+            out.flush()
+            return subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=fd).returncode
+
+        result = subprocess.run(argv, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE)
+    except FileNotFoundError:
+        print(f"xargs: {argv[0]}: No such file or directory", file=sys.stderr)
+        return 127
+    except PermissionError:
+        print(f"xargs: {argv[0]}: Permission denied", file=sys.stderr)
+        return 126
+
+    _write(out, result.stdout)
+    return result.returncode
+
+def run_in_process(argv: List[str], out) -> int:
+    """
+    Runs the command argv of this package in the calling thread, with an empty standard input and out as its
+    standard output. Returns its exit status. An exception raised by the command is reported and gives status 1,
+    like a process that failed.
+    """
+    stdin = io.TextIOWrapper(io.BytesIO())
+
+    with pipeline.redirect_stage(stdin, out):
+        try:
+            status = _commands[argv[0]](argv[1:]) or 0
+        except SystemExit as e:
+            # Raised by argparse after it printed its error message
+            if e.code is not None and not isinstance(e.code, int):
+                print(e.code, file=sys.stderr)
+            status = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception as e:
+            print(f"xargs: {argv[0]}: {e}", file=sys.stderr)
+            status = 1
+        finally:
+            out.flush()
+
+    return status
+
+def _run_captured(run, argv: List[str]):
+    out = io.TextIOWrapper(io.BytesIO(), write_through=True)
+    status = run(argv, out)
+    return status, out.buffer.getvalue()
+
+def xargs(batches: Iterable[List[str]], out=None, workers: int = 1) -> int:
+    """
+    Runs every command line in batches and returns the exit status of xargs: 0, 123 if a command failed, or 126/127
+    if a command couldn't be run.
+
+    Toolbox commands are run in-process with run_in_process, anything else with run_external. If workers is greater
+    than 1, up to workers command lines run at the same time on a pool of threads, or up to MAX_PROCS if workers
+    is 0. Their output is collected and written to out whole when each finishes, so the output of different
+    command lines isn't mixed.
+    """
+    out = out or (pipeline.current_streams()[1] if pipeline else sys.stdout)
+    workers = workers or MAX_PROCS
+    status = 0
+
+    def runner(argv):
+        return run_in_process if argv[0] in _commands else run_external
+
+    def record(rv):
+        nonlocal status
+        if rv in (126, 127):
+            status = max(status, rv)
+        elif rv != 0:
+            status = max(status, 123)
+
+    if workers <= 1:
+        for argv in batches:
+            record(runner(argv)(argv, out))
+        return status
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    pending = deque()
+
+    with ThreadPoolExecutor(workers) as pool:
+        for argv in batches:
+            pending.append(pool.submit(_run_captured, runner(argv), argv))
+
+            while len(pending) >= workers * 2 or (pending and pending[0].done()):
+                rv, data = pending.popleft().result()
+                _write(out, data)
+                record(rv)
+
+        for future in pending:
+            rv, data = future.result()
+            _write(out, data)
+            record(rv)
+
+    return status
+
+def _cmd_main(args: List[str]):
+    parsed_args = arg_parser.parse_args(args)
+    command = parsed_args.command or ["echo"]
+
+    if parsed_args.max_procs < 0:
+        print("xargs: value for -P must be at least 0", file=sys.stderr)
+        return 1
+
+    stdin = pipeline.current_streams()[0] if pipeline else sys.stdin
+
+    if parsed_args.replace:
+        batches = replace_batches(stdin, command, parsed_args.replace)
+    else:
+        if parsed_args.null:
+            items = read_file_list(stdin.buffer, b"\0")
+        else:
+            items = split_items(stdin)
+
+        batches = build_batches(items, command, parsed_args.max_args, parsed_args.max_chars)
+
+    try:
+        # Like other xargs, the command runs once even without input, unless -I is used
+        first = next(batches, None)
+        if first is None and not parsed_args.replace:
+            first = command
+
+        return xargs(chain([first] if first else [], batches), workers=parsed_args.max_procs)
+    except ValueError as e:
+        print(f"xargs: {e}", file=sys.stderr)
+        return 1
@@ -0,0 +1,354 @@
+"""
+In-process pipelines for toolbox.py, e.g. `toolbox.py "cat a.log | head -n 20"`.
+
+Every stage runs in its own thread of the same interpreter. While a pipeline is running, sys.stdin and sys.stdout
+are replaced by proxies that resolve to the current stage's end of a bounded in-memory pipe, so commands keep using
+print, sys.stdin and sys.stdout.buffer unchanged. Chunks are handed over as the str or bytes objects that were
+written; they are only converted if the reader asks for the other type.
+
+When a stage finishes, the read end of its input is closed and the next write upstream raises BrokenPipeError,
+which stops the upstream stage the same way SIGPIPE does in a shell pipeline.
+"""
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, List
+import codecs
+import io
+import sys
+import threading
+import traceback
+
+PIPE_CAPACITY = 16
+WRITE_BUFFER_SIZE = 64 * 1024
+BROKEN_PIPE_STATUS = 141
+
+
+class _Pipe():
+    """Bounded queue of str or bytes chunks between two stages."""
+
+    def __init__(self, capacity: int = PIPE_CAPACITY):
+        self.capacity = capacity
+        self.chunks = deque()
+        self.reader_closed = False
+        self.writer_closed = False
+        self._cond = threading.Condition()
+
+    def put(self, chunk):
+        with self._cond:
+            while len(self.chunks) >= self.capacity and not self.reader_closed:
+                self._cond.wait()
+
+            if self.reader_closed:
+                raise BrokenPipeError("pipeline reader is closed")
+
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def get(self):
+        """Returns the next chunk, or None once the writer is closed and the pipe is drained."""
+        with self._cond:
+            while not self.chunks and not self.writer_closed:
+                self._cond.wait()
+
+            if not self.chunks:
+                return None
+
+            chunk = self.chunks.popleft()
+            self._cond.notify_all()
+            return chunk
+
+    def close_writer(self):
+        with self._cond:
+            self.writer_closed = True
+            self._cond.notify_all()
+
+    def close_reader(self):
+        with self._cond:
+            self.reader_closed = True
+            self.chunks.clear()
+            self._cond.notify_all()
+
+
+class PipeWriter(io.TextIOBase):
+    """Write end of a pipe. Small writes are coalesced into chunks of up to WRITE_BUFFER_SIZE."""
+
+    def __init__(self, pipe: _Pipe):
+        self._pipe = pipe
+        self._pending = []
+        self._pending_size = 0
+        self.buffer = _BinaryPipeWriter(self)
+
+    def writable(self):
+        return True
+
+    def _append(self, data):
+        if self._pending and type(self._pending[0]) is not type(data):
+            self.flush()
+
+        self._pending.append(data)
+        self._pending_size += len(data)
+
+        if self._pending_size >= WRITE_BUFFER_SIZE:
+            self.flush()
+
+        return len(data)
+
+    def write(self, s: str) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        return self._append(s)
+
+    def flush(self):
+        if self._pending:
+            pending = self._pending
+            self._pending = []
+            self._pending_size = 0
+            self._pipe.put(pending[0][:0].join(pending))
+
+    def close(self):
+        if self.closed:
+            return
+
+        try:
+            self.flush()
+        finally:
+            super().close()
+            self._pipe.close_writer()
+
+
+class _BinaryPipeWriter(io.RawIOBase):
+    def __init__(self, writer: PipeWriter):
+        self._writer = writer
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        return self._writer._append(bytes(b))
+
+    def flush(self):
+        self._writer.flush()
+
+
+class PipeReader(io.TextIOBase):
+    """Read end of a pipe. Bytes chunks are decoded as UTF-8 when read as text."""
+
+    def __init__(self, pipe: _Pipe):
+        self._pipe = pipe
+        self._chunk = ""
+        self._pos = 0
+        self._decoder = codecs.getincrementaldecoder("utf-8")("replace")
+        self.buffer = _BinaryPipeReader(self)
+
+    def readable(self):
+        return True
+
+    def _next(self, kind) -> bool:
+        """Makes sure self._chunk holds unread data of type kind. Returns False at end of file."""
+        while self._pos >= len(self._chunk) or type(self._chunk) is not kind:
+            if self._pos < len(self._chunk):
+                rest = self._chunk[self._pos:]
+                chunk = self._decoder.decode(rest) if kind is str else rest.encode()
+            else:
+                chunk = self._pipe.get()
+
+                if chunk is None:
+                    chunk = self._decoder.decode(b"", True) if kind is str else b""
+                    self._chunk, self._pos = chunk, 0
+                    return bool(chunk)
+
+                if kind is str and type(chunk) is bytes:
+                    chunk = self._decoder.decode(chunk)
+                elif kind is bytes and type(chunk) is str:
+                    chunk = chunk.encode()
+
+            self._chunk, self._pos = chunk, 0
+
+        return True
+
+    def _read(self, kind, size=-1, line=False, one_chunk=False):
+        parts = []
+        newline = "\n" if kind is str else b"\n"
+
+        while size != 0 and self._next(kind):
+            end = len(self._chunk)
+
+            if line:
+                i = self._chunk.find(newline, self._pos)
+                if i != -1:
+                    end = i + 1
+
+            if size >= 0:
+                end = min(end, self._pos + size)
+                size -= end - self._pos
+
+            parts.append(self._chunk[self._pos:end])
+            self._pos = end
+
+            if one_chunk or (line and parts[-1].endswith(newline)):
+                break
+
+        return kind().join(parts)
+
+    def read(self, size=-1) -> str:
+        return self._read(str, -1 if size is None else size)
+
+    def readline(self, size=-1) -> str:
+        return self._read(str, -1 if size is None else size, line=True)
+
+    def close(self):
+        super().close()
+        self._pipe.close_reader()
+
+
+class _BinaryPipeReader(io.RawIOBase):
+    def __init__(self, reader: PipeReader):
+        self._reader = reader
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1) -> bytes:
+        return self._reader._read(bytes, -1 if size is None else size)
+
+    def read1(self, size=-1) -> bytes:
+        return self._reader._read(bytes, -1 if size is None else size, one_chunk=True)
+
+    def readline(self, size=-1) -> bytes:
+        return self._reader._read(bytes, -1 if size is None else size, line=True)
+
+    def readinto(self, b) -> int:
+        data = self.read1(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+
+class _StdioProxy():
+    """Stands in for sys.stdin or sys.stdout and forwards to the calling stage's stream, if it has one."""
+
+    def __init__(self, name: str, default):
+        self._name = name
+        self._default = default
+
+    def _stream(self):
+        return getattr(_stage_streams, self._name, self._default)
+
+    def __getattr__(self, name):
+        return getattr(self._stream(), name)
+
+    def __iter__(self):
+        return iter(self._stream())
+
+
+_stage_streams = threading.local()
+_install_lock = threading.Lock()
+_install_count = 0
+
+
+def _install_proxies():
+    global _install_count
+
+    with _install_lock:
+        if _install_count == 0:
+            sys.stdin = _StdioProxy("stdin", sys.stdin)
+            sys.stdout = _StdioProxy("stdout", sys.stdout)
+        _install_count += 1
+
+
+def _uninstall_proxies():
+    global _install_count
+
+    with _install_lock:
+        _install_count -= 1
+        if _install_count == 0:
+            sys.stdin = sys.stdin._default
+            sys.stdout = sys.stdout._default
+
+
+def current_streams():
+    """Returns the (stdin, stdout) of the calling thread: the ends of its pipeline stage, or sys.stdin and sys.stdout."""
+    stdin = getattr(_stage_streams, "stdin", None) or getattr(sys.stdin, "_default", sys.stdin)
+    stdout = getattr(_stage_streams, "stdout", None) or getattr(sys.stdout, "_default", sys.stdout)
+    return stdin, stdout
+
+
+@contextmanager
+def redirect_stage(stdin=None, stdout=None):
+    """
+    Replaces sys.stdin and sys.stdout of the calling thread only, as for a pipeline stage, while the block runs.
+    Streams that are None are left as they are. Lets a command run other commands in-process on worker threads.
+    """
+    saved = dict(vars(_stage_streams))
+    _install_proxies()
+
+    try:
+        if stdin is not None:
+            _stage_streams.stdin = stdin
+        if stdout is not None:
+            _stage_streams.stdout = stdout
+        yield
+    finally:
+        vars(_stage_streams).clear()
+        vars(_stage_streams).update(saved)
+        _uninstall_proxies()
+
+
+def parse_pipeline(line: str) -> List[List[str]]:
+    """Splits a command line into the argument lists of its stages."""
+    stages = [s.split() for s in line.split("|")]
+
+    if not all(stages):
+        raise ValueError("empty command in pipeline")
+
+    return stages
+
+
+def run_pipeline(stages: List[List[str]], run: Callable[[List[str]], int]) -> int:
+    """
+    Runs each argument list in `stages` with `run`, connecting the output of each stage to the input of the next.
+    Returns the exit status of the last stage.
+    """
+    statuses = [0] * len(stages)
+    pipes = [_Pipe() for _ in stages[1:]]
+
+    def run_stage(i):
+        stdin = PipeReader(pipes[i - 1]) if i > 0 else None
+        stdout = PipeWriter(pipes[i]) if i < len(pipes) else None
+
+        if stdin:
+            _stage_streams.stdin = stdin
+        if stdout:
+            _stage_streams.stdout = stdout
+
+        try:
+            statuses[i] = run(stages[i])
+            if stdout:
+                stdout.flush()
+        except BrokenPipeError:
+            statuses[i] = BROKEN_PIPE_STATUS
+        except SystemExit as e:
+            statuses[i] = e.code if isinstance(e.code, int) else int(e.code is not None)
+        except Exception:
+            traceback.print_exc()
+            statuses[i] = 1
+        finally:
+            for stream in (stdout, stdin):
+                if stream:
+                    try:
+                        stream.close()
+                    except BrokenPipeError:
+                        pass
+
+    _install_proxies()
+
+    try:
+        threads = [threading.Thread(target=run_stage, args=(i,), daemon=True) for i in range(len(stages))]
+
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    finally:
+        _uninstall_proxies()
+
+    return statuses[-1]
@@ -0,0 +1,287 @@
+"""
+Warm interpreter mode for toolbox.py.
+
+`toolbox.py --serve` imports every command once and then forks a pool of worker processes which accept connections
+on a Unix socket. A client passes its stdin, stdout and stderr file descriptors over the socket together with the
+command line, working directory and environment. The worker runs the command directly on those descriptors and
+replies with the exit status, so output never has to be copied through the server.
+
+This module doubles as the thin client and deliberately imports as little as possible:
+
+    python server.py [--socket PATH] "cat file"
+"""
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+
+_LENGTH = struct.Struct("!I")
+_STATUS = struct.Struct("!i")
+
+
+def _recv_exactly(conn: socket.socket, n: int) -> bytes:
+    data = bytearray()
+
+    while len(data) < n:
+        chunk = conn.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("connection closed before the message was complete")
+        data += chunk
+
+    return bytes(data)
+
+
+def _private_dir(path: str) -> str:
+    """Creates the directory path with mode 0700, or checks that it exists, belongs to us and nobody else can use it."""
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+
+    st = os.lstat(path)
+
+    if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid() or st.st_mode & 0o077:
+        raise PermissionError(f"{path} is not a private directory of this user")
+
+    return path
+
+
+def default_socket() -> str:
+    """
+    Returns the default socket path: toolbox.sock in $XDG_RUNTIME_DIR, or else in a 0700 directory of this user
+    in the temporary directory, since a predictable name there could be taken by anybody.
+    """
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+
+    if not runtime_dir:
+        import tempfile
+        runtime_dir = _private_dir(os.path.join(tempfile.gettempdir(), f"toolbox-{os.getuid()}"))
+
+    return os.path.join(runtime_dir, "toolbox.sock")
+
+
+def _check_owner(conn: socket.socket, socket_path: str):
+    """Raises PermissionError unless the process at the other end of conn runs as this user."""
+    if hasattr(socket, "SO_PEERCRED"):
+        # struct ucred: pid, uid, gid
+        uid = struct.unpack("3i", conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i")))[1]
+    else:
+        uid = os.stat(socket_path).st_uid
+
+    if uid != os.getuid():
+        raise PermissionError(f"{socket_path} is owned by another user")
+
+
+def call(line: str, socket_path: str = None, fds=(0, 1, 2)) -> int:
+    """
+    Runs `line` on the server listening at `socket_path` using this process's stdio, and returns its exit status.
+    Nothing is sent unless the server runs as the same user. If no server can be reached, an error is printed
+    and 1 is returned.
+    """
+    socket_path = socket_path or default_socket()
+    payload = json.dumps({"line": line, "cwd": os.getcwd(), "env": dict(os.environ)}).encode()
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+        try:
+            conn.connect(socket_path)
+            _check_owner(conn, socket_path)
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f"toolbox: no server is listening on {socket_path}, start one with --serve", file=sys.stderr)
+            return 1
+        except OSError as e:
+            print(f"toolbox: cannot connect to {socket_path}: {e.strerror or e}", file=sys.stderr)
+            return 1
+
+        socket.send_fds(conn, [_LENGTH.pack(len(payload)), payload], list(fds))
+        return _STATUS.unpack(_recv_exactly(conn, _STATUS.size))[0]
+
+
+def _receive_request(conn: socket.socket):
+    header, fds, _, _ = socket.recv_fds(conn, _LENGTH.size, 3)
+
+    try:
+        if len(header) < _LENGTH.size:
+            header += _recv_exactly(conn, _LENGTH.size - len(header))
+
+        request = json.loads(_recv_exactly(conn, _LENGTH.unpack(header)[0]))
+    except BaseException:
+        for fd in fds:
+            os.close(fd)
+        raise
+
+    if len(fds) != 3:
+        for fd in fds:
+            os.close(fd)
+        raise ValueError(f"expected 3 file descriptors, got {len(fds)}")
+
+    return request, fds
+
+
+def _exit_status(e: SystemExit) -> int:
+    if e.code is None:
+        return 0
+    if isinstance(e.code, int):
+        return e.code
+
+    print(e.code, file=sys.stderr)
+    return 1
+
+
+def _run_request(request, fds, run) -> int:
+    """Runs a request with the client's descriptors installed as fds 0, 1 and 2."""
+    saved_streams = (sys.stdin, sys.stdout, sys.stderr)
+    saved_fds = [os.dup(i) for i in range(3)]
+    saved_cwd = os.getcwd()
+    saved_env = dict(os.environ)
+
+    for stream in saved_streams:
+        stream.flush()
+
+    try:
+        for i, fd in enumerate(fds):
+            os.dup2(fd, i)
+
+        # Fresh wrappers so no buffered data leaks from one client to the next
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", buffering=1, closefd=False)
+
+        try:
+            os.chdir(request["cwd"])
+        except OSError as e:
+            print(f"toolbox server: cannot change directory to {request['cwd']}: {e.strerror}", file=sys.stderr)
+            return 1
+
+        os.environ.clear()
+        os.environ.update(request["env"])
+
+        try:
+            return run(request["line"])
+        except SystemExit as e:
+            return _exit_status(e)
+        except Exception:
+            import traceback
+            traceback.print_exc()
+            return 1
+        finally:
+            for stream in (sys.stdout, sys.stderr):
+                try:
+                    stream.flush()
+                except OSError:
+                    pass
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = saved_streams
+        os.environ.clear()
+        os.environ.update(saved_env)
+        os.chdir(saved_cwd)
+
+        for i, fd in enumerate(saved_fds):
+            os.dup2(fd, i)
+            os.close(fd)
+        for fd in fds:
+            os.close(fd)
+
+
+def _worker(listener: socket.socket, run):
+    while True:
+        conn, _ = listener.accept()
+
+        with conn:
+            try:
+                _check_owner(conn, listener.getsockname())
+                request, fds = _receive_request(conn)
+            except (OSError, ValueError) as e:
+                print(f"toolbox server: bad request: {e}", file=sys.stderr)
+                continue
+
+            status = _run_request(request, fds, run)
+
+            try:
+                conn.sendall(_STATUS.pack(status))
+            except OSError:
+                pass
+
+
+def _spawn_worker(listener: socket.socket, run) -> int:
+    pid = os.fork()
+
+    if pid == 0:
+        try:
+            _worker(listener, run)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            os._exit(0)
+
+    return pid
+
+
+def serve(socket_path: str = None, workers: int = 4, run=None, preload=()) -> int:
+    """
+    Listens on `socket_path`, or default_socket(), and runs incoming command lines with `run` in a pool of
+    `workers` forked processes. Every name in `preload` is looked up in it before forking, so workers start with
+    those commands imported.
+    """
+    import signal
+
+    socket_path = socket_path or default_socket()
+
+    if run is None:
+        from toolbox import run_line as run
+
+    for name in preload:
+        preload[name]
+
+    try:
+        os.unlink(socket_path)
+    except FileNotFoundError:
+        pass
+
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    listener.bind(socket_path)
+    listener.listen(128)
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGTERM, stop)
+    children = set()
+
+    try:
+        children.update(_spawn_worker(listener, run) for _ in range(max(1, workers)))
+
+        while True:
+            pid, _ = os.wait()
+            children.discard(pid)
+            children.add(_spawn_worker(listener, run))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+                os.waitpid(pid, 0)
+            except OSError:
+                pass
+
+        listener.close()
+        os.unlink(socket_path)
+
+    return 0
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = None
+
+    if len(args) == 3 and args[0] == "--socket":
+        path = args[1]
+        args = args[2:]
+
+    if len(args) != 1:
+        print("usage: server.py [--socket PATH] COMMAND", file=sys.stderr)
+        sys.exit(2)
+
+    sys.exit(call(args[0], path))
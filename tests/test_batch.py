@@ -0,0 +1,34 @@
+from batch import read_script, run_batch
+import io
+import pytest
+
+
+def test_read_script():
+    script = io.StringIO("touch a\n\n# comment\n  rm b  \n")
+    assert list(read_script(script)) == [(1, "touch a"), (4, "rm b")]
+
+
+def fake_run(line):
+    return int(line.split()[1])
+
+
+COMMANDS = [(1, "x 0"), (2, "x 3"), (3, "x 0"), (4, "x 5")]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_stop_on_error(jobs):
+    results = run_batch(COMMANDS, fake_run, jobs=jobs)
+
+    # With a pool, lines submitted before the failure was seen still finish
+    assert results[:2] == [(1, "x 0", 0), (2, "x 3", 3)]
+    assert len(results) == 2 if jobs == 1 else len(results) >= 2
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_keep_going(jobs):
+    reported = []
+    results = run_batch(COMMANDS, fake_run, keep_going=True, jobs=jobs,
+                        on_result=lambda *r: reported.append(r))
+
+    assert [r[2] for r in results] == [0, 3, 0, 5]
+    assert reported == results
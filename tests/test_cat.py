@@ -0,0 +1,172 @@
+from command.cat import cat, _cmd_main
+from command.utils.file import copy_stream
+import io
+import os
+import threading
+import tracemalloc
+import pytest
+
+DATA = b"".join(b"line %d\n" % i for i in range(200000))
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = tmp_path / "data.txt"
+    path.write_bytes(DATA)
+    return path
+
+
+def test_copy_stream_buffered(data_file):
+    out = io.BytesIO()
+
+    with open(data_file, "rb") as f:
+        assert copy_stream(f, out, buffer=bytearray(1000)) == len(DATA)
+
+    assert out.getvalue() == DATA
+
+
+def test_copy_stream_count(data_file):
+    out = io.BytesIO()
+
+    with open(data_file, "rb", buffering=0) as f:
+        assert copy_stream(f, out, count=10) == 10
+
+    assert out.getvalue() == DATA[:10]
+
+
+def test_copy_stream_file_to_file(data_file, tmp_path):
+    with open(data_file, "rb", buffering=0) as f, open(tmp_path / "out", "wb") as out:
+        out.write(b"header\n")
+        assert copy_stream(f, out) == len(DATA)
+
+    assert (tmp_path / "out").read_bytes() == b"header\n" + DATA
+
+
+def test_copy_stream_to_pipe(data_file):
+    r, w = os.pipe()
+    out = open(w, "wb")
+
+    with open(data_file, "rb", buffering=0) as f:
+        assert copy_stream(f, out, count=50000) == 50000
+
+    out.close()
+    with open(r, "rb") as pipe:
+        data = pipe.read()
+
+    assert data == DATA[:50000]
+
+
+def test_cat_chunks():
+    chunks = []
+    cat([io.BytesIO(b"ab"), io.BytesIO(b"cdef")], chunks.append, buffer_size=3)
+
+    assert chunks == [b"ab", b"cde", b"f"]
+
+
+def test_cat_constant_memory(data_file, capfd, monkeypatch):
+    monkeypatch.chdir(data_file.parent)
+    tracemalloc.start()
+
+    try:
+        _cmd_main([data_file.name, data_file.name])
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert capfd.readouterr().out.encode() == DATA * 2
+    assert peak < len(DATA) / 2
+
+
+@pytest.mark.parametrize("options,expected", [
+    ({"number_lines": True},                         b"     1\ta\n     2\t\n     3\t\n     4\t\n     5\tb\n     6\tc"),
+    ({"number_nonblank": True},                      b"     1\ta\n\n\n\n     2\tb\n     3\tc"),
+    ({"squeeze_blank": True},                        b"a\n\nb\nc"),
+    ({"squeeze_blank": True, "number_lines": True},  b"     1\ta\n     2\t\n     3\tb\n     4\tc"),
+])
+@pytest.mark.parametrize("buffer_size", [1, 2, 5, 100])
+def test_cat_transforms(options, expected, buffer_size):
+    chunks = []
+    cat([io.BytesIO(b"a\n\n\n\nb\n"), io.BytesIO(b"c")], chunks.append, buffer_size, **options)
+
+    assert b"".join(chunks) == expected
+
+    chunks = []
+    cat([io.StringIO("a\n\n\n\nb\n"), io.StringIO("c")], chunks.append, buffer_size, **options)
+
+    assert "".join(chunks) == expected.decode()
+
+
+def test_cat_squeeze_leading_blank_lines():
+    chunks = []
+    cat([io.BytesIO(b"\n\n\na\n")], chunks.append, squeeze_blank=True)
+
+    assert b"".join(chunks) == b"\na\n"
+
+
+class _Recorder(io.RawIOBase):
+    """Output that signals when a line has been flushed through to it."""
+
+    def __init__(self, wanted):
+        self.data = b""
+        self.wanted = wanted
+        self.event = threading.Event()
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self.data += bytes(b)
+        if self.wanted in self.data:
+            self.event.set()
+        return len(b)
+
+
+def _slow_pipe(recorder):
+    """
+    Returns the read end of a pipe fed by a thread that writes a line, waits until recorder has seen it, and only
+    then writes a second line and closes the pipe.
+    """
+    r, w = os.pipe()
+
+    def writer():
+        with open(w, "wb", buffering=0) as f:
+            f.write(b"first\n")
+            recorder.event.wait(5)
+            f.write(b"second\n")
+
+    threading.Thread(target=writer, daemon=True).start()
+    return open(r, "rb")
+
+
+def test_copy_stream_slow_pipe():
+    recorder = _Recorder(b"first\n")
+    out = io.BufferedWriter(recorder)
+
+    with _slow_pipe(recorder) as pipe:
+        assert copy_stream(pipe, out) == 13
+
+    assert recorder.event.is_set() and recorder.data == b"first\nsecond\n"
+
+
+def test_cat_transforms_slow_pipe():
+    recorder = _Recorder(b"     1\tfirst\n")
+    out = io.BufferedWriter(recorder)
+
+    with _slow_pipe(recorder) as pipe:
+        cat([pipe], out.write, number_lines=True, flush=out.flush)
+
+    out.flush()
+    assert recorder.event.is_set() and recorder.data == b"     1\tfirst\n     2\tsecond\n"
+
+
+def test_cmd_unmatched_operands(tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_bytes(b"a\n")
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(b"stdin\n")))
+
+    # Standard input isn't read in place of files that don't exist
+    assert _cmd_main(["missing"]) == 1
+    assert capfd.readouterr() == ("", "cat: missing: No such file or directory\n")
+
+    assert _cmd_main(["missing", "a"]) == 1
+    assert capfd.readouterr() == ("a\n", "cat: missing: No such file or directory\n")
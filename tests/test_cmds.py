@@ -0,0 +1,58 @@
+from cmds import CommandRegistry, scan_commands
+import os
+import sys
+import pytest
+
+
+@pytest.fixture
+def command_dir(tmp_path, monkeypatch):
+    package = tmp_path / "fake_commands"
+    package.mkdir()
+    (package / "__init__.py").write_text("")
+    (package / "one.py").write_text("def _cmd_main(args):\n    return 1\n")
+    (package / "helper.py").write_text("def helper():\n    pass\n")
+
+    monkeypatch.syspath_prepend(str(tmp_path))
+    yield package
+
+    for name in [m for m in sys.modules if m.startswith("fake_commands")]:
+        del sys.modules[name]
+
+
+def test_scan_commands(command_dir):
+    assert scan_commands(command_dir) == ["one"]
+
+
+def test_lookup_is_lazy(command_dir):
+    registry = CommandRegistry(command_dir)
+
+    assert list(registry) == ["one"]
+    assert "fake_commands.one" not in sys.modules
+
+    assert registry["one"]([]) == 1
+    assert "fake_commands.one" in sys.modules
+
+
+def test_manifest_is_reused(command_dir):
+    CommandRegistry(command_dir).names
+    assert (command_dir / "__pycache__" / "commands.json").exists()
+
+    # A stale manifest is trusted as long as the directory mtime is unchanged
+    (command_dir / "one.py").write_text("def other(args):\n    pass\n")
+    assert CommandRegistry(command_dir).names == ["one"]
+
+
+def test_manifest_invalidated_by_mtime(command_dir):
+    CommandRegistry(command_dir).names
+
+    (command_dir / "two.py").write_text("def _cmd_main(args):\n    return 2\n")
+    os.utime(command_dir, ns=(0, 0))
+
+    assert CommandRegistry(command_dir).names == ["one", "two"]
+
+
+def test_unknown_command(command_dir):
+    registry = CommandRegistry(command_dir)
+
+    with pytest.raises(KeyError):
+        registry["helper"]
@@ -0,0 +1,107 @@
+from command import column
+from command.column import Table
+import io
+import random
+import tracemalloc
+import pytest
+
+
+def _random_lines(n, seed=0):
+    rng = random.Random(seed)
+    return [" ".join("x" * rng.randint(1, 8) for _ in range(rng.randint(0, 6))) for _ in range(n)]
+
+
+@pytest.mark.parametrize("spill_size", [0, 1 << 20])
+def test_spilled_matches_table(spill_size, capsys):
+    lines = _random_lines(500) + ["tab\tseparated  cells ", "ünïcode ✓"]
+
+    Table.table_from_lines(lines).print_table("|")
+    expected = capsys.readouterr().out
+
+    column.print_table_spilled(iter(lines), col_separator="|", spill_size=spill_size)
+    assert capsys.readouterr().out == expected
+
+
+def test_spilled_empty(capsys):
+    column.print_table_spilled([])
+    assert capsys.readouterr().out == ""
+
+
+def test_sampled(capsys):
+    lines = ["a bb", "ccc d", "eeeeee f g", "h"]
+    column.print_table_sampled(lines, 2)
+
+    assert capsys.readouterr().out.split("\n")[:-1] == [
+        "a    bb",
+        "ccc  d ",
+        "eeeeee  f   g",
+        "h      ",
+    ]
+
+
+def test_sampled_covers_everything(capsys):
+    lines = _random_lines(50)
+
+    Table.table_from_lines(lines).print_table()
+    expected = capsys.readouterr().out
+
+    column.print_table_sampled(lines, 100)
+    assert capsys.readouterr().out == expected
+
+
+def _lines(n):
+    for i in range(n):
+        yield f"row{i} {'x' * (i % 50)} {i * 7} {'y' * 60}"
+
+
+class _Discard():
+    def write(self, s):
+        return len(s)
+
+
+def test_table_memory_is_bounded():
+    tracemalloc.start()
+    try:
+        column.print_table_spilled(_lines(1200), spill_size=4096, file=_Discard())
+        column.print_table_sampled(_lines(1200), 10, file=_Discard())
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    # Well under the ~130 KB of input, let alone a table of it
+    assert peak < 96 * 1024
+
+
+def test_cmd_table(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text("a bb c\ndddd e\n")
+
+    column._cmd_main(["-t", "in.txt"])
+    assert capsys.readouterr().out == "a     bb  c\ndddd  e    \n"
+
+    column._cmd_main(["-t", "--sample", "1", "in.txt"])
+    assert capsys.readouterr().out == "a  bb  c\ndddd  e    \n"
+
+
+@pytest.mark.parametrize("args, message", [
+    (["-t", "--sample", "0"], "--sample must be at least 1"),
+    (["-t", "--sample", "-2"], "--sample must be at least 1"),
+    (["--sample", "5"], "--sample requires -t"),
+    (["-x", "--sample", "5"], "--sample requires -t"),
+])
+def test_cmd_bad_sample(args, message, capsys):
+    with pytest.raises(SystemExit):
+        column._cmd_main(args)
+    assert message in capsys.readouterr().err
+
+
+def test_cmd_unmatched_operands(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "in.txt").write_text("a b\n")
+    monkeypatch.setattr("sys.stdin", io.StringIO("stdin\n"))
+
+    assert column._cmd_main(["-t", "missing"]) == 1
+    assert capsys.readouterr() == ("", "column: missing: No such file or directory\n")
+
+    assert column._cmd_main(["-t", "missing", "in.txt"]) == 1
+    assert capsys.readouterr() == ("a  b\n", "column: missing: No such file or directory\n")
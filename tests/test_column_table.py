@@ -1,5 +1,6 @@
 from command.column import Table
 import pytest
+import tracemalloc
 
 
 @pytest.mark.parametrize("table,n,start,expected_rv,expected_state", [
@@ -47,4 +48,63 @@ def test_append_column(table, start, expected_state):
 ])
 def test_create_column_first(input, max_row_width, padding, expected):
     actual = Table.create_column_first(input, max_row_width, padding)
-    assert actual.columns == expected
\ No newline at end of file
+    assert actual.columns == expected
+
+
+@pytest.mark.parametrize("widths,max_row_width,padding,expected", [
+    ([], 10, 0, 1),
+    ([3], 10, 0, 1),
+    ([1, 1, 1, 1], 4, 0, 1),
+    ([1, 1, 1, 1], 4, 1, 2),
+    ([11, 1], 10, 0, 2),
+    # Two rows fit but three don't, so the row count can't be found by bisection
+    ([5, 1, 1, 5], 8, 0, 2),
+    ([5, 1, 1, 5, 1], 8, 0, 2),
+])
+def test_column_first_rows(widths, max_row_width, padding, expected):
+    assert Table.column_first_rows(widths, max_row_width, padding) == expected
+
+
+@pytest.mark.parametrize("lines,expected", [
+    (["a bb c", "dddd e", "f"], ["a     bb  c", "dddd  e    ", "f          "]),
+    (["a", "", "b c"], ["a   ", "    ", "b  c"]),
+])
+def test_table_from_lines(lines, expected, capsys):
+    Table.table_from_lines(lines, {" "}).print_table()
+    assert capsys.readouterr().out.split("\n")[:-1] == expected
+
+
+def test_column_widths_follow_appends():
+    table = Table([["a", "bbb"], ["cc"]])
+    assert table.column_widths == [3, 2]
+
+    table.append_to_column("dddd")
+    table.append_to_row("eeeee", 0)
+    assert table.column_widths == [3, 4, 5]
+    assert table.columns == [["a", "bbb"], ["cc", "dddd"], ["eeeee"]]
+    assert list(table.rows[1]) == ["bbb", "dddd", None]
+
+
+class _Discard():
+    def write(self, s):
+        return len(s)
+
+
+def test_table_memory():
+    rows, cols = 20000, 4
+    columns = [["cell"] * rows for _ in range(cols)]
+
+    tracemalloc.start()
+    try:
+        table = Table(columns)
+        size = tracemalloc.get_traced_memory()[0]
+
+        tracemalloc.reset_peak()
+        table.print_table(file=_Discard())
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    # One pointer per cell, and nothing kept per row while printing
+    assert size < rows * cols * 8 + 4096
+    assert peak - current < 4096
@@ -0,0 +1,92 @@
+from command.utils import glob
+from command.utils.arg import iter_resolve_paths, resolve_paths
+from pathlib import Path
+import os
+import pytest
+
+
+@pytest.fixture
+def tree(tmp_path):
+    for name in ["a.py", "b.py", "c.txt", ".hidden.py", "src/x.py", "src/y.txt", "src/deep/z.py", "src/deep/.w.py",
+                 "docs/readme.md", "docs/src/notes.md"]:
+        path = tmp_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("x")
+
+    os.symlink("src", tmp_path / "link")
+    os.symlink("missing", tmp_path / "broken.py")
+    return tmp_path
+
+
+@pytest.fixture
+def scandirs(monkeypatch):
+    listed = []
+    real_scandir = os.scandir
+
+    def scandir(path="."):
+        listed.append(os.fspath(path))
+        return real_scandir(path)
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    return listed
+
+
+@pytest.mark.parametrize("pattern", [
+    "*", "*.py", "?.py", "[ab].py", "[!a].py", "src/*", "*/*.py", "src/deep/*", "src/", "*/", "**", "**/*.py",
+    "src/**/*.py", "**/src", "**/src/*", "**/", "a.py", "src/x.py", "missing", "missing/*", "src/../a.py", "./*.txt",
+    "broken.py", "link/*", "link/**/*.py",
+])
+def test_same_as_pathlib(tree, pattern):
+    expected = sorted(str(p.relative_to(tree)) for p in tree.glob(pattern))
+    assert sorted(glob.Globber(tree).glob(pattern)) == expected
+
+
+def test_absolute_patterns(tree):
+    assert sorted(glob.Globber().glob(f"{tree}/src/*.py")) == [f"{tree}/src/x.py"]
+    assert resolve_paths([f"{tree}/*.txt"], base_dir=Path("/elsewhere")) == [tree / "c.txt"]
+
+
+def test_invalid_patterns():
+    with pytest.raises(ValueError):
+        list(glob.Globber().glob(""))
+
+    with pytest.raises(ValueError):
+        list(glob.Globber().glob("a**/b"))
+
+
+def test_directories_are_listed_once(tree, scandirs):
+    matches = resolve_paths(["src/*.py", "src/*.txt", "src/**/*.py", "*.py", "**/*.md"], tree)
+
+    assert tree / "src/deep/z.py" in matches and tree / "docs/src/notes.md" in matches
+    assert len(scandirs) == len(set(scandirs))
+
+
+def test_patterns_keep_their_order(tree):
+    matches = resolve_paths(["c.txt", "-", "src/*.py", "a.py"], base_dir=tree)
+    assert matches == [tree / "c.txt", Path("-"), tree / "src/x.py", tree / "a.py"]
+
+
+def test_ignored_patterns_are_not_matches(tree):
+    matches = resolve_paths(["**", "."], base_dir=tree, ignore=["."])
+
+    # "**" matches the base directory as ".", which must still be joined to base_dir
+    assert matches[0] == tree / "."
+    assert matches[-1] == Path(".")
+    assert all(m.is_relative_to(tree) for m in matches[:-1])
+
+
+def test_relative_to_cwd(tree, monkeypatch):
+    monkeypatch.chdir(tree)
+    assert resolve_paths(["src/*.txt", "-"]) == [Path("src/y.txt"), Path("-")]
+
+    # The working directory is read at the time of the call
+    monkeypatch.chdir(tree / "src")
+    assert resolve_paths(["*.txt"]) == [Path("y.txt")]
+
+
+def test_lazy(tree, scandirs):
+    it = iter_resolve_paths(["src/*.py", "docs/*"], base_dir=tree)
+    assert scandirs == []
+
+    assert next(it) == tree / "src/x.py"
+    assert scandirs == [os.path.join(tree, "src")]
@@ -0,0 +1,108 @@
+from command.head import head_lines, head, print_iterator, _cmd_main
+import io
+import pytest
+
+DATA = b"".join(b"%d\n" % i for i in range(1000))
+
+
+class CountingReader(io.RawIOBase):
+    """Endless stream of lines that counts how much was read from it."""
+
+    def __init__(self):
+        self.bytes_read = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        data = (b"y\n" * len(b))[:len(b)]
+        b[:] = data
+        self.bytes_read += len(data)
+        return len(data)
+
+
+@pytest.mark.parametrize("n", [0, 1, 5, 999, 1000, 2000])
+@pytest.mark.parametrize("block_size", [1, 3, 64, 100000])
+def test_head_lines(n, block_size):
+    out = io.BytesIO()
+    f = io.BytesIO(DATA)
+
+    assert head_lines(f, n, out, block_size) == min(n, 1000)
+
+    expected = b"".join(DATA.splitlines(keepends=True)[:n])
+    assert out.getvalue() == expected
+    assert f.tell() == len(expected)
+
+
+def test_head_lines_stops_reading():
+    reader = CountingReader()
+    head_lines(reader, 10, io.BytesIO(), block_size=4096)
+
+    assert reader.bytes_read == 4096
+
+
+def test_head_lines_without_trailing_newline():
+    out = io.BytesIO()
+
+    assert head_lines(io.BytesIO(b"a\nb"), 5, out) == 1
+    assert out.getvalue() == b"a\nb"
+
+
+def test_head_bytes():
+    out = io.BytesIO()
+    head([io.BytesIO(DATA), io.BytesIO(DATA)], 3, byte_count=True, out=out)
+
+    assert out.getvalue() == DATA[:3] * 2
+
+
+class _Pipe(io.RawIOBase):
+    """Unseekable source that returns at most 7 bytes per read."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        n = min(len(b), 7, len(self.data))
+        b[:n] = self.data[:n]
+        self.data = self.data[n:]
+        return n
+
+
+@pytest.mark.parametrize("n", [1, 3, 50, len(DATA) + 1])
+@pytest.mark.parametrize("make_file", [io.BytesIO, _Pipe])
+def test_head_all_but_last_bytes(n, make_file):
+    out = io.BytesIO()
+    head([make_file(DATA), make_file(DATA)], -n, byte_count=True, out=out)
+
+    assert out.getvalue() == DATA[:max(len(DATA) - n, 0)] * 2
+
+
+def test_negative_lines(capsys):
+    with pytest.raises(SystemExit):
+        _cmd_main(["-n", "-3"])
+    assert "-n must not be negative" in capsys.readouterr().err
+
+
+def test_print_iterator_headers(tmp_path, capsys):
+    (tmp_path / "a").write_bytes(b"1\n2\n")
+    (tmp_path / "b").write_bytes(b"3\n")
+
+    files = print_iterator([tmp_path / "a", tmp_path / "b"], mode="rb")
+    head(files, 1, out=None)
+
+    assert capsys.readouterr().out == f"==> {tmp_path / 'a'} <==\n1\n\n==> {tmp_path / 'b'} <==\n3\n"
+
+
+def test_cmd_unmatched_operands(tmp_path, monkeypatch, capfd):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_bytes(b"a\n")
+    monkeypatch.setattr("sys.stdin", io.TextIOWrapper(io.BytesIO(b"stdin\n")))
+
+    assert _cmd_main(["missing"]) == 1
+    assert capfd.readouterr() == ("", "head: missing: No such file or directory\n")
+
+    assert _cmd_main(["missing", "a"]) == 1
+    assert capfd.readouterr() == ("a\n", "head: missing: No such file or directory\n")
@@ -0,0 +1,106 @@
+from command.utils.arg import iterate_input_files
+import io
+import time
+import pytest
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = []
+
+    for i in range(20):
+        path = tmp_path / f"f{i}"
+        path.write_bytes(b"file %d\n" % i)
+        paths.append(path)
+
+    return paths
+
+
+@pytest.fixture
+def opened(monkeypatch):
+    opened = []
+    real_open = open
+
+    def tracking_open(*args, **kwargs):
+        f = real_open(*args, **kwargs)
+        opened.append(f)
+        return f
+
+    monkeypatch.setattr("builtins.open", tracking_open)
+    return opened
+
+
+@pytest.mark.parametrize("prefetch", [0, 1, 4])
+@pytest.mark.parametrize("open_args", [{}, {"mode": "rb"}, {"mode": "rb", "buffering": 0}, {"buffering": 16}])
+def test_contents_in_order(files, prefetch, open_args):
+    contents = [f.read() for f in iterate_input_files(files, prefetch=prefetch, **open_args)]
+    expected = [p.read_bytes() for p in files]
+
+    if "b" not in open_args.get("mode", ""):
+        expected = [data.decode() for data in expected]
+
+    assert contents == expected
+
+
+@pytest.mark.parametrize("prefetch", [0, 3])
+def test_files_are_closed(files, opened, prefetch):
+    previous = None
+
+    for f in iterate_input_files(files, prefetch=prefetch):
+        assert previous is None or previous.closed
+        previous = f
+
+    assert all(f.closed for f in opened)
+
+
+def test_abandoned_iteration_closes_files(files, opened):
+    it = iterate_input_files(files, prefetch=4)
+    next(it)
+    next(it)
+    it.close()
+
+    # Files opened ahead are closed with the generator, or as soon as their open finishes
+    for _ in range(100):
+        if all(f.closed for f in opened):
+            break
+        time.sleep(0.01)
+
+    assert all(f.closed for f in opened)
+
+
+def test_stdin(files):
+    stdin = io.StringIO("in\n")
+
+    assert list(iterate_input_files([], default=stdin)) == [stdin]
+    assert [f.read() for f in iterate_input_files([files[0], "-", files[1]], default=stdin, prefetch=2)] == \
+           ["file 0\n", "in\n", "file 1\n"]
+
+
+@pytest.mark.parametrize("prefetch", [0, 2])
+def test_missing_file_raises_in_order(files, prefetch):
+    read = []
+
+    with pytest.raises(FileNotFoundError):
+        for f in iterate_input_files([files[0], files[1], files[0].parent / "missing", files[2]], prefetch=prefetch):
+            read.append(f.read())
+
+    assert read == ["file 0\n", "file 1\n"]
+
+
+def test_first_block_is_read_ahead(files, opened):
+    it = iterate_input_files(files[:3], prefetch=2, mode="rb")
+    first = next(it)
+
+    def read_ahead():
+        return [f for f in opened if f.name == str(files[1]) and f.raw.tell() > 0]
+
+    # The next file is opened and its buffer filled on the pool while the first one is being read
+    for _ in range(100):
+        if read_ahead():
+            break
+        time.sleep(0.01)
+
+    ahead, = read_ahead()
+    assert ahead.tell() == 0
+    assert first.read() == b"file 0\n"
+    assert next(it) is ahead and ahead.read() == b"file 1\n"
@@ -0,0 +1,311 @@
+from command import ls
+import os
+import random
+import sys
+import time
+import pytest
+
+
+class _CountingEntry():
+    """Wraps an os.DirEntry and counts the calls to stat, which are the only ones that may need a system call."""
+
+    def __init__(self, entry, counts):
+        self._entry = entry
+        self._counts = counts
+        self.name = entry.name
+        self.path = entry.path
+
+    def __fspath__(self):
+        return self.path
+
+    def is_dir(self, *, follow_symlinks=True):
+        return self._entry.is_dir(follow_symlinks=follow_symlinks)
+
+    def is_file(self, *, follow_symlinks=True):
+        return self._entry.is_file(follow_symlinks=follow_symlinks)
+
+    def is_symlink(self):
+        return self._entry.is_symlink()
+
+    def stat(self, *, follow_symlinks=True):
+        self._counts["stat"] += 1
+        return self._entry.stat(follow_symlinks=follow_symlinks)
+
+
+class _CountingScandir():
+    def __init__(self, path, counts):
+        self._it = _real_scandir(path)
+        self._counts = counts
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self._it.close()
+
+    def __iter__(self):
+        return (_CountingEntry(e, self._counts) for e in self._it)
+
+
+_real_scandir = os.scandir
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    for d in ["a", "b", "a/c"]:
+        (tmp_path / d).mkdir()
+    for f in ["f1", "f2", ".hidden", "a/f3", "a/c/f4", "b/f5"]:
+        (tmp_path / f).write_text("x")
+    (tmp_path / "run").write_text("x")
+    (tmp_path / "run").chmod(0o755)
+    os.symlink("a", tmp_path / "link")
+
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    counts = {"stat": 0}
+    real_stat, real_lstat = os.stat, os.lstat
+
+    def counting(func):
+        def wrapper(*args, **kwargs):
+            counts["stat"] += 1
+            return func(*args, **kwargs)
+        return wrapper
+
+    monkeypatch.setattr(os, "scandir", lambda path=".": _CountingScandir(path, counts))
+    monkeypatch.setattr(os, "stat", counting(real_stat))
+    monkeypatch.setattr(os, "lstat", counting(real_lstat))
+    return counts
+
+
+def _run(args, capsys):
+    assert ls._cmd_main(args) == 0
+    return capsys.readouterr().out
+
+
+def test_list(tree, counts, capsys):
+    assert _run([], capsys) == "a\nb\nf1\nf2\nlink\nrun\n"
+    # Only the operand is looked at
+    assert counts["stat"] == 1
+
+
+def test_recurse(tree, counts, capsys):
+    assert _run(["-R"], capsys) == (
+        ".:\na\nb\nf1\nf2\nlink\nrun\n"
+        "\n./a:\nc\nf3\n"
+        "\n./a/c:\nf4\n"
+        "\n./b:\nf5\n"
+    )
+    assert counts["stat"] == 1
+
+
+def test_recurse_follow_links(tree, capsys):
+    assert "./link/c:\nf4\n" in _run(["-R", "-L"], capsys)
+
+
+def test_decorations(tree, counts, capsys):
+    assert _run(["-p"], capsys) == "a/\nb/\nf1\nf2\nlink\nrun\n"
+    assert counts["stat"] == 1
+
+    counts["stat"] = 0
+    assert _run(["-F"], capsys) == "a/\nb/\nf1\nf2\nlink@\nrun*\n"
+    # One for the operand and one per regular file, for the executable bits
+    assert counts["stat"] == 4
+
+
+def test_hidden(tree, capsys):
+    assert _run(["-a"], capsys).split() == [".hidden", "a", "b", "f1", "f2", "link", "run"]
+    assert _run(["-A"], capsys).split()[:3] == [".", "..", ".hidden"]
+
+
+def test_unsorted_streams(tree, monkeypatch, capsys):
+    printed = []
+
+    def print_func(items, formatter=ls.entry_name, directory=False):
+        # The entries must arrive while the directory is still being read
+        assert not isinstance(items, list)
+        printed.extend(map(formatter, items))
+
+    ls.ls([ls.Path(".")], print_func, sort=False, show_hidden=True)
+    assert sorted(printed) == sorted(os.listdir("."))
+
+
+def test_operands(tree, capsys):
+    assert _run(["b", "f2", "a/c", "f1"], capsys) == "f1\nf2\n\na/c:\nf4\n\nb:\nf5\n"
+
+
+def _fake_tree(depth, fanout):
+    tree = {}
+
+    def build(path, level):
+        children = [f"{path}/{i}" for i in range(fanout)] if level < depth else []
+        tree[path] = children
+        for child in children:
+            build(child, level + 1)
+
+    build("r", 0)
+    return tree
+
+
+@pytest.mark.parametrize("workers", [1, 2, 8])
+def test_walk_order(workers):
+    tree = _fake_tree(4, 3)
+    rng = random.Random(workers)
+
+    def read_dir(path):
+        # Finish in a random order to exercise the reordering
+        time.sleep(rng.random() / 1000)
+        if path == "r/1/2":
+            raise PermissionError(13, "Permission denied")
+        return tree[path], tree[path]
+
+    walked = [(path, error is not None) for path, _, error in ls.walk(["r"], read_dir, workers, prefetch=5)]
+
+    expected = []
+    stack = ["r"]
+    while stack:
+        path = stack.pop()
+        expected.append((path, path == "r/1/2"))
+        if path != "r/1/2":
+            stack.extend(reversed(tree[path]))
+
+    assert walked == expected
+
+
+def test_walk_deep_tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    depth = sys.getrecursionlimit() + 100
+    # os.makedirs recurses too
+    for level in range(1, depth + 1):
+        os.mkdir("/".join(["d"] * level))
+
+    def read_dir(path):
+        entries = list(ls.list_dir(path))
+        return entries, [e.path for e in entries]
+
+    try:
+        for workers in (1, 4):
+            assert len(list(ls.walk(["d"], read_dir, workers))) == depth
+    finally:
+        # shutil.rmtree, used to clean up tmp_path, would hit the recursion limit as well
+        for level in range(depth, 0, -1):
+            os.rmdir("/".join(["d"] * level))
+
+
+@pytest.mark.parametrize("args", [["-R"], ["-R", "-F"], ["-R", "-a", "-p"]])
+def test_parallel_matches_serial(tree, capsys, args):
+    serial = _run(args, capsys)
+    assert _run(args + ["--workers", "4"], capsys) == serial
+
+
+def test_long_format(tree, capsys):
+    os.truncate("f1", 1234)
+    for name in ["f1", "run", "a"]:
+        os.utime(name, (0, 1_700_000_000))
+
+    out = _run(["-ln", "f1", "run", "a"], capsys).splitlines()
+    uid, gid = os.getuid(), os.getgid()
+    date = ls.TimeFormatter()(1_700_000_000)
+    size = os.stat("a").st_size
+
+    assert out[0] == f"-rw-r--r-- 1 {uid} {gid} {1234:{len(str(size))}} {date} f1"
+    assert out[1] == f"-rwxr-xr-x 1 {uid} {gid} {1:{len(str(size))}} {date} run"
+    assert out[3] == "a:"
+    assert out[4].startswith("total ")
+    assert out[5].startswith("drwx") and out[5].endswith(" c")
+
+
+def test_long_format_columns(tree, capsys):
+    out = _run(["-lgo", "-i", "-s"], capsys).splitlines()
+    link = next(line for line in out if "link" in line)
+
+    assert link.endswith(" link -> a")
+    # Serial number, blocks, mode, links, size, 3 date fields, name, "->", target
+    assert len(link.split()) == 11
+    assert len({line.index(":") for line in out[1:]}) == 1
+
+
+def test_owner_lookups_are_memoized(tmp_path, monkeypatch, capsys):
+    pwd = pytest.importorskip("pwd")
+    calls = []
+    real_getpwuid = pwd.getpwuid
+
+    def getpwuid(uid):
+        calls.append(uid)
+        return real_getpwuid(uid)
+
+    for i in range(200):
+        (tmp_path / f"f{i}").touch()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pwd, "getpwuid", getpwuid)
+    ls._user_name.cache_clear()
+
+    _run(["-l"], capsys)
+    assert calls == [os.getuid()]
+
+
+def test_time_formatter():
+    now = 1_700_000_000
+    fmt = ls.TimeFormatter(now)
+
+    recent = time.localtime(now - 3600)
+    assert fmt(now - 3600) == time.strftime("%b ", recent) + f"{recent.tm_mday:2} " + time.strftime("%H:%M", recent)
+
+    old = time.localtime(now - 365 * 24 * 3600)
+    assert fmt(now - 365 * 24 * 3600).endswith(f"  {old.tm_year}")
+
+    # Times in the same minute share a cache entry
+    fmt(now - 3601)
+    fmt(now - 3599)
+    assert len(fmt._cache) == 2
+
+
+def test_sort_by_time_and_size(tree, counts, capsys):
+    os.truncate("f2", 100)
+    os.truncate("run", 10)
+    for i, name in enumerate(["run", "f2", "a", "f1"]):
+        os.utime(name, (0, 1_700_000_000 + i))
+    os.utime("b", (0, 1_700_000_000))
+
+    # The symbolic link itself is the newest
+    assert _run(["-t"], capsys).split() == ["link", "f1", "a", "f2", "b", "run"]
+    # A stat and an lstat for the operand, and one stat per entry
+    assert counts["stat"] == 8
+
+    assert _run(["-tr"], capsys).split() == ["run", "b", "f2", "a", "f1", "link"]
+    assert _run(["-S", "f1", "f2", "run"], capsys).split() == ["f2", "run", "f1"]
+    # Ties are broken by name
+    assert _run(["-S", "f1", "a/f3", "run"], capsys).split() == ["run", "a/f3", "f1"]
+    assert _run(["-S", "-r", "f1", "a/f3", "run"], capsys).split() == ["f1", "a/f3", "run"]
+
+
+def test_max_selects_without_sorting(tree, monkeypatch, capsys):
+    for i, name in enumerate(["run", "f2", "a", "f1", "b"]):
+        os.utime(name, (0, 1_700_000_000 + i))
+
+    def no_sorted(iterable, **kwargs):
+        items = list(iterable)
+        # Only the single operand may be sorted
+        assert len(items) <= 1, "the whole directory was sorted"
+        return items
+
+    monkeypatch.setattr(ls, "sorted", no_sorted, raising=False)
+    assert _run(["-t", "--max", "2"], capsys).split() == ["link", "b"]
+    assert _run(["-tr", "--max", "2"], capsys).split() == ["run", "f2"]
+    assert _run(["--max", "3"], capsys).split() == ["a", "b", "f1"]
+    assert len(_run(["-f", "--max", "3"], capsys).split()) == 3
+
+
+@pytest.mark.parametrize("limit", [None, 0, 1, 5, 50])
+def test_order_entries(limit):
+    entries = [ls.PathEntry(f"/nonexistent/{i % 7}-{i}") for i in range(30)]
+    random.shuffle(entries)
+    key = ls.sort_key(ls.SortBehavior.FILE_SIZE)
+
+    for reverse in (False, True):
+        expected = sorted(entries, key=key, reverse=reverse)[:limit]
+        assert ls.order_entries(entries, key, reverse, limit) == expected
@@ -0,0 +1,234 @@
+from command import mv
+import errno
+import os
+import pytest
+
+
+@pytest.fixture
+def cross_device(monkeypatch):
+    """Makes every rename outside of the temporary directories of mv fail as if it crossed file systems."""
+    real_replace = os.replace
+
+    def replace(src, dst):
+        if "/.mv-" not in os.fspath(src):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        real_replace(src, dst)
+
+    monkeypatch.setattr(os, "replace", replace)
+
+
+def _make_tree(root):
+    (root / "sub" / "deeper").mkdir(parents=True)
+    for i, name in enumerate(["a", "sub/b", "sub/deeper/c"]):
+        (root / name).write_bytes(bytes(range(256)) * (i * 100 + 1))
+    os.symlink("a", root / "link")
+    os.chmod(root / "sub" / "b", 0o640)
+    os.utime(root / "sub", ns=(1_600_000_000_000_000_000, 1_600_000_000_000_000_000))
+
+
+def _snapshot(root):
+    rv = {}
+
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            st = os.lstat(path)
+            data = os.readlink(path) if os.path.islink(path) else None
+            if data is None and os.path.isfile(path):
+                with open(path, "rb") as f:
+                    data = f.read()
+            rv[os.path.relpath(path, root)] = (st.st_mode, st.st_mtime_ns, data)
+
+    return rv
+
+
+def test_move_file_across_devices(tmp_path, cross_device):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.write_bytes(b"x" * 100_000)
+    os.chmod(src, 0o600)
+    os.utime(src, ns=(1, 1_600_000_000_000_000_000))
+    st = os.stat(src)
+
+    mv.move(src, dst)
+
+    assert not src.exists()
+    assert dst.read_bytes() == b"x" * 100_000
+    assert os.stat(dst).st_mode == st.st_mode
+    assert os.stat(dst).st_mtime_ns == st.st_mtime_ns
+    assert [p.name for p in tmp_path.iterdir()] == ["dst"]
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_move_tree_across_devices(tmp_path, cross_device, workers):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    _make_tree(src)
+    before = _snapshot(src)
+
+    mv.move(src, dst, workers)
+
+    assert not src.exists()
+    assert _snapshot(dst) == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["dst"]
+
+
+def test_failed_copy_keeps_source(tmp_path, cross_device, monkeypatch):
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    _make_tree(src)
+    before = _snapshot(src)
+
+    def fail(*args):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    monkeypatch.setattr(mv, "copy_stream", fail)
+
+    with pytest.raises(OSError):
+        mv.move(src, dst)
+
+    assert _snapshot(src) == before
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["src"]
+
+
+def test_file_over_directory(tmp_path, cross_device):
+    (tmp_path / "src").write_text("x")
+    (tmp_path / "dst").mkdir()
+
+    with pytest.raises(IsADirectoryError):
+        mv.move(tmp_path / "src", tmp_path / "dst")
+
+
+def test_real_cross_device(tmp_path):
+    shm = "/dev/shm"
+    if not os.path.isdir(shm) or os.stat(shm).st_dev == os.stat(tmp_path).st_dev:
+        pytest.skip("needs a second file system")
+
+    src = tmp_path / "src"
+    src.mkdir()
+    _make_tree(src)
+    before = _snapshot(src)
+    dst = os.path.join(shm, f"mv-test-{os.getpid()}")
+
+    try:
+        mv.move(src, dst)
+        assert not src.exists()
+        assert _snapshot(dst) == before
+
+        mv.move(dst, src, 4)
+        assert _snapshot(src) == before
+    finally:
+        if os.path.exists(dst):
+            mv.remove_tree(dst)
+
+
+def test_plan_moves(tmp_path):
+    (tmp_path / "target").mkdir()
+    (tmp_path / "target" / "b").write_text("x")
+    sources = [tmp_path / "a", tmp_path / "b"]
+
+    plan = mv.plan_moves(sources, tmp_path / "target")
+    st = os.stat(tmp_path / "target" / "b")
+
+    assert plan == {sources[0]: None, sources[1]: (st.st_dev, st.st_ino)}
+
+
+def test_plan_moves_does_not_list_target(tmp_path, monkeypatch):
+    (tmp_path / "target").mkdir()
+    (tmp_path / "file").write_text("x")
+
+    def scandir(*args):
+        raise AssertionError("target listed")
+
+    monkeypatch.setattr(os, "scandir", scandir)
+    assert mv.plan_moves([tmp_path / "a"], tmp_path / "target") == {tmp_path / "a": None}
+
+    with pytest.raises(NotADirectoryError):
+        mv.plan_moves([tmp_path / "a"], tmp_path / "file")
+
+
+def test_plan_moves_unreadable_target(tmp_path, monkeypatch):
+    (tmp_path / "target").mkdir()
+    (tmp_path / "target" / "b").write_text("x")
+    st = os.stat(tmp_path / "target" / "b")
+    real_open = os.open
+
+    def unreadable_open(path, flags, *args, **kwargs):
+        if os.fspath(path) == str(tmp_path / "target"):
+            raise PermissionError(errno.EACCES, "Permission denied", path)
+        return real_open(path, flags, *args, **kwargs)
+
+    # A write-only drop box can't be opened without O_PATH, but names in it can still be looked up
+    monkeypatch.delattr(os, "O_PATH", raising=False)
+    monkeypatch.setattr(os, "open", unreadable_open)
+    plan = mv.plan_moves([tmp_path / "a", tmp_path / "b"], tmp_path / "target")
+
+    assert plan == {tmp_path / "a": None, tmp_path / "b": (st.st_dev, st.st_ino)}
+
+
+def test_cmd_unsearchable_target(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_text("a")
+
+    def plan_moves(sources, target_dir):
+        raise PermissionError(errno.EACCES, "Permission denied", target_dir)
+
+    monkeypatch.setattr(mv, "plan_moves", plan_moves)
+    assert mv._cmd_main(["a", "target"]) == 1
+    assert capsys.readouterr().err == "mv: cannot access target: Permission denied\n"
+
+
+def test_cmd_usage_errors(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_text("a")
+
+    assert mv._cmd_main(["--jobs", "4x", "a", "b"]) == 1
+    assert capsys.readouterr().err == "mv: error: option --jobs requires an integer, not '4x'\n"
+
+    assert mv._cmd_main(["-x", "a", "b"]) == 1
+    assert capsys.readouterr().err == "mv: error: option -x not recognized\n"
+    assert os.listdir(tmp_path) == ["a"]
+
+
+def test_cmd(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    for name in ["a", "b", "c"]:
+        (tmp_path / name).write_text(name)
+    (tmp_path / "target").mkdir()
+    (tmp_path / "target" / "b").write_text("old")
+    (tmp_path / "target" / "c").write_text("old")
+    answers = iter(["y", "n"])
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt)
+        return next(answers)
+
+    monkeypatch.setattr("builtins.input", answer)
+    assert mv._cmd_main(["-i", "a", "b", "c", "target"]) == 0
+
+    assert len(prompts) == 2
+    assert sorted(os.listdir("target")) == ["a", "b", "c"]
+    assert (tmp_path / "target" / "b").read_text() == "b"
+    assert (tmp_path / "target" / "c").read_text() == "old"
+    assert sorted(os.listdir(tmp_path)) == ["c", "target"]
+
+    assert mv._cmd_main(["c", "d"]) == 0
+    assert (tmp_path / "d").read_text() == "c"
+
+    assert mv._cmd_main(["d", "target/a", "missing_dir"]) == 1
+    assert "is not a directory" in capsys.readouterr().err
+
+    assert mv._cmd_main(["missing", "other*", "target"]) == 1
+    assert capsys.readouterr().err == ("mv: cannot stat missing: No such file or directory\n"
+                                       "mv: cannot stat other*: No such file or directory\n")
+
+
+def test_same_file(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "target").mkdir()
+    (tmp_path / "target" / "a").write_text("a")
+    os.link(tmp_path / "target" / "a", tmp_path / "a")
+
+    assert mv._cmd_main(["a", "target"]) == 1
+    assert "same location" in capsys.readouterr().err
+    assert (tmp_path / "a").exists()
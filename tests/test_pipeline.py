@@ -0,0 +1,44 @@
+from command.head import _cmd_main as head_main
+from pipeline import parse_pipeline, run_pipeline
+import sys
+import pytest
+
+
+def test_parse_pipeline():
+    assert parse_pipeline("cat a | head -n 2") == [["cat", "a"], ["head", "-n", "2"]]
+
+    with pytest.raises(ValueError):
+        parse_pipeline("cat a |")
+
+
+def test_lines_pass_between_stages(capsys):
+    def run(argv):
+        if argv[0] == "gen":
+            for i in range(5):
+                print(i)
+        elif argv[0] == "upper":
+            for line in sys.stdin:
+                print(f"<{line.rstrip()}>")
+        return 0
+
+    assert run_pipeline([["gen"], ["upper"]], run) == 0
+    assert capsys.readouterr().out == "<0>\n<1>\n<2>\n<3>\n<4>\n"
+
+
+def test_downstream_exit_stops_upstream(capsys):
+    produced = []
+
+    def run(argv):
+        if argv[0] == "yes":
+            while True:
+                produced.append(1)
+                sys.stdout.buffer.write(b"y\n")
+        return head_main(argv[1:]) or 0
+
+    assert run_pipeline([["yes"], ["head", "-n", "3"]], run) == 0
+    assert capsys.readouterr().out == "y\ny\ny\n"
+    assert len(produced) < 1_000_000
+
+
+def test_status_of_last_stage():
+    assert run_pipeline([["a"], ["b"]], lambda argv: 0 if argv[0] == "a" else 3) == 3
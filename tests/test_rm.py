@@ -0,0 +1,170 @@
+from command import rm
+import os
+import sys
+import pytest
+
+
+def _make_tree(root, fanout=3, depth=3):
+    root.mkdir()
+    (root / "file").write_text("x")
+
+    if depth > 0:
+        for i in range(fanout):
+            _make_tree(root / f"d{i}", fanout, depth - 1)
+
+
+@pytest.fixture
+def outside(tmp_path):
+    outside = tmp_path / "outside"
+    outside.mkdir()
+    (outside / "keep").write_text("x")
+    return outside
+
+
+@pytest.mark.parametrize("workers", [1, 2, 8])
+def test_remove_tree(tmp_path, outside, workers):
+    root = tmp_path / "root"
+    _make_tree(root)
+    os.symlink(outside, root / "d0" / "link")
+    os.symlink(outside / "keep", root / "d1" / "d1" / "file_link")
+
+    assert rm.remove_tree(root, workers=workers)
+    assert not root.exists()
+    # Links are removed, not followed
+    assert os.listdir(outside) == ["keep"]
+
+
+def test_remove_deep_tree(tmp_path, monkeypatch):
+    depth = sys.getrecursionlimit() + 100
+    path = tmp_path / "d"
+
+    # Relative names keep every path short however deep the tree is
+    monkeypatch.chdir(tmp_path)
+    for _ in range(depth):
+        os.mkdir("d")
+        os.chdir("d")
+        os.mkdir("sibling")
+
+    os.chdir(tmp_path)
+
+    assert rm.remove_tree(path, window_size=8)
+    assert not path.exists()
+
+
+def test_fd_window(tmp_path):
+    root = tmp_path / "root"
+    _make_tree(root, fanout=2, depth=6)
+    open_fds = []
+
+    def confirm(path, is_dir):
+        open_fds.append(len(os.listdir("/proc/self/fd")))
+        return True
+
+    if not os.path.isdir("/proc/self/fd"):
+        pytest.skip("needs /proc")
+
+    before = len(os.listdir("/proc/self/fd"))
+    assert rm.remove_tree(root, confirm=confirm, window_size=2)
+    assert not root.exists()
+    # The window, the directory being read and the descriptor listdir opens
+    assert max(open_fds) <= before + 4
+
+
+def test_declined_entries_are_kept(tmp_path):
+    root = tmp_path / "root"
+    _make_tree(root, fanout=2, depth=2)
+    errors = []
+
+    def confirm(path, is_dir):
+        return path != os.path.join(root, "d1", "file")
+
+    assert not rm.remove_tree(root, lambda p, e: errors.append(p), confirm=confirm)
+    assert sorted(os.listdir(root)) == ["d1"]
+    assert sorted(os.listdir(root / "d1")) == ["file"]
+    assert errors == []
+
+
+@pytest.mark.parametrize("workers", [1, 4])
+def test_errors_are_reported(tmp_path, monkeypatch, workers):
+    root = tmp_path / "root"
+    _make_tree(root, fanout=2, depth=3)
+    real_unlink = os.unlink
+    errors = []
+
+    def unlink(name, *, dir_fd=None):
+        if dir_fd is not None and name == "file" and os.readlink(f"/proc/self/fd/{dir_fd}").endswith("root/d1/d0"):
+            raise PermissionError(13, "Permission denied")
+        real_unlink(name, dir_fd=dir_fd)
+
+    monkeypatch.setattr(os, "unlink", unlink)
+    assert not rm.remove_tree(root, lambda p, e: errors.append(p), workers=workers)
+
+    assert errors == [os.path.join(root, "d1", "d0", "file")]
+    # Only the directories holding the file are left
+    assert sorted(os.listdir(root)) == ["d1"]
+    assert sorted(os.listdir(root / "d1")) == ["d0"]
+    assert sorted(os.listdir(root / "d1" / "d0")) == ["file"]
+
+
+def test_cmd(tmp_path, monkeypatch, capsys):
+    _make_tree(tmp_path / "tree")
+    (tmp_path / "a").write_text("x")
+    os.symlink("tree", tmp_path / "link")
+    monkeypatch.chdir(tmp_path)
+
+    assert rm._cmd_main(["tree"]) == 1
+    assert "is a directory" in capsys.readouterr().err
+
+    assert rm._cmd_main(["a", "link"]) == 0
+    assert sorted(os.listdir(tmp_path)) == ["tree"]
+
+    assert rm._cmd_main(["-r", "--jobs", "4", "tree"]) == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_missing(tmp_path, capsys):
+    assert rm.remove([tmp_path / "missing"], None, False) == 1
+    assert "not found" in capsys.readouterr().err
+    assert rm.remove([tmp_path / "missing"], "f", False) == 0
+    assert capsys.readouterr().err == ""
+
+
+def test_cmd_missing(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_text("x")
+
+    assert rm._cmd_main(["missing", "a"]) == 1
+    assert capsys.readouterr().err == "rm: missing not found\n"
+    assert os.listdir(tmp_path) == []
+
+    assert rm._cmd_main(["-f", "missing", "gone*"]) == 0
+    assert capsys.readouterr().err == ""
+
+
+def test_cmd_usage_errors(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a").write_text("x")
+
+    assert rm._cmd_main(["--jobs", "many", "a"]) == 1
+    assert capsys.readouterr().err == "rm: error: option --jobs requires an integer, not 'many'\n"
+
+    assert rm._cmd_main(["-x", "a"]) == 1
+    assert capsys.readouterr().err == "rm: error: option -x not recognized\n"
+    assert os.listdir(tmp_path) == ["a"]
+
+
+def test_interactive(tmp_path, monkeypatch):
+    root = tmp_path / "root"
+    _make_tree(root, fanout=2, depth=1)
+    prompts = []
+
+    def answer(prompt):
+        prompts.append(prompt)
+        return "n" if prompt.endswith("d0?") else "y"
+
+    monkeypatch.setattr("builtins.input", answer)
+    assert rm.remove([root], "i", True) == 0
+
+    assert sorted(os.listdir(root)) == ["d0"]
+    assert f"rm: descend into directory {root}?" in prompts
+    assert f"rm: remove file {root / 'd1' / 'file'}?" in prompts
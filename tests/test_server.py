@@ -0,0 +1,87 @@
+from pathlib import Path
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import pytest
+import server
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    path = str(tmp_path / "toolbox.sock")
+    proc = subprocess.Popen([sys.executable, str(ROOT / "toolbox.py"), "--serve", "--socket", path, "--workers", "2"])
+
+    deadline = time.monotonic() + 10
+    while not os.path.exists(path) and time.monotonic() < deadline:
+        time.sleep(0.05)
+
+    yield path
+
+    proc.terminate()
+    proc.wait(10)
+
+
+def call(line, socket_path, tmp_path, stdin=b""):
+    (tmp_path / "stdin").write_bytes(stdin)
+
+    with open(tmp_path / "stdin", "rb") as i, open(tmp_path / "out", "wb") as o, open(tmp_path / "err", "wb") as e:
+        status = server.call(line, socket_path, fds=(i.fileno(), o.fileno(), e.fileno()))
+
+    return status, (tmp_path / "out").read_text(), (tmp_path / "err").read_text()
+
+
+def test_runs_in_client_cwd(socket_path, tmp_path, monkeypatch):
+    (tmp_path / "a.txt").write_text("1\n2\n3\n")
+    monkeypatch.chdir(tmp_path)
+
+    assert call("head -n 2 a.txt", socket_path, tmp_path) == (0, "1\n2\n", "")
+
+
+def test_exit_status(socket_path, tmp_path):
+    status, _, err = call("nope", socket_path, tmp_path)
+
+    assert status == 1
+    assert "Invalid command" in err
+
+    status, _, err = call("head --bad", socket_path, tmp_path)
+
+    assert status == 2
+    assert "unrecognized arguments" in err
+
+
+def test_missing_cwd(socket_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(os, "getcwd", lambda: str(tmp_path / "gone"))
+    status, _, err = call("head -n 1 a.txt", socket_path, tmp_path)
+
+    assert status == 1
+    assert "cannot change directory" in err
+
+    # The worker is still there for the next request
+    monkeypatch.undo()
+    assert call("head --bad", socket_path, tmp_path)[0] == 2
+
+
+def test_no_server(tmp_path, capsys):
+    assert server.call("head a.txt", str(tmp_path / "missing.sock")) == 1
+    assert "no server is listening" in capsys.readouterr().err
+
+
+def test_default_socket(tmp_path, monkeypatch):
+    monkeypatch.setenv("XDG_RUNTIME_DIR", str(tmp_path))
+    assert server.default_socket() == str(tmp_path / "toolbox.sock")
+
+    monkeypatch.delenv("XDG_RUNTIME_DIR")
+    monkeypatch.setattr(tempfile, "gettempdir", lambda: str(tmp_path))
+    path = server.default_socket()
+
+    assert os.path.dirname(path) == str(tmp_path / f"toolbox-{os.getuid()}")
+    assert os.stat(os.path.dirname(path)).st_mode & 0o777 == 0o700
+
+    # A directory others can write to isn't used
+    os.chmod(os.path.dirname(path), 0o777)
+    with pytest.raises(PermissionError):
+        server.default_socket()
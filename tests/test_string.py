@@ -0,0 +1,55 @@
+from command.utils.string import Splitter, get_splitter, multifind, multisplit
+import string
+import pytest
+
+
+@pytest.mark.parametrize("s,delims,max_split,filter_empty,expected", [
+    ("a b  c", {" "}, -1, True, ["a", "b", "c"]),
+    ("a b  c", {" "}, -1, False, ["a", "b", "", "c"]),
+    ("a b c", {" "}, 2, True, ["a", "b"]),
+    (" a\tb\n", set(string.whitespace), -1, False, ["", "a", "b", ""]),
+    (" a\tb\n", set(string.whitespace), -1, True, ["a", "b"]),
+    # The shortest delimiter wins when several match at the same position
+    ("a, b,c", {", ", ","}, -1, True, ["a", " b", "c"]),
+    ("xaby", {"a", "ab"}, -1, True, ["x", "by"]),
+    ("", {" "}, -1, False, [""]),
+    ("", {" "}, -1, True, []),
+    ("a.b|c", {".", "|"}, -1, True, ["a", "b", "c"]),
+    (b"a b\tc", {b" ", b"\t"}, -1, True, [b"a", b"b", b"c"]),
+    (b"a::b:c", {b"::", b":"}, -1, False, [b"a", b"", b"b", b"c"]),
+    (b"a::b:c", {b"::", b"-"}, -1, False, [b"a", b"b:c"]),
+])
+def test_multisplit(s, delims, max_split, filter_empty, expected):
+    assert multisplit(s, delims, max_split, filter_empty) == expected
+
+
+@pytest.mark.parametrize("s,delims,start,expected", [
+    ("ab, cd", {", ", " "}, 0, (2, 4)),
+    ("ab cd", {" "}, 3, (5, 5)),
+    ("a-b", {"-"}, 0, (1, 2)),
+])
+def test_multifind(s, delims, start, expected):
+    assert multifind(s, delims, start) == expected
+
+
+def test_iter_split():
+    splitter = get_splitter({" ", "\t"})
+
+    assert list(splitter.iter_split(" a\tb ")) == ["", "a", "b", ""]
+    assert list(splitter.iter_split(" a\tb ", filter_empty=True)) == ["a", "b"]
+    assert list(get_splitter({b"--"}).iter_split(b"a--b")) == [b"a", b"b"]
+
+
+def test_splitters_are_cached():
+    assert get_splitter({" ", "\t"}) is get_splitter(["\t", " "])
+    assert get_splitter({" "}) is not get_splitter({b" "})
+
+
+@pytest.mark.parametrize("delims,error", [
+    (set(), ValueError),
+    ({""}, ValueError),
+    ({" ", b" "}, TypeError),
+])
+def test_invalid_delimiters(delims, error):
+    with pytest.raises(error):
+        Splitter(delims)
@@ -0,0 +1,179 @@
+from command.tail import (FollowedFile, follow, last_lines_offset, last_stream_bytes, last_stream_lines, parse_n,
+                          read_bytes, read_lines, skip_lines)
+from command.utils.watch import InotifyWatcher, PollWatcher
+import io
+import tracemalloc
+import pytest
+
+
+class SeekCounter(io.BytesIO):
+    def __init__(self, data):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        data = super().read(size)
+        self.bytes_read += len(data)
+        return data
+
+
+@pytest.mark.parametrize("in_str,expected", [("5", -5), ("-5", -5), ("+5", 5), ("+0", 1), ("0", 0)])
+def test_parse_n(in_str, expected):
+    assert parse_n(in_str) == expected
+
+
+@pytest.mark.parametrize("data", [b"", b"a", b"a\n", b"a\nb", b"a\nb\n", b"\n\n\n", b"a\n\nb\n\n"])
+@pytest.mark.parametrize("n", [0, 1, 2, 3, 10])
+@pytest.mark.parametrize("block_size", [1, 2, 1024])
+def test_last_lines_offset(data, n, block_size):
+    lines = data.splitlines(keepends=True)
+    expected = b"".join(lines[max(0, len(lines) - n):]) if n else b""
+
+    offset = last_lines_offset(io.BytesIO(data), n, block_size)
+
+    assert data[offset:] == expected
+
+
+def test_last_lines_reads_only_the_end():
+    f = SeekCounter(b"x" * 10_000_000 + b"\nlast\n")
+
+    assert last_lines_offset(f, 1, block_size=4096) == 10_000_001
+    assert f.bytes_read < 10_000
+
+
+@pytest.mark.parametrize("n", [0, 1, 2, 5])
+@pytest.mark.parametrize("block_size", [1, 3, 1024])
+def test_skip_lines(n, block_size):
+    f = io.BytesIO(b"1\n2\n3\n")
+    rest = skip_lines(f, n, block_size) + f.read()
+
+    assert rest == b"".join([b"1\n", b"2\n", b"3\n"][n:])
+
+
+@pytest.mark.parametrize("n,expected", [(-2, b"b\nc\n"), (2, b"b\nc\n"), (1, b"a\nb\nc\n"), (0, b"")])
+def test_read_lines(n, expected):
+    out = io.BytesIO()
+    read_lines(io.BytesIO(b"a\nb\nc\n"), n, out)
+
+    assert out.getvalue() == expected
+
+
+@pytest.mark.parametrize("n,expected", [(-2, b"ef"), (2, b"bcdef"), (0, b"")])
+def test_read_bytes(n, expected):
+    out = io.BytesIO()
+    read_bytes(io.BytesIO(b"abcdef"), n, out)
+
+    assert out.getvalue() == expected
+
+
+def run_follow(steps, files, watcher, **follow_args):
+    """Runs follow, doing one step per iteration and stopping after the last."""
+    steps = iter(steps)
+
+    def should_stop():
+        step = next(steps, None)
+        if step is None:
+            return True
+        step()
+        return False
+
+    out = io.BytesIO()
+    follow(files, out, watcher=watcher, should_stop=should_stop, timeout=0.05, **follow_args)
+    return out.getvalue()
+
+
+@pytest.fixture(params=["inotify", "poll"])
+def watcher(request):
+    if request.param == "poll":
+        return PollWatcher(min_interval=0.001, max_interval=0.01)
+
+    try:
+        return InotifyWatcher()
+    except OSError:
+        pytest.skip("inotify is not available")
+
+
+def test_follow_appends_and_truncation(tmp_path, watcher):
+    path = tmp_path / "log"
+    path.write_bytes(b"old\n")
+    f = FollowedFile(path, open(path, "rb", buffering=0))
+    f.file.seek(0, io.SEEK_END)
+    f.pos = 4
+
+    def append(data):
+        return lambda: path.open("ab").write(data)
+
+    steps = [append(b"a\n"), lambda: path.write_bytes(b"b\n"), append(b"c\n"), lambda: None]
+    assert run_follow(steps, [f], watcher) == b"a\nb\nc\n"
+
+
+def test_follow_rotation_with_headers(tmp_path, watcher):
+    a, b = tmp_path / "a", tmp_path / "b"
+    a.write_bytes(b"")
+    b.write_bytes(b"")
+    files = [FollowedFile(p, open(p, "rb", buffering=0), retry=True) for p in (a, b)]
+
+    def rotate():
+        a.open("ab").write(b"before\n")
+        a.rename(tmp_path / "a.1")
+        a.write_bytes(b"after\n")
+
+    steps = [lambda: b.open("ab").write(b"1\n"), rotate, lambda: None, lambda: None]
+    output = run_follow(steps, files, watcher, headers=True, current=files[1])
+
+    assert output == f"1\n\n==> {a} <==\nbefore\nafter\n".encode()
+
+
+class Stream(io.RawIOBase):
+    """Non-seekable stream of lines that produces them in small reads."""
+
+    def __init__(self, data, read_size=7):
+        self.data = io.BytesIO(data)
+        self.read_size = read_size
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        chunk = self.data.read(min(len(b), self.read_size))
+        b[:len(chunk)] = chunk
+        return len(chunk)
+
+
+STREAM_DATA = b"".join(b"line %d\n" % i for i in range(5000))
+
+
+@pytest.mark.parametrize("n", [0, 1, 3, 4999, 5000, 6000])
+def test_last_stream_lines(n):
+    lines = STREAM_DATA.splitlines(keepends=True)
+    expected = b"".join(lines[max(0, len(lines) - n):]) if n else b""
+
+    assert bytes(last_stream_lines(Stream(STREAM_DATA), n, block_size=16)) == expected
+
+
+@pytest.mark.parametrize("n", [0, 1, 100, 100000])
+def test_last_stream_bytes(n):
+    expected = STREAM_DATA[-n:] if n else b""
+
+    assert bytes(last_stream_bytes(Stream(STREAM_DATA), n, block_size=16)) == expected
+
+
+def test_stream_memory_is_bounded():
+    huge = Stream(b"x" * 1000 + b"\n" + b"y\n" * 2_000_000, read_size=4096)
+    tracemalloc.start()
+
+    try:
+        tail = last_stream_lines(huge, 10, block_size=4096)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert bytes(tail) == b"y\n" * 10
+    assert peak < 100_000
+
+
+def test_read_lines_non_seekable():
+    out = io.BytesIO()
+    read_lines(Stream(b"a\nb\nc\n"), -2, out)
+
+    assert out.getvalue() == b"b\nc\n"
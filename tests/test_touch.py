@@ -1,9 +1,15 @@
-from command.touch import parse_time_decimal
+from command.touch import parse_time_decimal, read_file_list, resolve_times, touch, _cmd_main
 import datetime
+import errno
+import io
+import os
+import sys
+import time
 import pytest
 
 current_year = datetime.date.today().year
 
+
 @pytest.mark.parametrize(("func_input", "expected"), [
     ("04200420",        datetime.datetime(current_year, 4, 20, 4, 20)),
     ("10111213.14",     datetime.datetime(current_year, 10, 11, 12, 13, 14)),
@@ -15,4 +21,107 @@ current_year = datetime.date.today().year
     ("240103211234.20", datetime.datetime(2401, 3, 21, 12, 34, 20))
 ])
 def test_unix_time_decimal(func_input, expected):
-    assert parse_time_decimal(func_input) == expected
\ No newline at end of file
+    assert parse_time_decimal(func_input) == expected
+
+
+@pytest.fixture
+def counts(monkeypatch):
+    counts = {"stat": 0}
+    real_stat = os.stat
+
+    def stat(*args, **kwargs):
+        counts["stat"] += 1
+        return real_stat(*args, **kwargs)
+
+    monkeypatch.setattr(os, "stat", stat)
+    return counts
+
+
+def test_create_and_now(tmp_path, counts):
+    old = tmp_path / "old"
+    old.write_text("x")
+    os.utime(old, ns=(0, 0))
+
+    before = time.time_ns()
+    assert touch([tmp_path / "new", old], resolve_times()) == 0
+    # Neither file had to be looked at
+    assert counts["stat"] == 0
+
+    assert (tmp_path / "new").exists()
+    assert os.stat(old).st_mtime_ns >= before - 10**9
+    assert os.stat(old).st_atime_ns >= before - 10**9
+
+
+def test_reference_stat_once(tmp_path, counts):
+    ref = tmp_path / "ref"
+    ref.write_text("x")
+    os.utime(ref, ns=(1_500_000_000_123_456_789, 1_600_000_000_123_456_789))
+    paths = [tmp_path / f"f{i}" for i in range(20)]
+
+    times = resolve_times(ref)
+    assert touch(paths, times) == 0
+    assert counts["stat"] == 1
+    for path in paths:
+        st = os.stat(path)
+        assert (st.st_atime_ns, st.st_mtime_ns) == (1_500_000_000_123_456_789, 1_600_000_000_123_456_789)
+
+
+def test_keep_one_time(tmp_path):
+    path = tmp_path / "f"
+    path.write_text("x")
+    os.utime(path, ns=(1_000_000_000, 2_000_000_000))
+
+    touch([path], resolve_times(datetime.datetime(2020, 1, 2, 3, 4, 5), change_access_time=False))
+
+    st = os.stat(path)
+    assert st.st_atime_ns == 1_000_000_000
+    assert st.st_mtime_ns == int(datetime.datetime(2020, 1, 2, 3, 4, 5).timestamp()) * 10**9
+
+
+def test_no_create(tmp_path, capsys):
+    assert touch([tmp_path / "missing"], resolve_times(), create=False) == 0
+    assert not (tmp_path / "missing").exists()
+
+    assert touch([tmp_path / "no_dir" / "f"], resolve_times()) == 1
+    assert "cannot touch" in capsys.readouterr().err
+
+
+def test_directory_and_read_only(tmp_path):
+    (tmp_path / "d").mkdir()
+    (tmp_path / "ro").write_text("x")
+    os.chmod(tmp_path / "ro", 0o444)
+    times = resolve_times(datetime.datetime(2001, 1, 1))
+
+    assert touch([tmp_path / "d", tmp_path / "ro"], times) == 0
+    assert os.stat(tmp_path / "d").st_mtime_ns == times[1]
+    assert os.stat(tmp_path / "ro").st_mtime_ns == times[1]
+
+
+def test_create_error_is_reported(tmp_path, monkeypatch, capsys):
+    real_open = os.open
+
+    def open_denied(path, flags, *args, **kwargs):
+        if flags & os.O_CREAT:
+            raise PermissionError(errno.EACCES, "Permission denied", path)
+        return real_open(path, flags, *args, **kwargs)
+
+    monkeypatch.setattr(os, "open", open_denied)
+    assert touch([tmp_path / "new"], resolve_times()) == 1
+    assert capsys.readouterr().err == f"touch: cannot touch '{tmp_path / 'new'}': Permission denied\n"
+
+
+def test_read_file_list():
+    data = b"a\0b c\0\0d\n"
+    for block_size in (1, 2, 64):
+        assert list(read_file_list(io.BytesIO(data), b"\0", block_size)) == ["a", "b c", "d\n"]
+    assert list(read_file_list(io.BytesIO(b"a\nb\n\nc"), b"\n", 3)) == ["a", "b", "c"]
+
+
+@pytest.mark.parametrize("jobs", ["1", "4"])
+def test_files_from(tmp_path, monkeypatch, jobs):
+    monkeypatch.chdir(tmp_path)
+    names = [f"f {i}" for i in range(50)]
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO("\0".join(names).encode())))
+
+    assert _cmd_main(["--files-from", "-", "-0", "--jobs", jobs, "first"]) == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(names + ["first"])
@@ -0,0 +1,60 @@
+from command.column import Table
+from command.utils.width import char_width, display_width, ljust
+import pytest
+
+
+@pytest.mark.parametrize("s,expected", [
+    ("", 0),
+    ("abc", 3),
+    ("日本語", 6),
+    ("ﾊﾝｶｸ", 4),
+    ("한국어", 6),
+    ("👍", 2),
+    ("\u00e9", 1),
+    ("e\u0301", 1),
+    ("a\u200bb", 2),
+    ("\x00", 0),
+    ("\u0085", 0),
+    # A control character measures the same with or without non-ASCII characters around it
+    ("a\x1bb", 2),
+    ("a\x1bb\u00e9", 3),
+    ("\x7f", 0),
+])
+def test_display_width(s, expected):
+    assert display_width(s) == expected
+
+
+@pytest.mark.parametrize("c,expected", [
+    ("a", 1),
+    ("\u0300", 0),
+    ("\u00ad", 1),
+    ("\u1160", 0),
+    ("\u3000", 2),
+    ("\U00020000", 2),
+    ("\U0002fffd", 2),
+    ("\u0378", 1),
+])
+def test_char_width(c, expected):
+    assert char_width(c) == expected
+
+
+@pytest.mark.parametrize("s,width,expected", [
+    ("ab", 4, "ab  "),
+    ("日本", 6, "日本  "),
+    ("日本", 3, "日本"),
+    ("e\u0301", 2, "e\u0301 "),
+    ("a\x1b", 3, "a\x1b  "),
+])
+def test_ljust(s, width, expected):
+    assert ljust(s, width) == expected
+
+
+def test_table_aligns_wide_characters(capsys):
+    Table.table_from_lines(["名前 x", "ab y"]).print_table()
+    assert capsys.readouterr().out == "名前  x\nab    y\n"
+
+
+def test_column_first_uses_display_width():
+    # Two names of 6 cells don't fit in 10 cells next to each other, although their len would
+    table = Table.create_column_first(["日本語", "日本語"], 10, 0)
+    assert table.columns == [["日本語", "日本語"]]
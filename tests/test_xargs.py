@@ -0,0 +1,146 @@
+from command import xargs
+import io
+import os
+import sys
+import pytest
+
+
+def _stdin(monkeypatch, data: bytes):
+    monkeypatch.setattr(sys, "stdin", io.TextIOWrapper(io.BytesIO(data)))
+
+
+def test_split_items():
+    lines = ["a  b\n", "'c d' e\\ f \"g\"\n", "\n", "h\n"]
+    assert list(xargs.split_items(lines)) == ["a", "b", "c d", "e f", "g", "h"]
+
+    with pytest.raises(ValueError):
+        list(xargs.split_items(["'open\n"]))
+
+
+def test_build_batches():
+    items = [f"item{i}" for i in range(10)]
+
+    assert list(xargs.build_batches(items[:5], ["cmd"], max_args=2)) == [
+        ["cmd", "item0", "item1"], ["cmd", "item2", "item3"], ["cmd", "item4"]]
+
+    # "cmd" and two items of 5 characters, with a NUL each
+    batches = list(xargs.build_batches(items, ["cmd"], max_chars=4 + 6 * 2))
+    assert [len(b) for b in batches] == [3] * 5
+
+    # With a pointer per argument as well
+    batches = list(xargs.build_batches(items, ["cmd"], max_size=4 + 8 + (6 + 8) * 3))
+    assert [len(b) for b in batches] == [4, 4, 4, 2]
+    assert sum((b[1:] for b in batches), []) == items
+
+    with pytest.raises(ValueError):
+        list(xargs.build_batches(["x" * 100], ["cmd"], max_size=50))
+
+
+def test_arg_max(monkeypatch):
+    monkeypatch.setattr(os, "environ", {})
+    assert xargs.arg_max() == os.sysconf("SC_ARG_MAX") - xargs._HEADROOM
+
+    monkeypatch.setattr(os, "environ", {"A": "b" * 1000})
+    assert xargs.arg_max() == os.sysconf("SC_ARG_MAX") - xargs._HEADROOM - 1003 - xargs._POINTER_SIZE
+
+
+def test_large_input_fits_arg_max():
+    items = ("x" * 100 for _ in range(100_000))
+    limit = xargs.arg_max()
+
+    for batch in xargs.build_batches(items, ["echo"]):
+        assert sum(len(arg) + 1 + xargs._POINTER_SIZE for arg in batch) <= limit
+
+
+@pytest.mark.parametrize("procs", ["1", "4"])
+def test_in_process(tmp_path, monkeypatch, procs):
+    monkeypatch.chdir(tmp_path)
+    names = [f"f{i}" for i in range(200)]
+    _stdin(monkeypatch, "\n".join(names).encode())
+    spawned = []
+    monkeypatch.setattr(xargs.subprocess, "run", lambda *args, **kwargs: spawned.append(args))
+
+    assert xargs._cmd_main(["-n", "7", "-P", procs, "touch"]) == 0
+    assert sorted(os.listdir(tmp_path)) == sorted(names)
+
+    _stdin(monkeypatch, b"\0".join(n.encode() for n in names))
+    assert xargs._cmd_main(["-0", "-P", procs, "rm"]) == 0
+    assert os.listdir(tmp_path) == []
+    assert spawned == []
+
+
+@pytest.mark.parametrize("procs", ["1", "3"])
+def test_output_is_not_mixed(tmp_path, monkeypatch, capsys, procs):
+    monkeypatch.chdir(tmp_path)
+    for i in range(10):
+        (tmp_path / f"f{i}").write_text(f"{i}\n" * 1000)
+    _stdin(monkeypatch, " ".join(f"f{i}" for i in range(10)).encode())
+
+    assert xargs._cmd_main(["-n", "1", "-P", procs, "cat"]) == 0
+    out = capsys.readouterr().out.splitlines()
+
+    assert sorted(out) == sorted(f"{i}" for i in range(10) for _ in range(1000))
+    # Each command line's output stays together
+    assert len([i for i in range(1, len(out)) if out[i] != out[i - 1]]) == 9
+
+
+def test_replace(monkeypatch, capsys):
+    _stdin(monkeypatch, b"one\n  two words\n\n")
+
+    assert xargs._cmd_main(["-I", "{}", "echo", "[{}]", "x{}x"]) == 0
+    assert capsys.readouterr().out == "[one] xonex\n[two words] xtwo wordsx\n"
+
+
+def test_external_and_status(monkeypatch, capsys):
+    _stdin(monkeypatch, b"a b c\n")
+    assert xargs._cmd_main(["-n", "2", "echo", "-"]) == 0
+    assert capsys.readouterr().out == "- a b\n- c\n"
+
+    _stdin(monkeypatch, b"")
+    assert xargs._cmd_main([]) == 0
+    assert capsys.readouterr().out == "\n"
+
+    _stdin(monkeypatch, b"a\n")
+    assert xargs._cmd_main(["false"]) == 123
+
+    _stdin(monkeypatch, b"a\n")
+    assert xargs._cmd_main(["no-such-command-here"]) == 127
+    assert "No such file" in capsys.readouterr().err
+
+
+def test_in_pipeline(tmp_path, monkeypatch, capsys):
+    import toolbox
+
+    monkeypatch.chdir(tmp_path)
+    for i in range(3):
+        (tmp_path / f"f{i}").write_text(f"line {i}\n")
+    (tmp_path / "list").write_text("f0\nf1\nf2\n")
+
+    assert toolbox.run_line("cat list | xargs -P 2 cat | head -n 2") == 0
+    assert capsys.readouterr().out == "line 0\nline 1\n"
+
+
+@pytest.mark.parametrize("procs", ["1", "0"])
+def test_command_errors(tmp_path, monkeypatch, capsys, procs):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "dir").mkdir()
+    (tmp_path / "file").write_text("x\n")
+    _stdin(monkeypatch, b"dir\nfile\n")
+
+    assert xargs._cmd_main(["-n", "1", "-P", procs, "cat"]) == 123
+    captured = capsys.readouterr()
+    assert captured.out == "x\n"
+    assert "xargs: cat:" in captured.err and "Is a directory" in captured.err
+
+
+def test_invalid_limits(monkeypatch, capsys):
+    _stdin(monkeypatch, b"a\n")
+    assert xargs._cmd_main(["-n", "0", "echo"]) == 1
+    assert "-n" in capsys.readouterr().err
+
+    with pytest.raises(ValueError):
+        list(xargs.build_batches(["a"], ["echo"], max_args=0))
+
+    _stdin(monkeypatch, b"a\n")
+    assert xargs._cmd_main(["-P-1", "echo"]) == 1
+    assert "-P" in capsys.readouterr().err
@@ -1,33 +1,109 @@
 from typing import List
 import argparse
 import cmds
+import pipeline
 import sys
+import traceback
 
 PROG_NAME = "toolbox.py"
 PROG_VERSION = "0.1.0"
-_commands = cmds.load_commands()
+_commands = cmds.CommandRegistry()
 
 def run_command(name: str, args: List[str], **kvargs):
     # TODO: Normalize environment
     status = _commands[name](args, **kvargs)
-    
+
     if status is not None:
         return status
     else:
         return 0
 
-if __name__ == "__main__":
+def run_argv(argv: List[str]) -> int:
+    """Runs a command given as a list of arguments and returns its exit status."""
+    try:
+        return run_command(argv[0], argv[1:])
+    except KeyError as e:
+        print(f"{PROG_NAME}: error: Invalid command: {e}", file=sys.stderr)
+        return 1
+    except SystemExit as e:
+        # Raised by argparse after it printed its error message
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print(e.code, file=sys.stderr)
+        return 1
+
+def run_line(line: str) -> int:
+    """Runs a command line such as "cat -u file" or "cat file | head -n 5" and returns its exit status."""
+    if "|" not in line:
+        return run_argv(line.split())
+
+    try:
+        stages = pipeline.parse_pipeline(line)
+    except ValueError as e:
+        print(f"{PROG_NAME}: error: {e}", file=sys.stderr)
+        return 1
+
+    return pipeline.run_pipeline(stages, run_argv)
+
+def _run_batch_line(line: str) -> int:
+    try:
+        return run_line(line)
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+def run_script(path: str, keep_going: bool = False, jobs: int = 1, report: bool = False) -> int:
+    """
+    Runs every line of the script at path ("-" for stdin) with run_line. Failing lines are always reported on
+    stderr, and every line is if report is True. Returns the status of the first failing line, or 0.
+    """
+    def on_result(lineno, line, status):
+        if report or status != 0:
+            print(f"{PROG_NAME}: {path}:{lineno}: exit {status}: {line}", file=sys.stderr)
+
+    import batch
+
+    f = sys.stdin if path == "-" else open(path)
+
+    try:
+        results = batch.run_batch(batch.read_script(f), _run_batch_line, keep_going, jobs, on_result)
+    finally:
+        if f is not sys.stdin:
+            f.close()
+
+    return next((status for _, _, status in results if status != 0), 0)
+
+def main(argv: List[str] = None) -> int:
     parser = argparse.ArgumentParser(
         prog=PROG_NAME,
         description=f"Executes a command included in this package. Available commands: {list(_commands.keys())}",
         epilog=f"Version: {PROG_VERSION}")
-    parser.add_argument("cmd", type=str, help="The name of the command to run.")
-    args = parser.parse_args()
+    parser.add_argument("cmd", type=str, nargs="?", help="The name of the command to run.")
+    parser.add_argument("--batch", metavar="SCRIPT", help="Run every line of SCRIPT as a command. Use - to read the script from stdin.")
+    parser.add_argument("--keep-going", action="store_true", help="In batch mode, keep running lines after one fails.")
+    parser.add_argument("--jobs", type=int, default=1, help="In batch mode, number of lines to run at the same time. Lines must be independent.")
+    parser.add_argument("--report", action="store_true", help="In batch mode, report the exit status of every line, not just failures.")
+    parser.add_argument("--serve", action="store_true", help="Keep a warm interpreter running that executes commands sent to --socket.")
+    parser.add_argument("--client", action="store_true", help="Send cmd to a running --serve process instead of running it here.")
+    parser.add_argument("--socket", help="Unix socket used by --serve and --client. Default: toolbox.sock in $XDG_RUNTIME_DIR, or in a private directory in the temporary directory.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of worker processes started by --serve.")
+    args = parser.parse_args(argv)
 
-    try:
-        cmd = args.cmd.split()
-        exit_code = run_command(cmd[0], cmd[1:])
-        sys.exit(exit_code)
-    except KeyError as e:
-        print(f"{PROG_NAME}: error: Invalid command: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+    if args.serve:
+        import server
+        return server.serve(args.socket, args.workers, run_line, preload=_commands)
+
+    if args.batch:
+        return run_script(args.batch, args.keep_going, args.jobs, args.report)
+
+    if not args.cmd:
+        parser.error("the following arguments are required: cmd")
+
+    if args.client:
+        import server
+        return server.call(args.cmd, args.socket)
+
+    return run_line(args.cmd)
+
+if __name__ == "__main__":
+    sys.exit(main())